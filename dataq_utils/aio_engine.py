@@ -0,0 +1,89 @@
+import asyncio
+
+from dataq_utils import di245, di1100
+from dataq_utils.metrics import observe_backlog
+
+# Device modules expose connect_to_device, configure_device, open_stream and
+# stop_scanning; the engine drives them the same way for every type.
+DEVICE_MODULES = {"di245": di245, "di1100": di1100}
+
+
+async def run_device(
+    module, port, device_id, channel_config, log_func, capture=None
+):
+    """Read one device from the event loop until cancelled or the port fails.
+
+    Setup (which sleeps and blocks on responses) runs in a worker thread;
+    after that the port is switched to non-blocking reads and its file
+    descriptor registered with the loop, so each readiness callback drains
+    whatever the OS has buffered and feeds it through the decoder. Needs a
+    selector-based loop (POSIX).
+    """
+    loop = asyncio.get_running_loop()
+    ser = await asyncio.to_thread(module.connect_to_device, port)
+    if not ser:
+        return
+    try:
+        await asyncio.to_thread(module.configure_device, ser, channel_config)
+        feed = await asyncio.to_thread(module.open_stream, ser, channel_config)
+        if capture is not None:
+            capture.start_session()
+        ser.timeout = 0
+        fd = ser.fileno()
+        failed = loop.create_future()
+
+        def on_readable():
+            try:
+                waiting = ser.in_waiting
+                observe_backlog(module.DEVICE_TYPE, device_id, waiting)
+                data = ser.read(waiting or 1)
+                if data:
+                    if capture is not None:
+                        capture.write(data)
+                    block = feed(data)
+                    if len(block):
+                        log_func(block, channel_config, device_id)
+            except Exception as e:
+                loop.remove_reader(fd)
+                if not failed.done():
+                    failed.set_exception(e)
+
+        loop.add_reader(fd, on_readable)
+        print(f"Reading data from Device {device_id} on {port} (asyncio)...")
+        try:
+            await failed
+        finally:
+            loop.remove_reader(fd)
+    finally:
+        try:
+            module.stop_scanning(ser)
+        finally:
+            ser.close()
+            print(f"Connection closed for Device {device_id}.")
+
+
+class AsyncEngine:
+    """Run every device on one event loop instead of one thread per port."""
+
+    def __init__(self):
+        self.devices = []
+        self.tasks = []
+
+    def add_device(
+        self, dev_type, port, device_id, channel_config, log_func, capture=None
+    ):
+        module = DEVICE_MODULES[dev_type]
+        self.devices.append(
+            (module, port, device_id, channel_config, log_func, capture)
+        )
+
+    async def run(self):
+        """Run until every device stops; cancelling this cancels them all cleanly."""
+        self.tasks = [
+            asyncio.create_task(run_device(*device), name=f"device-{device[2]}")
+            for device in self.devices
+        ]
+        results = await asyncio.gather(*self.tasks, return_exceptions=True)
+        for task, result in zip(self.tasks, results):
+            if isinstance(result, Exception):
+                print(f"{task.get_name()} stopped: {result}")
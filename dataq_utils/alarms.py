@@ -0,0 +1,257 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+EVALUATION_WINDOW = 60.0  # Seconds of transitions merged into one notification
+
+
+class AlarmRule:
+    """Limits for one channel.
+
+    A side trips once its condition has held for ``min_duration`` seconds
+    and clears only after the value is back inside the limit by
+    ``hysteresis`` (or ``rate_hysteresis`` for the rate rule, in units/s).
+    ``max_rate`` is compared against the absolute change over the last
+    ``rate_window`` seconds. Any limit left as ``None`` is not checked.
+    """
+
+    def __init__(
+        self, low=None, high=None, hysteresis=0.0, min_duration=0.0,
+        max_rate=None, rate_hysteresis=0.0, rate_window=60.0,
+    ):
+        self.low = low
+        self.high = high
+        self.hysteresis = hysteresis
+        self.min_duration = min_duration
+        self.max_rate = max_rate
+        self.rate_hysteresis = rate_hysteresis
+        self.rate_window = rate_window
+
+
+def _column(rules, attr):
+    values = [None if r is None else getattr(r, attr) for r in rules]
+    return np.array([np.nan if x is None else x for x in values], dtype=np.float64)
+
+
+def _run_start(cond, t, carried):
+    """Start time of the current run of ``cond`` at each sample (NaN outside runs)."""
+    idx = np.arange(len(cond))[:, None]
+    last_false = np.maximum.accumulate(np.where(~cond, idx, -1), axis=0)
+    from_block = t[np.minimum(last_false + 1, len(t) - 1)]
+    from_before = np.where(np.isnan(carried), t[0], carried)
+    start = np.where(last_false < 0, from_before, from_block)
+    return np.where(cond, start, np.nan)
+
+
+def _latch(set_events, clear_events, active):
+    """Hysteresis latch: the state after each sample is the most recent event."""
+    idx = np.arange(len(set_events))[:, None]
+    last_set = np.maximum.accumulate(np.where(set_events, idx, -1), axis=0)
+    last_clear = np.maximum.accumulate(np.where(clear_events, idx, -1), axis=0)
+    return np.where((last_set < 0) & (last_clear < 0), active, last_set > last_clear)
+
+
+class DeviceAlarms:
+    """Vectorized alarm state for every channel of one device."""
+
+    SIDES = ("high", "low", "rate")
+
+    def __init__(self, keys, rules):
+        self.keys = keys
+        rules = [rules.get(key) for key in keys]
+        k = len(keys)
+        self.high = _column(rules, "high")
+        self.low = _column(rules, "low")
+        self.hysteresis = np.nan_to_num(_column(rules, "hysteresis"))
+        self.min_duration = np.nan_to_num(_column(rules, "min_duration"))
+        self.max_rate = _column(rules, "max_rate")
+        self.rate_hysteresis = np.nan_to_num(_column(rules, "rate_hysteresis"))
+        self.rate_window = np.nan_to_num(_column(rules, "rate_window"), nan=60.0)
+        self.active = {side: np.zeros(k, dtype=bool) for side in self.SIDES}
+        self.run_start = {side: np.full(k, np.nan) for side in self.SIDES}
+        self.check_rate = bool(np.any(~np.isnan(self.max_rate)))
+        self.history_t = np.empty(0)
+        self.history_v = np.empty((0, k))
+
+    def _rate(self, t, v):
+        """Absolute change per second over each channel's ``rate_window``."""
+        all_t = np.concatenate((self.history_t, t))
+        all_v = np.concatenate((self.history_v, v))
+        rate = np.full(v.shape, np.nan)
+        for j, window in enumerate(self.rate_window):
+            back = t - window
+            ok = back >= all_t[0]
+            earlier = np.interp(back[ok], all_t, all_v[:, j])
+            rate[ok, j] = np.abs(v[ok, j] - earlier) / window
+        keep = all_t >= all_t[-1] - self.rate_window.max()
+        self.history_t, self.history_v = all_t[keep], all_v[keep]
+        return rate
+
+    def evaluate(self, t, v):
+        """Update state with a block; returns a list of transition dicts."""
+        # side -> (trip condition, clear condition, measured value, limit)
+        conditions = {
+            "high": (v > self.high, v <= self.high - self.hysteresis, v, self.high),
+            "low": (v < self.low, v >= self.low + self.hysteresis, v, self.low),
+        }
+        if self.check_rate:
+            rate = self._rate(t, v)
+            conditions["rate"] = (
+                rate > self.max_rate,
+                rate <= self.max_rate - self.rate_hysteresis,
+                rate,
+                self.max_rate,
+            )
+
+        transitions = []
+        for side, (cond, clear, measured, limit) in conditions.items():
+            start = _run_start(cond, t, self.run_start[side])
+            self.run_start[side] = start[-1]
+            qualified = cond & (t[:, None] - start >= self.min_duration)
+            state = _latch(qualified, clear, self.active[side])
+            prev = np.vstack((self.active[side][None, :], state[:-1]))
+            for i, j in zip(*np.nonzero(state != prev)):
+                transitions.append(
+                    {
+                        "key": self.keys[j],
+                        "side": side,
+                        "raised": bool(state[i, j]),
+                        "value": float(measured[i, j]),
+                        "limit": float(limit[j]),
+                        "time": float(t[i]),
+                    }
+                )
+            self.active[side] = state[-1]
+        return transitions
+
+    def active_keys(self):
+        return [
+            (self.keys[j], side)
+            for side in self.SIDES
+            for j in np.flatnonzero(self.active[side])
+        ]
+
+
+class AlarmEngine:
+    """Evaluate per-channel rules on sample blocks and batch the notifications.
+
+    ``rules`` maps channel keys (``"<device_type> - <device_id> - <channel>"``,
+    as in ``nameMapping``) to ``AlarmRule``. Transitions are collected and,
+    at most once per ``window`` seconds, merged into a single message passed
+    to ``publish(subject, message)``.
+    """
+
+    def __init__(
+        self, rules, publish, names=None, window=EVALUATION_WINDOW,
+        clock=time.monotonic,
+    ):
+        self.rules = rules
+        self.publish = publish
+        self.names = names or {}
+        self.window = window
+        self.clock = clock
+        self.devices = {}
+        self.pending = []
+        self.last_publish = clock()
+
+    def evaluate(self, device_type, device_id, channels, timestamps, values):
+        """Feed an (n_scans x n_channels) block; publishes when the window is due."""
+        if device_id not in self.devices:
+            keys = [f"{device_type} - {device_id} - {c}" for c in channels]
+            self.devices[device_id] = DeviceAlarms(keys, self.rules)
+        t = np.asarray(timestamps, dtype=np.float64)
+        v = np.asarray(values, dtype=np.float64)
+        self.pending.extend(self.devices[device_id].evaluate(t, v))
+        self.maybe_publish()
+
+    def maybe_publish(self, force=False):
+        now = self.clock()
+        if not self.pending or (not force and now - self.last_publish < self.window):
+            return None
+        subject, message = self.format(self.pending)
+        self.pending = []
+        self.last_publish = now
+        self.publish(subject, message)
+        return message
+
+    def format(self, transitions):
+        raised = sum(tr["raised"] for tr in transitions)
+        subject = (
+            f"Data Logger Alert: {raised} raised, "
+            f"{len(transitions) - raised} cleared"
+        )
+        lines = []
+        for tr in transitions:
+            name = self.names.get(tr["key"], tr["key"])
+            state = "RAISED" if tr["raised"] else "cleared"
+            when = datetime.fromtimestamp(tr["time"]).isoformat(timespec="seconds")
+            unit = "/s" if tr["side"] == "rate" else ""
+            lines.append(
+                f"{when} {state} {tr['side']} on {name}: "
+                f"{tr['value']:.2f} (limit {tr['limit']:g}{unit})"
+            )
+        active = [
+            self.names.get(key, key) + f" ({side})"
+            for device in self.devices.values()
+            for key, side in device.active_keys()
+        ]
+        lines.append("")
+        lines.append("Active: " + (", ".join(active) if active else "none"))
+        return subject, "\n".join(lines)
+
+
+def synthetic_series(duration, rate, num_channels, start=0.0, base=20.0, seed=0):
+    """Timestamps and a flat noisy (n x num_channels) series to build test cases on."""
+    rng = np.random.default_rng(seed)
+    t = start + np.arange(0, duration, 1.0 / rate)
+    v = base + rng.normal(scale=0.2, size=(len(t), num_channels))
+    return t, v
+
+
+def replay(rules, timestamps, values, device_type="DI-245", device_id=0,
+           block_size=20, window=EVALUATION_WINDOW, names=None):
+    """Replay a recorded or synthetic series through an ``AlarmEngine``.
+
+    Time is driven by the series itself, so hours of data replay instantly.
+    Returns the list of ``(subject, message)`` notifications that would have
+    been published.
+    """
+    published = []
+    clock = {"now": float(timestamps[0])}
+    engine = AlarmEngine(
+        rules,
+        lambda subject, message: published.append((subject, message)),
+        names=names,
+        window=window,
+        clock=lambda: clock["now"],
+    )
+    channels = list(range(values.shape[1]))
+    for i in range(0, len(timestamps), block_size):
+        clock["now"] = float(timestamps[min(i + block_size, len(timestamps)) - 1])
+        engine.evaluate(
+            device_type, device_id, channels,
+            timestamps[i : i + block_size], values[i : i + block_size],
+        )
+    engine.maybe_publish(force=True)
+    return published
+
+
+if __name__ == "__main__":
+    # A cold start, a bakeout ramp that overshoots, a noisy plateau at the
+    # limit, and a fast spike on channel 3.
+    start = time.time() - 3 * 3600
+    t, v = synthetic_series(3 * 3600, 1.0, 4, start=start)
+    ramp = np.clip((t - start - 600) / 3600, 0, 1) * 78
+    v += ramp[:, None]
+    v[(t > start + 7000) & (t < start + 7300), 3] += 60
+    rules = {
+        f"DI-245 - 0 - {c}": AlarmRule(
+            low=65, high=100, hysteresis=2, min_duration=30, max_rate=0.5
+        )
+        for c in range(4)
+    }
+    for subject, message in replay(rules, t, v):
+        print(subject)
+        print(message)
+        print()
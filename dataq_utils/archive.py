@@ -0,0 +1,550 @@
+import gzip
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dataq_utils.chunk_reader import read_chunk
+
+ARCHIVE_PERIOD = "daily"  # "daily" or "weekly" archives
+BLOCK_ROWS = 4096  # Rows of one device per block, the unit of a range read
+COMPRESSION_LEVEL = 6
+CHUNK_PREFIX = "device_readings_"
+CHUNK_DURATION = timedelta(hours=6)
+MAGIC = b"DQARC001"
+FOOTER = struct.Struct("<Q8s")  # Length of the JSON block index, magic
+RETENTION_DAYS = 14  # Archived chunk files are deleted locally after this
+ARCHIVE_RETENTION_DAYS = 365  # Uploaded archives are deleted locally after this
+MAX_LOCAL_BYTES = None  # Also delete the oldest archived data beyond this total
+
+
+def chunk_start(name):
+    """Start of a ``device_readings_%Y%m%d_%H%M`` chunk, or None for other files."""
+    if not name.startswith(CHUNK_PREFIX):
+        return None
+    stamp = os.path.splitext(name[len(CHUNK_PREFIX) :])[0]
+    try:
+        return datetime.strptime(stamp, "%Y%m%d_%H%M")
+    except ValueError:
+        return None
+
+
+def period_bounds(start, period=ARCHIVE_PERIOD):
+    """(name, begin, end) of the archive period holding ``start``."""
+    day = datetime(start.year, start.month, start.day)
+    if period == "daily":
+        return day.strftime("%Y-%m-%d"), day, day + timedelta(days=1)
+    if period == "weekly":
+        begin = day - timedelta(days=day.weekday())
+        year, week, _ = begin.isocalendar()
+        return f"{year}-W{week:02d}", begin, begin + timedelta(weeks=1)
+    raise ValueError(f"unknown archive period {period!r}")
+
+
+def _shuffle(array):
+    """Group the bytes of every element by significance, so zlib sees long
+    runs of similar exponent and high-order bytes."""
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(np.dtype(dtype).itemsize, -1)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(shape)
+
+
+def encode_block(timestamps_ns, fields):
+    """Compress one block: delta-coded timestamps, then each (n x c) field."""
+    deltas = np.diff(np.asarray(timestamps_ns, dtype=np.int64), prepend=0)
+    parts = [_shuffle(deltas)]
+    parts += [_shuffle(np.asarray(data, dtype=np.float64)) for data in fields.values()]
+    return zlib.compress(b"".join(parts), COMPRESSION_LEVEL)
+
+
+def decode_block(data, entry):
+    """Inverse of ``encode_block`` for the block described by ``entry``."""
+    raw = zlib.decompress(data)
+    n, c = entry["count"], len(entry["channels"])
+    series = {
+        "channels": list(entry["channels"]),
+        "timestamp_ns": np.cumsum(_unshuffle(raw[: 8 * n], np.int64, (n,))),
+    }
+    pos = 8 * n
+    for name in entry["fields"]:
+        series[name] = _unshuffle(raw[pos : pos + 8 * n * c], np.float64, (n, c))
+        pos += 8 * n * c
+    return series
+
+
+def _channel_stats(series):
+    """Per-channel (min, max) of a block, None for channels without data."""
+    low = series.get("min", series["values"])
+    high = series.get("max", series["values"])
+    low = np.where(np.isnan(low), np.inf, low).min(axis=0)
+    high = np.where(np.isnan(high), -np.inf, high).max(axis=0)
+    return (
+        [float(x) if np.isfinite(x) else None for x in low],
+        [float(x) if np.isfinite(x) else None for x in high],
+    )
+
+
+def write_archive(path, series_list, block_rows=BLOCK_ROWS):
+    """Write ``[(device_type, device_id, series), ...]`` as an archive file.
+
+    The file is ``MAGIC``, the compressed blocks, then the JSON block
+    index and ``FOOTER``, so an archive can be re-indexed on its own.
+    Returns the block index (offset, length, time range, channels and
+    per-channel min/max of every block).
+    """
+    blocks = []
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        for device_type, device_id, series in series_list:
+            fields = [n for n in series if n not in ("channels", "timestamp_ns")]
+            for lo in range(0, len(series["timestamp_ns"]), block_rows):
+                part = {
+                    name: series[name][lo : lo + block_rows]
+                    for name in ["timestamp_ns"] + fields
+                }
+                data = encode_block(part["timestamp_ns"], {k: part[k] for k in fields})
+                mins, maxs = _channel_stats(part)
+                blocks.append(
+                    {
+                        "device_type": device_type,
+                        "device_id": device_id,
+                        "channels": list(series["channels"]),
+                        "fields": fields,
+                        "offset": f.tell(),
+                        "length": len(data),
+                        "count": len(part["timestamp_ns"]),
+                        "t_min": int(part["timestamp_ns"][0]),
+                        "t_max": int(part["timestamp_ns"][-1]),
+                        "min": mins,
+                        "max": maxs,
+                    }
+                )
+                f.write(data)
+        index = json.dumps(blocks, separators=(",", ":")).encode()
+        f.write(index)
+        f.write(FOOTER.pack(len(index), MAGIC))
+    os.replace(path + ".tmp", path)
+    return blocks
+
+
+def read_archive_index(path):
+    """The block index stored at the end of an archive file."""
+    with open(path, "rb") as f:
+        f.seek(-FOOTER.size, os.SEEK_END)
+        length, magic = FOOTER.unpack(f.read(FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an archive")
+        f.seek(-FOOTER.size - length, os.SEEK_END)
+        return json.loads(f.read(length))
+
+
+def read_archive(path):
+    """Every row of an archive file as ``{(device_type, device_id): series}``."""
+    index = read_archive_index(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    pieces = {}
+    for block in index:
+        raw = data[block["offset"] : block["offset"] + block["length"]]
+        key = (block["device_type"], block["device_id"])
+        pieces.setdefault(key, []).append(decode_block(raw, block))
+    return {key: _merge_series(parts) for key, parts in pieces.items()}
+
+
+def _merge_series(pieces):
+    """Concatenate same-device series; channels and fields are unioned."""
+    channels = list(dict.fromkeys(c for p in pieces for c in p["channels"]))
+    fields = list(
+        dict.fromkeys(
+            n for p in pieces for n in p if n not in ("channels", "timestamp_ns")
+        )
+    )
+    merged = {
+        "channels": channels,
+        "timestamp_ns": np.concatenate([p["timestamp_ns"] for p in pieces]),
+    }
+    for name in fields:
+        columns = []
+        for p in pieces:
+            out = np.full((len(p["timestamp_ns"]), len(channels)), np.nan)
+            if name in p:
+                idx = [channels.index(c) for c in p["channels"]]
+                out[:, idx] = p[name]
+            columns.append(out)
+        merged[name] = np.concatenate(columns)
+    order = np.argsort(merged["timestamp_ns"], kind="stable")
+    for name, data in merged.items():
+        if name != "channels":
+            merged[name] = data[order]
+    return merged
+
+
+class Archiver:
+    """Compact closed chunks into daily/weekly compressed columnar archives.
+
+    Each archive holds every device's rows for one period in blocks of
+    ``BLOCK_ROWS``. ``manifest.json`` maps every block to its archive,
+    byte offset, time range, channels and per-channel min/max, so
+    ``read_range`` fetches only the blocks a query needs (a ranged GET
+    once the local copy is gone). Archives are uploaded under ``prefix``
+    when a ``client`` is given. ``apply_retention`` bounds local disk: chunk
+    files are deleted ``RETENTION_DAYS`` after being archived (once
+    ``can_delete(name)`` agrees, e.g. the chunk was uploaded), uploaded
+    archives after ``ARCHIVE_RETENTION_DAYS``, and the oldest of both
+    beyond ``max_local_bytes``. A chunk's ``raw_`` stream is not archived;
+    it is uploaded under ``<prefix>raw/`` as the chunk is deleted, or kept
+    locally when there is no ``client``.
+    """
+
+    def __init__(self, log_dir, archive_dir=None, client=None, bucket=None,
+                 prefix="archive/", period=ARCHIVE_PERIOD, can_delete=None,
+                 retention_days=RETENTION_DAYS,
+                 archive_retention_days=ARCHIVE_RETENTION_DAYS,
+                 max_local_bytes=MAX_LOCAL_BYTES, chunk_duration=CHUNK_DURATION):
+        self.log_dir = log_dir
+        self.archive_dir = archive_dir or os.path.join(log_dir, "archive")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.period = period
+        self.can_delete = can_delete or (lambda name: True)
+        self.retention = timedelta(days=retention_days)
+        self.archive_retention = timedelta(days=archive_retention_days)
+        self.max_local_bytes = max_local_bytes
+        self.chunk_duration = chunk_duration
+        self.lock = threading.Lock()
+        self._manifest = None
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            path = os.path.join(self.archive_dir, "manifest.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {"archives": {}}
+        return self._manifest
+
+    def _save_manifest(self):
+        path = os.path.join(self.archive_dir, "manifest.json")
+        os.makedirs(self.archive_dir, exist_ok=True)
+        body = json.dumps(self.manifest, separators=(",", ":"))
+        with open(path + ".tmp", "w") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        if self.client is not None:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self.prefix + "manifest.json",
+                Body=body.encode(),
+                ContentType="application/json",
+            )
+
+    def _archive_path(self, name):
+        return os.path.join(self.archive_dir, self.period, name + ".dqa")
+
+    def archived_chunks(self):
+        return {
+            chunk
+            for archive in self.manifest["archives"].values()
+            for chunk in archive["chunks"]
+        }
+
+    def pending(self, now=None):
+        """{period name: (begin, end, [chunk paths])} for closed periods whose
+        local chunks are not all archived yet."""
+        now = now or datetime.now()
+        archived = self.archived_chunks()
+        periods = {}
+        for name in sorted(os.listdir(self.log_dir)):
+            start = chunk_start(name)
+            if start is None:
+                continue
+            period, begin, end = period_bounds(start, self.period)
+            if end > now:
+                continue  # Its last chunk may still be open
+            entry = periods.setdefault(period, (begin, end, [], []))
+            entry[2].append(os.path.join(self.log_dir, name))
+            if name not in archived:
+                entry[3].append(name)
+        return {
+            period: (begin, end, paths)
+            for period, (begin, end, paths, new) in periods.items()
+            if new
+        }
+
+    def archive_period(self, period, begin, end, paths):
+        """(Re)build one period's archive from ``paths`` plus whatever an
+        earlier archive of the period holds for chunks no longer on disk."""
+        pieces = {}
+        extents = {}  # device -> [(t_min, t_max)] of its rows read from disk
+        for path in paths:
+            for key, series in read_chunk(path).items():
+                pieces.setdefault(key, []).append(series)
+                t = series["timestamp_ns"]
+                if len(t):
+                    extents.setdefault(key, []).append((int(t[0]), int(t[-1])))
+        chunks = [os.path.basename(p) for p in paths]
+        existing = self.manifest["archives"].get(period)
+        gone = [c for c in existing["chunks"] if c not in chunks] if existing else []
+        if gone:
+            begin_ns = int(begin.timestamp() * 1e9)
+            end_ns = int(end.timestamp() * 1e9)
+            for key, series in self.read_range(begin_ns, end_ns).items():
+                # Rows of chunks still on disk were read from the chunk itself
+                t = series["timestamp_ns"]
+                keep = np.ones(len(t), dtype=bool)
+                for lo, hi in extents.get(key, []):
+                    keep &= (t < lo) | (t > hi)
+                for name in list(series):
+                    if name != "channels":
+                        series[name] = series[name][keep]
+                pieces.setdefault(key, []).append(series)
+            chunks = gone + chunks
+
+        merged = [
+            (device_type, device_id, _merge_series(parts))
+            for (device_type, device_id), parts in sorted(pieces.items())
+        ]
+        path = self._archive_path(period)
+        blocks = write_archive(path, merged)
+        key = f"{self.prefix}{self.period}/{period}.dqa"
+        uploaded = False
+        if self.client is not None:
+            self.client.upload_file(
+                path, self.bucket, key,
+                ExtraArgs={"ContentType": "application/octet-stream"},
+            )
+            uploaded = True
+        with self.lock:
+            self.manifest["archives"][period] = {
+                "key": key,
+                "start": begin.timestamp(),
+                "end": end.timestamp(),
+                "bytes": os.path.getsize(path),
+                "chunks": sorted(chunks),
+                "uploaded": uploaded,
+                "local": True,
+                "blocks": blocks,
+            }
+            self._save_manifest()
+        return blocks
+
+    def run(self, now=None):
+        """Archive every pending period, then apply retention."""
+        archived = []
+        for period, (begin, end, paths) in sorted(self.pending(now).items()):
+            blocks = self.archive_period(period, begin, end, paths)
+            print(f"Archived {len(paths)} chunks as {period} ({len(blocks)} blocks)")
+            archived.append(period)
+        self.apply_retention(now)
+        return archived
+
+    def _raw_path(self, name):
+        """The chunk's full-rate ``raw_`` stream, if it exists and can be retired."""
+        path = os.path.join(self.log_dir, "raw_" + name)
+        # Archives hold only the chunk itself: without a client the raw
+        # stream has no other copy, so it stays on disk
+        if self.client is None or not os.path.exists(path):
+            return None
+        return path
+
+    def _delete_chunk(self, name):
+        raw = self._raw_path(name)
+        if raw is not None:
+            with open(raw, "rb") as f:
+                body = gzip.compress(f.read())
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}raw/raw_{name}",
+                Body=body,
+                ContentEncoding="gzip",
+                ContentType="application/octet-stream",
+            )
+            os.remove(raw)
+        for path in (
+            os.path.join(self.log_dir, name),
+            os.path.join(self.log_dir, ".index", name + ".npz"),
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _delete_archive(self, period):
+        path = self._archive_path(period)
+        if os.path.exists(path):
+            os.remove(path)
+        self.manifest["archives"][period]["local"] = False
+
+    def apply_retention(self, now=None):
+        """Delete local chunks and archives the policy no longer needs."""
+        now = now or datetime.now()
+        archived = self.archived_chunks()
+        chunks = []  # (chunk end, name, bytes) of archived, deletable chunks
+        for name in os.listdir(self.log_dir):
+            start = chunk_start(name)
+            if start is None or name not in archived or not self.can_delete(name):
+                continue
+            size = os.path.getsize(os.path.join(self.log_dir, name))
+            raw = self._raw_path(name)
+            if raw is not None:
+                size += os.path.getsize(raw)
+            chunks.append((start + self.chunk_duration, name, size))
+        removed = []
+        kept = []
+        for chunk_end, name, size in sorted(chunks):
+            if now - chunk_end >= self.retention:
+                self._delete_chunk(name)
+                removed.append(name)
+            else:
+                kept.append((chunk_end.timestamp(), 0, name, size))
+
+        with self.lock:
+            candidates = list(kept)
+            archives = self.manifest["archives"]
+            for period, archive in sorted(archives.items()):
+                if not (archive["local"] and archive["uploaded"]):
+                    continue
+                age = now.timestamp() - archive["end"]
+                if age >= self.archive_retention.total_seconds():
+                    self._delete_archive(period)
+                    removed.append(period)
+                else:
+                    candidates.append((archive["end"], 1, period, archive["bytes"]))
+
+            if self.max_local_bytes is not None:
+                # Oldest first, chunks before the archive that covers them
+                total = self.local_bytes()
+                for _, kind, name, size in sorted(candidates):
+                    if total <= self.max_local_bytes:
+                        break
+                    if kind == 0:
+                        self._delete_chunk(name)
+                    else:
+                        self._delete_archive(name)
+                    removed.append(name)
+                    total -= size
+            if removed:
+                self._save_manifest()
+        return removed
+
+    def local_bytes(self):
+        """Bytes of chunk files (raw streams included) and archives on local disk."""
+        total = 0
+        for base in (self.log_dir, os.path.join(self.archive_dir, self.period)):
+            if not os.path.isdir(base):
+                continue
+            for name in os.listdir(base):
+                path = os.path.join(base, name)
+                if chunk_start(name.removeprefix("raw_")) or name.endswith(".dqa"):
+                    total += os.path.getsize(path)
+        return total
+
+    def find_blocks(self, start_ns, end_ns, devices=None, channel=None):
+        """[(period, block)] overlapping [start_ns, end_ns), optionally only for
+        ``devices`` ((device_type, device_id) pairs) or blocks with ``channel``."""
+        found = []
+        with self.lock:
+            archives = sorted(self.manifest["archives"].items())
+        for period, archive in archives:
+            if archive["end"] * 1e9 <= start_ns or archive["start"] * 1e9 >= end_ns:
+                continue
+            for block in archive["blocks"]:
+                if block["t_max"] < start_ns or block["t_min"] >= end_ns:
+                    continue
+                if devices is not None and (
+                    (block["device_type"], block["device_id"]) not in devices
+                ):
+                    continue
+                if channel is not None and channel not in block["channels"]:
+                    continue
+                found.append((period, block))
+        return found
+
+    def _fetch(self, period, offset, length):
+        path = self._archive_path(period)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self.manifest["archives"][period]["key"],
+            Range=f"bytes={offset}-{offset + length - 1}",
+        )
+        return response["Body"].read()
+
+    def read_range(self, start_ns, end_ns, devices=None):
+        """Rows in [start_ns, end_ns) as ``{(device_type, device_id): series}``,
+        like ``read_chunk``. Adjacent blocks are fetched with one read."""
+        blocks = self.find_blocks(start_ns, end_ns, devices)
+        pieces = {}
+        i = 0
+        while i < len(blocks):
+            period, first = blocks[i]
+            j = i + 1
+            end = first["offset"] + first["length"]
+            while (
+                j < len(blocks)
+                and blocks[j][0] == period
+                and blocks[j][1]["offset"] == end
+            ):
+                end += blocks[j][1]["length"]
+                j += 1
+            data = self._fetch(period, first["offset"], end - first["offset"])
+            for _, block in blocks[i:j]:
+                lo = block["offset"] - first["offset"]
+                series = decode_block(data[lo : lo + block["length"]], block)
+                t = series["timestamp_ns"]
+                keep = (t >= start_ns) & (t < end_ns)
+                for name in list(series):
+                    if name != "channels":
+                        series[name] = series[name][keep]
+                key = (block["device_type"], block["device_id"])
+                pieces.setdefault(key, []).append(series)
+            i = j
+        return {key: _merge_series(parts) for key, parts in pieces.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dataq_utils.uploader import LocalS3Client
+
+    parser = argparse.ArgumentParser(
+        description="Archive closed chunks and apply the local retention policy."
+    )
+    parser.add_argument("--log-dir", default="data")
+    parser.add_argument(
+        "--period", choices=("daily", "weekly"), default=ARCHIVE_PERIOD
+    )
+    parser.add_argument("--bucket", default="aqp-readout-data")
+    parser.add_argument("--local", metavar="ROOT", help="Upload to a local directory")
+    parser.add_argument(
+        "--no-upload", action="store_true", help="Only build local archives"
+    )
+    args = parser.parse_args()
+
+    client = None
+    if args.local:
+        client = LocalS3Client(args.local)
+    elif not args.no_upload:
+        import boto3
+
+        client = boto3.client("s3")
+    archiver = Archiver(args.log_dir, client=client, bucket=args.bucket,
+                        period=args.period)
+    started = time.perf_counter()
+    archived = archiver.run()
+    print(f"{len(archived)} archives in {time.perf_counter() - started:.1f} s; "
+          f"{archiver.local_bytes() / 2**20:.1f} MiB on local disk")
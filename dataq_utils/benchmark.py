@@ -0,0 +1,236 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
+from dataq_utils import di245, di1100
+from dataq_utils.aio_engine import AsyncEngine
+from dataq_utils.multiproc import DeviceProcess
+from dataq_utils.pipeline import AcquisitionPipeline
+from dataq_utils.simulator import DI245Simulator, DI1100Simulator, injected_ports
+
+# Metrics compared against a saved baseline, with whether higher is better
+COMPARED = {
+    "decoded_samples_per_s": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "cpu_s_per_device": False,
+    "dropped_rows": False,
+    "overflow_scans": False,
+}
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+class LatencyProbe:
+    """Pipeline consumer timing each drained batch against its simulator.
+
+    The newest row of a batch maps back to the simulated scan it came from
+    (DI-1100 rows are ``DECIMATION_FACTOR`` scans each), whose due time
+    the simulator knows; the difference is the end-to-end latency from
+    the scan existing at the device to a consumer seeing it decoded.
+    """
+
+    def __init__(self, simulators):
+        self.simulators = simulators  # device_id -> (simulator, scans per row)
+        self.rows = {}
+        self.latencies = []
+
+    def __call__(self, ring, timestamps, values):
+        now = time.monotonic()
+        self.rows[ring.device_id] = self.rows.get(ring.device_id, 0) + len(timestamps)
+        sim, factor = self.simulators[ring.device_id]
+        scan = self.rows[ring.device_id] * factor - 1
+        if sim.t0 is not None:
+            self.latencies.append(now - sim.scan_time(scan))
+
+
+def _run_async(engine, stop_event):
+    async def main():
+        task = asyncio.ensure_future(engine.run())
+        await asyncio.to_thread(stop_event.wait)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def run_benchmark(num_di245=1, num_di1100=1, rate=None, duration=10.0,
+                  engine="threads", warmup=2.0):
+    """Acquire from simulated devices for ``duration`` seconds and measure.
+
+    Devices are found through the normal VID/PID discovery and driven by
+    the real ``manage_*_device`` functions (or the asyncio engine) into an
+    ``AcquisitionPipeline``. Samples and CPU are counted after ``warmup``.
+    """
+    sims = [DI245Simulator(rate=rate, seed=i) for i in range(num_di245)]
+    sims += [DI1100Simulator(rate=rate, seed=i) for i in range(num_di1100)]
+    for sim in sims:
+        sim.start()
+    by_path = {sim.path: sim for sim in sims}
+    with injected_ports(sims):
+        ports = [("di245", p) for p in di245.find_di245_ports() if p in by_path]
+        ports += [("di1100", p) for p in di1100.find_di1100_ports() if p in by_path]
+
+    stop_event = threading.Event()
+    pipeline = AcquisitionPipeline(stop_event)
+    targets = {}
+    for device_id, (dev_type, port) in enumerate(ports):
+        channel_config = ["K"] * 4 if dev_type == "di245" else [0, 1, 2, 3]
+        factor = 1 if dev_type == "di245" else di1100.DECIMATION_FACTOR
+        module = {"di245": di245, "di1100": di1100}[dev_type]
+        ring = pipeline.register(device_id, module.DEVICE_TYPE, channel_config)
+        sim = by_path[port]
+        targets[device_id] = (dev_type, port, channel_config, ring, sim, factor)
+    probe = LatencyProbe({i: (t[4], t[5]) for i, t in targets.items()})
+    pipeline.add_consumer("probe", probe)
+
+    cpu = {}
+
+    def device_thread(device_id, dev_type, port, channel_config, ring):
+        manage = {"di245": di245.manage_di245_device,
+                  "di1100": di1100.manage_di1100_device}[dev_type]
+        manage(port, device_id, channel_config, ring.producer(), stop_event)
+        cpu[device_id] = time.thread_time()
+
+    threads = []
+    if engine == "asyncio":
+        aio = AsyncEngine()
+        for device_id, (dev_type, port, channel_config, ring, _, _) in targets.items():
+            aio.add_device(dev_type, port, device_id, channel_config, ring.producer())
+        threads.append(threading.Thread(target=_run_async, args=(aio, stop_event)))
+    elif engine == "processes":
+        for device_id, (dev_type, port, channel_config, ring, _, _) in targets.items():
+            threads.append(
+                DeviceProcess(dev_type, port, device_id, channel_config, ring)
+            )
+    else:
+        for device_id, (dev_type, port, channel_config, ring, _, _) in targets.items():
+            threads.append(
+                threading.Thread(
+                    target=device_thread,
+                    args=(device_id, dev_type, port, channel_config, ring),
+                )
+            )
+
+    for thread in threads:
+        thread.start()
+    pipeline.start()
+
+    time.sleep(warmup)
+    pushed_before = {i: t[3].pushed_rows for i, t in targets.items()}
+    probe.latencies = []
+    cpu_before = time.process_time()
+    started = time.monotonic()
+    time.sleep(duration)
+    elapsed = time.monotonic() - started
+    cpu_total = time.process_time() - cpu_before
+
+    stop_event.set()
+    for thread in threads:
+        if isinstance(thread, DeviceProcess):
+            thread.stop_event.set()
+        thread.join()
+    pipeline.join()
+    for sim in sims:
+        sim.close()
+
+    devices = []
+    for device_id, (dev_type, port, channel_config, ring, sim, _) in targets.items():
+        rows = ring.pushed_rows - pushed_before[device_id]
+        devices.append(
+            {
+                "device_id": device_id,
+                "type": ring.device_type,
+                "scan_rate": sim.scan_rate(),
+                "decoded_samples_per_s": rows * len(channel_config) / elapsed,
+                "dropped_rows": ring.dropped_rows,
+                "overflow_scans": sim.overflow_scans,
+                "thread_cpu_s": cpu.get(device_id),
+            }
+        )
+    n = max(len(devices), 1)
+    return {
+        "engine": engine,
+        "devices": devices,
+        "duration_s": elapsed,
+        "decoded_samples_per_s": sum(d["decoded_samples_per_s"] for d in devices),
+        "latency_p50_ms": _percentile(probe.latencies, 50) * 1e3,
+        "latency_p99_ms": _percentile(probe.latencies, 99) * 1e3,
+        "latency_max_ms": max(probe.latencies, default=float("nan")) * 1e3,
+        # Process CPU includes the consumers and simulators, so it is an
+        # upper bound on what acquisition itself costs per device (with
+        # "processes" it leaves out the children's decoding)
+        "cpu_s_per_device": cpu_total / n,
+        "dropped_rows": sum(d["dropped_rows"] for d in devices),
+        "overflow_scans": sum(d["overflow_scans"] for d in devices),
+    }
+
+
+def compare(result, baseline):
+    """Lines describing each ``COMPARED`` metric relative to ``baseline``."""
+    lines = []
+    for metric, higher_is_better in COMPARED.items():
+        new, old = result[metric], baseline.get(metric)
+        if old is None:
+            continue
+        change = (new - old) / old * 100 if old else float("nan")
+        better = (new >= old) if higher_is_better else (new <= old)
+        verdict = "better" if better else "worse"
+        lines.append(f"{metric:<24}{old:>14.2f}{new:>14.2f}{change:>+9.1f}%  {verdict}")
+    return lines
+
+
+def print_result(result):
+    print(f"{'device':<8}{'type':<8}{'scan/s':>10}{'samples/s':>14}"
+          f"{'dropped':>10}{'overflow':>10}{'cpu s':>8}")
+    for d in result["devices"]:
+        cpu = "-" if d["thread_cpu_s"] is None else f"{d['thread_cpu_s']:.2f}"
+        print(f"{d['device_id']:<8}{d['type']:<8}{d['scan_rate']:>10.0f}"
+              f"{d['decoded_samples_per_s']:>14.0f}{d['dropped_rows']:>10}"
+              f"{d['overflow_scans']:>10}{cpu:>8}")
+    print(
+        f"\n{result['engine']}: {result['decoded_samples_per_s']:.0f} samples/s, "
+        f"latency p50 {result['latency_p50_ms']:.1f} ms, "
+        f"p99 {result['latency_p99_ms']:.1f} ms, "
+        f"max {result['latency_max_ms']:.1f} ms, "
+        f"{result['cpu_s_per_device']:.2f} CPU s/device"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Throughput and latency of acquisition on simulated devices."
+    )
+    parser.add_argument("--di245", type=int, default=2)
+    parser.add_argument("--di1100", type=int, default=1)
+    parser.add_argument(
+        "--rate", type=float, help="Scans/s per device (default: as configured)"
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--engine", choices=("threads", "asyncio", "processes"), default="threads"
+    )
+    parser.add_argument("--save", metavar="FILE", help="Write the result as JSON")
+    parser.add_argument(
+        "--baseline", metavar="FILE", help="Compare with a saved result"
+    )
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        args.di245, args.di1100, args.rate, args.duration, args.engine
+    )
+    print_result(result)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print()
+            print("\n".join(compare(result, json.load(f))))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=1)
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+CAPTURE_BYTES = 256 * 2**20  # Ring size per device; the oldest reads are overwritten
+MAGIC = b"DQCAP001"
+HEADER_SIZE = 4096  # Fixed fields, then the JSON metadata
+HEADER = struct.Struct("<8sQQQq")  # magic, capacity, head, tail, records
+RECORD = struct.Struct("<QI")  # monotonic_ns, length (+ flag bits)
+SESSION = 0x80000000  # Length flag: payload is the session's wall-clock offset
+PAD = 0xFFFFFFFF  # Rest of the ring up to the wrap point is unused
+ALIGN = 8
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) & ~(ALIGN - 1)
+
+
+class CaptureRing:
+    """Preallocated memory-mapped ring of raw serial reads for one device.
+
+    Every ``write`` appends ``[monotonic_ns, length, bytes]`` with a slice
+    copy into the mapping, so capturing costs about as much as a memcpy.
+    ``head`` and ``tail`` are logical byte positions that only grow; a
+    record never straddles the end of the ring (a PAD marker fills the gap)
+    and the oldest records are dropped from ``tail`` to make room.
+    ``start_session`` marks a stream (re)start along with the offset from
+    the monotonic clock to wall time, so replay can reset its decoder and
+    recover wall-clock timestamps across reboots. Reopening an existing
+    capture without ``metadata`` keeps the metadata stored in it.
+    """
+
+    def __init__(self, path, capacity=CAPTURE_BYTES, metadata=None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        size = HEADER_SIZE + capacity
+        reuse = os.path.exists(path) and os.path.getsize(path) == size
+        self.file = open(path, "r+b" if reuse else "w+b")
+        if not reuse:
+            self.file.truncate(size)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(self.file.fileno(), 0, size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        magic, cap, head, tail, records = HEADER.unpack_from(self.map, 0)
+        valid = magic == MAGIC and cap == capacity
+        if not valid:
+            head = tail = records = 0
+        self.capacity = capacity
+        self.head, self.tail, self.records = head, tail, records
+        if metadata is None and valid:
+            # Reopened without metadata: keep what the capture was made with
+            (length,) = struct.unpack_from("<I", self.map, HEADER.size)
+            start = HEADER.size + 4
+            metadata = json.loads(bytes(self.map[start : start + length]) or b"{}")
+        self.metadata = metadata or {}
+        meta = json.dumps(self.metadata).encode()
+        if HEADER.size + 4 + len(meta) > HEADER_SIZE:
+            raise ValueError("capture metadata too large")
+        struct.pack_into(f"<I{len(meta)}s", self.map, HEADER.size, len(meta), meta)
+        self._publish()
+
+    def _publish(self):
+        HEADER.pack_into(
+            self.map, 0, MAGIC, self.capacity, self.head, self.tail, self.records
+        )
+
+    def _skip_gap(self, pos):
+        """Move ``pos`` past the unused end of the ring if it sits there."""
+        phys = pos % self.capacity
+        if pos < self.head and (
+            self.capacity - phys < RECORD.size
+            or RECORD.unpack_from(self.map, HEADER_SIZE + phys)[1] == PAD
+        ):
+            return pos + self.capacity - phys
+        return pos
+
+    def _next(self, pos):
+        """Logical position of the record after the one at ``pos``."""
+        _, length = RECORD.unpack_from(self.map, HEADER_SIZE + pos % self.capacity)
+        return self._skip_gap(pos + _aligned(RECORD.size + (length & ~SESSION)))
+
+    def _append(self, t_ns, length, payload):
+        size = _aligned(RECORD.size + len(payload))
+        if size > self.capacity // 2:
+            raise ValueError(f"read of {len(payload)} bytes exceeds the capture ring")
+        pos = self.head
+        phys = pos % self.capacity
+        if self.capacity - phys < size:
+            pos += self.capacity - phys  # Wrap; the gap is marked below
+        while self.records and pos + size - self.tail > self.capacity:
+            self.tail = self._next(self.tail)
+            self.records -= 1
+        if pos != self.head and self.capacity - phys >= RECORD.size:
+            RECORD.pack_into(self.map, HEADER_SIZE + phys, 0, PAD)
+        if not self.records:
+            self.tail = pos
+        at = HEADER_SIZE + pos % self.capacity
+        RECORD.pack_into(self.map, at, t_ns, length)
+        self.map[at + RECORD.size : at + RECORD.size + len(payload)] = payload
+        self.head = pos + size
+        self.records += 1
+        self._publish()
+
+    def write(self, data):
+        """Append one raw read, stamped with the monotonic clock."""
+        self._append(time.monotonic_ns(), len(data), data)
+
+    def start_session(self):
+        offset = time.time_ns() - time.monotonic_ns()
+        self._append(time.monotonic_ns(), SESSION | 8, struct.pack("<q", offset))
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+def read_capture(path):
+    """Return (metadata, records) for a capture file.
+
+    ``records`` yields ``(wall_time_s, data)`` from oldest to newest, with
+    ``data`` set to None at each session start.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, capacity, head, tail, records = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a capture file")
+    (meta_len,) = struct.unpack_from("<I", buf, HEADER.size)
+    metadata = json.loads(buf[HEADER.size + 4 : HEADER.size + 4 + meta_len])
+
+    def iterate():
+        offset = 0
+        pos = tail
+        for _ in range(records):
+            phys = pos % capacity
+            if capacity - phys < RECORD.size:
+                pos += capacity - phys
+                phys = 0
+            t_ns, length = RECORD.unpack_from(buf, HEADER_SIZE + phys)
+            if length == PAD:
+                pos += capacity - phys
+                phys = 0
+                t_ns, length = RECORD.unpack_from(buf, HEADER_SIZE + phys)
+            n = length & ~SESSION
+            start = HEADER_SIZE + phys + RECORD.size
+            data = buf[start : start + n]
+            pos += _aligned(RECORD.size + n)
+            if length & SESSION:
+                (offset,) = struct.unpack("<q", data)
+                yield (t_ns + offset) / 1e9, None
+            else:
+                yield (t_ns + offset) / 1e9, data
+
+    return metadata, iterate()
+
+
+def replay(path, handler, make_feed=None):
+    """Decode a capture as fast as possible, calling ``handler(timestamps, block)``.
+
+    ``make_feed(metadata)`` builds the decoder (default: the device module's
+    ``make_feed`` with the current settings, so new calibrations and filters
+    apply). Each session start gets a fresh decoder, like a reconnect
+    would. Rows are stamped by the device's ``ScanClock`` from the recorded
+    arrival times, as live acquisition does. Returns counters for the run.
+    """
+    from dataq_utils import di245, di1100
+
+    metadata, records = read_capture(path)
+    module = {"DI-245": di245, "DI-1100": di1100}[metadata["device_type"]]
+    clock = module.make_clock(metadata["channel_config"])
+    if make_feed is None:
+
+        def make_feed(metadata):
+            return module.make_feed(metadata["channel_config"])
+
+    feed = make_feed(metadata)
+    stats = {"records": 0, "sessions": 0, "bytes": 0, "scans": 0}
+    started = time.perf_counter()
+    for wall_time, data in records:
+        if data is None:
+            feed = make_feed(metadata)
+            clock.reset()
+            stats["sessions"] += 1
+            continue
+        stats["records"] += 1
+        stats["bytes"] += len(data)
+        block = feed(data)
+        if len(block):
+            stats["scans"] += len(block)
+            handler(clock.stamp(len(block), wall_time), block)
+    stats["seconds"] = time.perf_counter() - started
+    return metadata, stats
+
+
+def open_capture(
+    capture_dir, device_type, device_id, port, channel_config, capacity=CAPTURE_BYTES
+):
+    """Capture ring at ``<capture_dir>/<device_type>_<device_id>.cap``."""
+    path = os.path.join(capture_dir, f"{device_type}_{device_id}.cap")
+    metadata = {
+        "device_type": device_type,
+        "device_id": device_id,
+        "port": port,
+        "channel_config": channel_config,
+    }
+    return CaptureRing(path, capacity, metadata)
+
+
+def reprocess(path, out_dir=None, fmt="csv", interval=60.0, chunk_hours=6,
+              conversions=None):
+    """Replay a capture into rollup chunk files, like ``log.py`` writes them.
+
+    DI-1100 channels listed in ``conversions`` (channel -> ChannelConversion)
+    are converted and kept, as with ``DI1100_CONVERSIONS``. Without
+    ``out_dir`` the data is only decoded. Returns (stats, sha256 digest of
+    the decoded values) so a capture doubles as a decoder regression case.
+    """
+    from datetime import datetime
+
+    from dataq_utils.chunk_writer import make_chunk_writer, to_epoch_ns
+    from dataq_utils.conversion import compile_transform
+    from dataq_utils.rollup import IntervalAggregator, stack_rollups
+
+    metadata, _ = read_capture(path)
+    channels = list(range(len(metadata["channel_config"])))
+    transform = None
+    if metadata["device_type"] == "DI-1100" and conversions:
+        transform = compile_transform(conversions, len(channels))
+        channels = list(conversions)
+    aggregator = IntervalAggregator(len(channels), interval)
+    writer = make_chunk_writer(fmt, flush_interval=float("inf")) if out_dir else None
+    digest = hashlib.sha256()
+
+    def write(rollups):
+        if not rollups or writer is None:
+            return
+        starts, means, extra = stack_rollups(rollups)
+        start = datetime.fromtimestamp(starts[0])
+        start = start.replace(
+            hour=start.hour // chunk_hours * chunk_hours, minute=0, second=0,
+            microsecond=0,
+        )
+        name = f"device_readings_{start.strftime('%Y%m%d_%H%M')}{writer.extension}"
+        writer.open(os.path.join(out_dir, name))
+        writer.append(
+            metadata["device_type"], metadata["device_id"], channels,
+            to_epoch_ns(starts), means, extra,
+        )
+
+    def handle(timestamps, block):
+        if transform is not None:
+            block = transform(block)[:, channels]
+        digest.update(np.ascontiguousarray(block, dtype=np.float64).tobytes())
+        write(aggregator.add(timestamps, block))
+
+    _, stats = replay(path, handle)
+    write(aggregator.flush())
+    if writer is not None:
+        writer.close()
+    return stats, digest.hexdigest()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dataq_utils.chunk_writer import WRITERS
+    from dataq_utils.conversion import ChannelConversion
+
+    parser = argparse.ArgumentParser(
+        description="Replay raw captures through the decoders and rollups."
+    )
+    parser.add_argument("captures", nargs="+")
+    parser.add_argument("--out", help="Write rollup chunks here (default: decode only)")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--interval", type=float, default=60.0, help="Rollup seconds")
+    parser.add_argument(
+        "--convert", action="append", default=[], metavar="CH=UNIT",
+        help="DI-1100 channel conversion, e.g. 0=pressure_mbar",
+    )
+    args = parser.parse_args()
+
+    conversions = {
+        int(ch): ChannelConversion(unit=unit)
+        for ch, unit in (item.split("=") for item in args.convert)
+    }
+    for path in args.captures:
+        stats, digest = reprocess(
+            path, args.out, args.format, args.interval, conversions=conversions
+        )
+        rate = stats["bytes"] / stats["seconds"] / 1e6 if stats["seconds"] else 0
+        print(
+            f"{path}: {stats['records']} reads, {stats['sessions']} sessions, "
+            f"{stats['scans']} scans in {stats['seconds']:.2f} s ({rate:.1f} MB/s)"
+        )
+        print(f"  sha256 {digest}")
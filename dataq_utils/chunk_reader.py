@@ -0,0 +1,140 @@
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+from dataq_utils.rollup import ROLLUP_FIELDS
+
+# Names of the CSV columns after ``value, epoch_ns``; rollups are the only
+# blocks written with ``extra`` fields
+CSV_EXTRA_FIELDS = ROLLUP_FIELDS
+
+
+def _pivot(timestamps_ns, channels, columns):
+    """Turn row-per-value columns into (n_scans x n_channels) arrays."""
+    order = list(dict.fromkeys(channels))
+    index = {channel: i for i, channel in enumerate(order)}
+    chan_idx = np.array([index[c] for c in channels], dtype=np.int64)
+    times, row_idx = np.unique(
+        np.asarray(timestamps_ns, dtype=np.int64), return_inverse=True
+    )
+    series = {"channels": order, "timestamp_ns": times}
+    for name, column in columns.items():
+        out = np.full((len(times), len(order)), np.nan)
+        out[row_idx, chan_idx] = column
+        series[name] = out
+    return series
+
+
+def _parse_stamp(stamp):
+    return int(datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").timestamp() * 1e9)
+
+
+def read_csv_chunk(path):
+    rows = {}
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 5:
+                continue
+            try:
+                value = float(row[4])
+            except ValueError:
+                continue  # Header row
+            t_ns = int(row[5]) if len(row) > 5 and row[5] else _parse_stamp(row[0])
+            tail = row[6 : 6 + len(CSV_EXTRA_FIELDS)]
+            extra = [float(x) if x else np.nan for x in tail]
+            extra += [np.nan] * (len(CSV_EXTRA_FIELDS) - len(extra))
+            rows.setdefault((row[1], row[2]), []).append(
+                (t_ns, row[3], value, *extra)
+            )
+
+    chunk = {}
+    for key, device_rows in rows.items():
+        t_ns, channels, *columns = zip(*device_rows)
+        names = ("values",) + CSV_EXTRA_FIELDS
+        columns = {name: np.array(col) for name, col in zip(names, columns)}
+        # Drop extra fields that no row of this device carried
+        columns = {
+            name: col
+            for name, col in columns.items()
+            if name == "values" or not np.isnan(col).all()
+        }
+        chunk[key] = _pivot(t_ns, channels, columns)
+    return chunk
+
+
+def read_hdf5_chunk(path):
+    import h5py
+
+    chunk = {}
+    with h5py.File(path, "r") as f:
+        for device_type, devices in f.items():
+            for device_id, group in devices.items():
+                series = {
+                    "channels": [str(c) for c in group.attrs["channels"]],
+                    "timestamp_ns": group["timestamp_ns"][:],
+                }
+                for name, dataset in group.items():
+                    if name != "timestamp_ns":
+                        series[name] = dataset[:]
+                chunk[(device_type, device_id)] = series
+    return chunk
+
+
+def read_msgpack_chunk(path):
+    import msgpack
+    import msgpack_numpy
+
+    records = {}
+    with open(path, "rb") as f:
+        unpacker = msgpack.Unpacker(f, object_hook=msgpack_numpy.decode, raw=False)
+        for record in unpacker:
+            key = (record.pop("device_type"), str(record.pop("device_id")))
+            records.setdefault(key, []).append(record)
+
+    chunk = {}
+    for key, blocks in records.items():
+        channels = [str(c) for c in blocks[0]["channels"]]
+        fields = dict.fromkeys(
+            name for block in blocks for name in block if name != "channels"
+        )
+        series = {"channels": channels}
+        for name in fields:
+            if name == "timestamp_ns":
+                series[name] = np.concatenate([b[name] for b in blocks])
+                continue
+            series[name] = np.concatenate(
+                [
+                    np.asarray(b[name], dtype=np.float64)
+                    if name in b
+                    else np.full((len(b["timestamp_ns"]), len(channels)), np.nan)
+                    for b in blocks
+                ]
+            )
+        chunk[key] = series
+    return chunk
+
+
+READERS = {
+    ".csv": read_csv_chunk,
+    ".h5": read_hdf5_chunk,
+    ".msgpack": read_msgpack_chunk,
+}
+
+
+def read_chunk(path):
+    """Read a chunk written by any ``ChunkWriter`` back into arrays.
+
+    Returns ``{(device_type, device_id): series}`` where ``device_id`` is a
+    string and each series holds ``channels`` (strings), int64
+    ``timestamp_ns`` (n,) and float64 (n x n_channels) ``values`` plus any
+    extra fields such as the rollup statistics, sorted by time.
+    """
+    chunk = READERS[os.path.splitext(path)[1]](path)
+    for series in chunk.values():
+        order = np.argsort(series["timestamp_ns"], kind="stable")
+        for name, data in series.items():
+            if name != "channels":
+                series[name] = data[order]
+    return chunk
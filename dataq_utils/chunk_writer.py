@@ -0,0 +1,243 @@
+import csv
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from dataq_utils.metrics import histogram
+
+FLUSH_INTERVAL = 5.0  # Seconds between flushes of buffered blocks
+FSYNC = False  # fsync after every flush, so a power cut loses at most one interval
+
+
+def to_epoch_ns(timestamps):
+    """Convert float epoch seconds to int64 epoch nanoseconds."""
+    return np.round(np.asarray(timestamps, dtype=np.float64) * 1e9).astype(np.int64)
+
+
+class ChunkWriter:
+    """Keep the current chunk open and append sample blocks in batches.
+
+    Blocks are buffered in memory and written out every ``flush_interval``
+    seconds, on rotation and on close. Subclasses implement ``_open``,
+    ``_write`` and ``_close`` for one file format.
+    """
+
+    extension = None
+    append_only = True  # Flushed bytes are never rewritten, so they can be shipped incrementally
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, fsync=FSYNC):
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.path = None
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def open(self, path):
+        """Start writing to ``path``, closing the previous chunk if it differs."""
+        if path == self.path:
+            return
+        self.close()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._open(path)
+
+    def append(self, device_type, device_id, channels, timestamps_ns, values, extra=None):
+        """Queue an (n_scans x n_channels) block with its int64 epoch-ns timestamps.
+
+        ``extra`` optionally maps field names (e.g. rollup statistics) to
+        arrays shaped like ``values``; they are stored alongside it.
+        """
+        self.pending.append(
+            (
+                device_type,
+                device_id,
+                list(channels),
+                timestamps_ns,
+                np.asarray(values),
+                extra or {},
+            )
+        )
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.path is None:
+            return
+        with histogram(
+            "dataq_chunk_flush_seconds",
+            "Time to write and sync buffered blocks to a chunk file",
+            format=self.extension,
+        ).time():
+            if self.pending:
+                self._write(self.pending)
+                self.pending = []
+            self._sync()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.path is None:
+            return
+        self.flush()
+        self._close()
+        self.path = None
+
+    def _open(self, path):
+        raise NotImplementedError
+
+    def _write(self, blocks):
+        raise NotImplementedError
+
+    def _sync(self):
+        pass
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class CSVChunkWriter(ChunkWriter):
+    """The original row-per-value CSV layout, plus an epoch-ns column.
+
+    Rows are ``timestamp, device_type, device_id, channel, value, epoch_ns``
+    followed by any ``extra`` fields in order; the first five columns are
+    what the dashboards already parse.
+    """
+
+    extension = ".csv"
+
+    def _open(self, path):
+        self.file = open(path, mode="a", newline="")
+        self.writer = csv.writer(self.file)
+
+    def _write(self, blocks):
+        rows = []
+        for device_type, device_id, channels, timestamps_ns, values, extra in blocks:
+            # Each field converted on its own, so integer ones (the rollup
+            # count) are written as integers rather than promoted to float
+            fields = [np.asarray(c).tolist() for c in [values, *extra.values()]]
+            for t_ns, *field_rows in zip(timestamps_ns.tolist(), *fields):
+                stamp = datetime.fromtimestamp(t_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+                # Cells with nothing in them (a channel the compressed stream
+                # kept no point for) read back as NaN anyway, so skip them
+                rows.extend(
+                    [stamp, device_type, device_id, channel, cell[0], t_ns, *cell[1:]]
+                    for channel, cell in zip(channels, zip(*field_rows))
+                    if not all(x != x for x in cell)
+                )
+        self.writer.writerows(rows)
+
+    def _sync(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def _close(self):
+        self.file.close()
+
+
+class HDF5ChunkWriter(ChunkWriter):
+    """Columnar HDF5 chunk: one group per device with resizable datasets.
+
+    ``/<device_type>/<device_id>/timestamp_ns`` is int64 (n,), ``values`` and
+    each ``extra`` field are float64 (n x n_channels), and the group's
+    ``channels`` attribute names the columns.
+    """
+
+    extension = ".h5"
+    append_only = False
+
+    def _open(self, path):
+        import h5py
+
+        self.file = h5py.File(path, "a")
+
+    def _write(self, blocks):
+        for device_type, device_id, channels, timestamps_ns, values, extra in blocks:
+            name = f"{device_type}/{device_id}"
+            if name not in self.file:
+                group = self.file.create_group(name)
+                group.attrs["channels"] = [str(c) for c in channels]
+                group.create_dataset(
+                    "timestamp_ns", shape=(0,), maxshape=(None,), dtype="i8",
+                    chunks=True,
+                )
+            group = self.file[name]
+            n = group["timestamp_ns"].shape[0]
+            k = len(timestamps_ns)
+            group["timestamp_ns"].resize((n + k,))
+            group["timestamp_ns"][n:] = timestamps_ns
+            for field, data in {"values": values, **extra}.items():
+                if field not in group:
+                    group.create_dataset(
+                        field, shape=(n, len(channels)),
+                        maxshape=(None, len(channels)), dtype="f8", chunks=True,
+                        fillvalue=np.nan,
+                    )
+                group[field].resize((n + k, len(channels)))
+                group[field][n:] = data
+
+    def _sync(self):
+        self.file.flush()
+        if self.fsync:
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _close(self):
+        self.file.close()
+
+
+class MsgpackChunkWriter(ChunkWriter):
+    """Append-only stream of msgpack-numpy records, one per block.
+
+    Each record is a map with ``device_type``, ``device_id``, ``channels``,
+    ``timestamp_ns``, ``values`` and any ``extra`` fields; read back with
+    ``msgpack.Unpacker``.
+    """
+
+    extension = ".msgpack"
+
+    def _open(self, path):
+        import msgpack
+        import msgpack_numpy
+
+        self.packer = msgpack.Packer(default=msgpack_numpy.encode)
+        self.file = open(path, mode="ab")
+
+    def _write(self, blocks):
+        for device_type, device_id, channels, timestamps_ns, values, extra in blocks:
+            self.file.write(
+                self.packer.pack(
+                    {
+                        "device_type": device_type,
+                        "device_id": device_id,
+                        "channels": channels,
+                        "timestamp_ns": timestamps_ns,
+                        "values": values,
+                        **extra,
+                    }
+                )
+            )
+
+    def _sync(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def _close(self):
+        self.file.close()
+
+
+WRITERS = {
+    "csv": CSVChunkWriter,
+    "hdf5": HDF5ChunkWriter,
+    "msgpack": MsgpackChunkWriter,
+}
+
+
+def make_chunk_writer(name, **kwargs):
+    """Build one of the writers in ``WRITERS`` by name."""
+    return WRITERS[name](**kwargs)
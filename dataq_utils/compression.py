@@ -0,0 +1,278 @@
+import numpy as np
+
+# Share of the error bound given to the deadband: a little drops sensor noise
+# cheaply, but each share comes off the door twice
+EXCEPTION_FRACTION = 0.05
+MAX_INTERVAL = 600.0  # Seconds between kept points, even on a flat signal
+
+
+class SwingingDoor:
+    """Streaming exception (deadband) plus swinging-door compression of one
+    channel.
+
+    A point is first dropped if it is within ``deadband`` of the last point
+    that passed; otherwise it and the point held back before it go on to the
+    swinging door, which keeps a point only when no straight line from the
+    last kept point stays within ``tolerance - 2 * deadband`` of everything
+    since. The kept point is the previous one, moved onto the nearest line
+    that still fits (so its value can differ from the sample by up to the
+    door width); linear interpolation between kept points then reproduces
+    every input within ``tolerance``. A point is kept at least every
+    ``max_interval`` seconds, and a NaN ends the segment (NaNs themselves
+    are not kept).
+    """
+
+    def __init__(self, tolerance, deadband=None, max_interval=MAX_INTERVAL):
+        self.tolerance = tolerance
+        self.deadband = tolerance * EXCEPTION_FRACTION if deadband is None else deadband
+        self.door = tolerance - 2 * self.deadband
+        if self.door < 0:
+            raise ValueError("deadband must be at most half the tolerance")
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self):
+        self.archive = None  # (t, v) of the last kept point
+        self.held = None  # Newest point through the deadband, kept if the door closes
+        self.upper = -np.inf  # Steepest slope seen from the upper pivot
+        self.lower = np.inf  # Shallowest slope seen from the lower pivot
+        self.passed = None  # Last point through the deadband
+        self.skipped = None  # Newest point the deadband dropped
+
+    def _swing(self, t, v, out):
+        if self.archive is None:
+            self.archive = (t, v)
+            out.append(self.archive)
+            return
+        at, av = self.archive
+        dt = t - at
+        if dt <= 0:
+            return
+        upper = max(self.upper, (v - av - self.door) / dt)
+        lower = min(self.lower, (v - av + self.door) / dt)
+        if self.held is not None and (upper > lower or dt > self.max_interval):
+            # No line through the doors fits any more: keep the previous point
+            self.archive = at, av = self._fitted()
+            out.append(self.archive)
+            dt = t - at
+            upper = (v - av - self.door) / dt
+            lower = (v - av + self.door) / dt
+        self.upper, self.lower = upper, lower
+        self.held = (t, v)
+
+    def _fitted(self):
+        """The held point moved onto the fitting line closest to it."""
+        (at, av), (t, v) = self.archive, self.held
+        slope = min(max((v - av) / (t - at), self.upper), self.lower)
+        return t, av + slope * (t - at)
+
+    def add(self, t, v, out):
+        """Feed one point; kept ``(t, v)`` points are appended to ``out``."""
+        if v != v:
+            self.flush(out)
+            return
+        passed = self.passed
+        if (
+            passed is None
+            or abs(v - passed[1]) > self.deadband
+            or t - passed[0] >= self.max_interval
+        ):
+            if self.skipped is not None:
+                self._swing(*self.skipped, out)
+                self.skipped = None
+            self._swing(t, v, out)
+            self.passed = (t, v)
+        else:
+            self.skipped = (t, v)
+
+    def flush(self, out):
+        """Keep whatever is pending and end the segment, e.g. at chunk rotation."""
+        if self.skipped is not None:
+            self._swing(*self.skipped, out)
+        if self.held is not None:
+            out.append(self._fitted())
+        self.reset()
+
+
+class BlockCompressor:
+    """A ``SwingingDoor`` per channel, fed (n_scans x n_channels) blocks.
+
+    ``add`` and ``flush`` return ``(timestamps, values)`` holding the union
+    of the points any channel kept, with NaN where a channel kept nothing at
+    that time, so the result goes to any ``ChunkWriter`` unchanged.
+    """
+
+    def __init__(self, tolerances, **kwargs):
+        self.doors = [SwingingDoor(tolerance, **kwargs) for tolerance in tolerances]
+
+    def _collect(self, kept):
+        times = np.unique([t for points in kept for t, _ in points])
+        values = np.full((len(times), len(kept)), np.nan)
+        for c, points in enumerate(kept):
+            if points:
+                t, v = zip(*points)
+                values[np.searchsorted(times, t), c] = v
+        return times, values
+
+    def add(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.float64).tolist()
+        columns = np.asarray(values, dtype=np.float64).T.tolist()
+        kept = [[] for _ in self.doors]
+        for door, column, out in zip(self.doors, columns, kept):
+            add = door.add
+            for t, v in zip(timestamps, column):
+                add(t, v, out)
+        return self._collect(kept)
+
+    def flush(self):
+        kept = [[] for _ in self.doors]
+        for door, out in zip(self.doors, kept):
+            door.flush(out)
+        return self._collect(kept)
+
+
+def reconstruct(series, timestamp_ns, max_gap=2 * MAX_INTERVAL):
+    """Rebuild a compressed series at ``timestamp_ns`` (epoch ns).
+
+    ``series`` is shaped like ``chunk_reader.read_chunk`` returns it, NaN
+    marking channels that kept no point at a time. Each channel is
+    interpolated linearly between its kept points; times outside them, or
+    inside a span wider than ``max_gap`` seconds (kept points are never
+    further apart than ``max_interval`` and one sample period, so this is
+    missing data), are NaN. Returns (n x n_channels) values.
+    """
+    at = np.asarray(timestamp_ns, dtype=np.int64)
+    stamps = np.asarray(series["timestamp_ns"], dtype=np.int64)
+    values = np.asarray(series["values"], dtype=np.float64).reshape(len(stamps), -1)
+    out = np.full((len(at), values.shape[1]), np.nan)
+    for c in range(values.shape[1]):
+        mask = ~np.isnan(values[:, c])
+        t, v = stamps[mask], values[mask, c]
+        if not len(t):
+            continue
+        out[:, c] = np.interp(at, t, v, left=np.nan, right=np.nan)
+        k = np.searchsorted(t, at, side="right")
+        lo = np.clip(k - 1, 0, len(t) - 1)
+        hi = np.clip(k, 0, len(t) - 1)
+        out[(t[hi] - t[lo] > max_gap * 1e9) & (t[lo] != at), c] = np.nan
+    return out
+
+
+def _recorded_blocks(path):
+    """(device key, channels, [(timestamps, block), ...]) from a capture or chunk."""
+    if path.endswith(".cap"):
+        from dataq_utils.capture import replay
+
+        blocks = []
+        metadata, _ = replay(path, lambda t, block: blocks.append((t, block)))
+        channels = [str(c) for c in range(len(metadata["channel_config"]))]
+        key = (metadata["device_type"], str(metadata["device_id"]))
+        return [(key, channels, blocks)]
+
+    from dataq_utils.chunk_reader import read_chunk
+
+    recorded = []
+    for key, s in read_chunk(path).items():
+        t = s["timestamp_ns"] / 1e9
+        # Fed in blocks of 256 rows, as the read loops deliver them
+        blocks = [
+            (t[i : i + 256], s["values"][i : i + 256]) for i in range(0, len(t), 256)
+        ]
+        recorded.append((key, s["channels"], blocks))
+    return recorded
+
+
+def benchmark(paths, tolerances, **kwargs):
+    """Compress recorded data and measure it against the original.
+
+    ``paths`` are captures (``.cap``) or full-rate chunk files such as the
+    ``raw_`` stream; ``tolerances`` maps a device type to its error bound.
+    Returns one result per channel with the points in and out, the ratio
+    and the largest reconstruction error.
+    """
+    import time
+
+    results = []
+    for path in paths:
+        for key, channels, blocks in _recorded_blocks(path):
+            if not blocks:
+                continue
+            compressor = BlockCompressor(
+                [tolerances.get(key[0], 0.0)] * len(channels), **kwargs
+            )
+            kept = []
+            started = time.perf_counter()
+            for timestamps, block in blocks:
+                kept.append(compressor.add(timestamps, block))
+            kept.append(compressor.flush())
+            seconds = time.perf_counter() - started
+
+            stamps = np.concatenate([t for t, _ in blocks])
+            original = np.concatenate([b for _, b in blocks]).reshape(len(stamps), -1)
+            times = np.concatenate([t for t, _ in kept])
+            values = np.concatenate([v for _, v in kept])
+            rebuilt = reconstruct(
+                {"timestamp_ns": np.round(times * 1e9), "values": values},
+                np.round(stamps * 1e9),
+            )
+            error = np.abs(rebuilt - original)
+            for c, channel in enumerate(channels):
+                valid = ~np.isnan(original[:, c])
+                points = int((~np.isnan(values[:, c])).sum())
+                results.append(
+                    {
+                        "device": " - ".join(key),
+                        "channel": channel,
+                        "tolerance": compressor.doors[c].tolerance,
+                        "points_in": int(valid.sum()),
+                        "points_out": points,
+                        "ratio": valid.sum() / max(points, 1),
+                        "max_error": float(np.nanmax(error[valid, c], initial=0.0)),
+                        "us_per_point": seconds / max(original.size, 1) * 1e6,
+                    }
+                )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compression ratio and error of swinging-door compression "
+        "on recorded captures or raw chunk files."
+    )
+    parser.add_argument("paths", nargs="+", help=".cap captures or chunk files")
+    parser.add_argument(
+        "--tolerance",
+        action="append",
+        default=[],
+        metavar="TYPE=BOUND",
+        help="Error bound per device type, e.g. DI-245=0.1 (repeatable)",
+    )
+    parser.add_argument("--deadband", type=float, help="Absolute deadband")
+    parser.add_argument("--max-interval", type=float, default=MAX_INTERVAL)
+    args = parser.parse_args()
+
+    tolerances = {}
+    for item in args.tolerance:
+        device_type, bound = item.split("=")
+        tolerances[device_type] = float(bound)
+    results = benchmark(
+        args.paths, tolerances, deadband=args.deadband, max_interval=args.max_interval
+    )
+    print(
+        f"{'device':<14}{'ch':<5}{'bound':>8}{'in':>10}{'out':>9}"
+        f"{'ratio':>9}{'max err':>10}{'us/pt':>7}"
+    )
+    for r in results:
+        print(
+            f"{r['device']:<14}{r['channel']:<5}{r['tolerance']:>8g}"
+            f"{r['points_in']:>10}{r['points_out']:>9}{r['ratio']:>9.1f}"
+            f"{r['max_error']:>10.4g}{r['us_per_point']:>7.2f}"
+        )
+    points_in = sum(r["points_in"] for r in results)
+    points_out = sum(r["points_out"] for r in results)
+    print(
+        f"total: {points_in} -> {points_out} points "
+        f"({points_in / max(points_out, 1):.1f}x)"
+    )
@@ -0,0 +1,110 @@
+import numpy as np
+
+# DI-245 thermocouple mode reports counts already linear in temperature:
+# T = m * counts + b over the full 14-bit range.
+TC_M = {
+    "B": 0.095825,
+    "E": 0.073242,
+    "J": 0.08606,
+    "K": 0.095947,
+    "N": 0.091553,
+    "R": 0.110962,
+    "S": 0.110962,
+    "T": 0.036621,
+}
+TC_B = {
+    "B": 1035,
+    "E": 400,
+    "J": 495,
+    "K": 586,
+    "N": 550,
+    "R": 859,
+    "S": 859,
+    "T": 100,
+}
+
+ADC_MIN = -8192
+TABLE_SIZE = 16384
+
+_tables = {}  # Thermocouple type -> table
+
+
+def build_tc_table(tc_type):
+    """Build the count -> °C table for every possible 14-bit ADC value,
+    on the DI-245's own thermocouple-mode scale."""
+    if tc_type not in TC_M:
+        raise ValueError(
+            f"unknown thermocouple type {tc_type!r}; expected one of {sorted(TC_M)}"
+        )
+    counts = np.arange(ADC_MIN, ADC_MIN + TABLE_SIZE, dtype=np.float64)
+    return TC_M[tc_type] * counts + TC_B[tc_type]
+
+
+def get_tc_table(tc_type):
+    """Return the table for ``tc_type``, built on first use."""
+    if tc_type not in _tables:
+        _tables[tc_type] = build_tc_table(tc_type)
+    return _tables[tc_type]
+
+
+def temperature_tables(channel_config):
+    """Stack the tables for each channel into an (n_channels x TABLE_SIZE) array."""
+    return np.stack([get_tc_table(t) for t in channel_config])
+
+
+def counts_to_temperature(tables, adc_block):
+    """Look up an (n_scans x n_channels) block of ADC counts in stacked tables."""
+    return tables[np.arange(tables.shape[0]), adc_block.astype(np.intp) - ADC_MIN]
+
+
+def pressure_gauge_mbar(volts):
+    """Ion gauge controller analog output (log scale) to mbar."""
+    return 10 ** ((volts - 7.75) / 0.75)
+
+
+UNITS = {
+    "volts": None,
+    "celsius": None,
+    "pressure_mbar": pressure_gauge_mbar,
+}
+
+
+class ChannelConversion:
+    """Calibration and unit conversion for one analog channel.
+
+    The calibrated value is ``raw * gain + offset``; ``unit`` then names an
+    entry in ``UNITS`` applied on top.
+    """
+
+    def __init__(self, unit="volts", gain=1.0, offset=0.0):
+        if unit not in UNITS:
+            raise ValueError(f"Unknown unit {unit!r}, expected one of {list(UNITS)}")
+        self.unit = unit
+        self.gain = gain
+        self.offset = offset
+
+
+def compile_transform(conversions, num_channels):
+    """Compile per-channel conversions into one function over sample blocks.
+
+    ``conversions`` maps channel index to ``ChannelConversion``; channels
+    without an entry pass through unchanged. The returned function takes an
+    (n_scans x num_channels) block and returns a converted float64 copy.
+    """
+    gains = np.ones(num_channels)
+    offsets = np.zeros(num_channels)
+    by_unit = {}
+    for channel, conv in conversions.items():
+        gains[channel] = conv.gain
+        offsets[channel] = conv.offset
+        if UNITS[conv.unit] is not None:
+            by_unit.setdefault(conv.unit, []).append(channel)
+    unit_columns = [(UNITS[u], np.array(cols)) for u, cols in by_unit.items()]
+
+    def transform(block):
+        out = np.asarray(block, dtype=np.float64) * gains + offsets
+        for func, cols in unit_columns:
+            out[:, cols] = func(out[:, cols])
+        return out
+
+    return transform
@@ -0,0 +1,93 @@
+import numpy as np
+
+# Streaming decimators for (n_samples x n_channels) blocks. Each keeps just
+# enough state between calls that feeding a stream in arbitrary pieces gives
+# the same output as feeding it in one go.
+
+
+class BoxcarDecimator:
+    """Average every ``factor`` consecutive samples (the original DI-1100 filter)."""
+
+    def __init__(self, factor, num_channels):
+        self.factor = factor
+        self.num_channels = num_channels
+        self.pending = np.empty((0, num_channels), dtype=np.float64)
+
+    def process(self, block):
+        block = np.concatenate((self.pending, block))
+        n_out = len(block) // self.factor
+        used = n_out * self.factor
+        self.pending = block[used:]
+        return block[:used].reshape(n_out, self.factor, self.num_channels).mean(axis=1)
+
+
+class CICDecimator:
+    """Cascaded integrator-comb decimator with ``stages`` sections and delay 1.
+
+    Runs in int64 so integrator wrap-around cancels in the combs exactly as
+    in a hardware CIC; the output is normalised by the filter gain.
+    """
+
+    def __init__(self, factor, num_channels, stages=3):
+        self.factor = factor
+        self.stages = stages
+        self.gain = float(factor) ** stages
+        self.integrators = np.zeros((stages, num_channels), dtype=np.int64)
+        self.combs = np.zeros((stages, num_channels), dtype=np.int64)
+        self.phase = 0
+
+    def process(self, block):
+        y = np.asarray(block, dtype=np.int64)
+        for s in range(self.stages):
+            y = np.cumsum(y, axis=0) + self.integrators[s]
+            if len(y):
+                self.integrators[s] = y[-1]
+
+        # Keep every factor-th integrator output, continuing the phase
+        start = (-self.phase) % self.factor
+        self.phase = (self.phase + len(y)) % self.factor
+        y = y[start :: self.factor]
+
+        for s in range(self.stages):
+            prev = np.concatenate((self.combs[s][None, :], y[:-1]))
+            if len(y):
+                self.combs[s] = y[-1]
+            y = y - prev
+        return y / self.gain
+
+
+class FIRDecimator:
+    """Windowed-sinc low-pass FIR followed by downsampling by ``factor``."""
+
+    def __init__(self, factor, num_channels, taps_per_phase=8, window="hamming"):
+        self.factor = factor
+        num_taps = taps_per_phase * factor + 1
+        n = np.arange(num_taps) - (num_taps - 1) / 2
+        taps = np.sinc(n / factor) * getattr(np, window)(num_taps)
+        self.taps = taps / taps.sum()
+        self.history = np.zeros((num_taps - 1, num_channels), dtype=np.float64)
+        self.phase = 0
+
+    def process(self, block):
+        x = np.concatenate((self.history, block))
+        self.history = x[len(x) - len(self.history) :]
+
+        start = (-self.phase) % self.factor
+        self.phase = (self.phase + len(block)) % self.factor
+        # Output i ends at input sample len(history) + start + i * factor
+        windows = np.lib.stride_tricks.sliding_window_view(
+            x, len(self.taps), axis=0
+        )[start :: self.factor]
+        return windows @ self.taps[::-1]
+
+
+FILTERS = {
+    "boxcar": BoxcarDecimator,
+    "cic": CICDecimator,
+    "fir": FIRDecimator,
+}
+
+
+def make_decimator(name, factor, num_channels, **kwargs):
+    """Build one of the decimators in ``FILTERS`` by name."""
+    return FILTERS[name](factor, num_channels, **kwargs)
@@ -1,13 +1,23 @@
+import numpy as np
 import serial
 from serial.tools import list_ports
 import time
 import sys, os
 
+from dataq_utils.decimation import make_decimator
+from dataq_utils.metrics import instrument_feed, observe_backlog
+from dataq_utils.timing import ScanClock
+
 # Constants for DI-1100 Protocol
+DEVICE_TYPE = "DI-1100"
 VID = 0x0683
 PID = 0x1101
 DECIMATION_FACTOR = 10  # From test.py, to reduce noise
-achan_accumulation_table = []  # Accumulated values for averaging
+DECIMATION_FILTER = "boxcar"  # One of decimation.FILTERS: boxcar, cic, fir
+SRATE_DIVISOR = 60000  # srate argument: 250 scans/s over 4 channels, 25 Hz decimated
+SAMPLE_CLOCK = 60_000_000  # srate divides this clock, shared across the slist
+COUNTS_TO_VOLTS = 10 / 32768
+DIG_IN_MASK = 0x3  # dig_in states live in the two LSBs of slist position 0
 
 def find_di1100_ports():
     """Auto-detect DI-1100 USB devices by VID and PID."""
@@ -41,79 +51,88 @@ def configure_scan_list(ser, channels):
     """Configure the scan list for the selected channels."""
     for i, channel in enumerate(channels):
         send_command(ser, f"slist {i} {channel}")
-        achan_accumulation_table.append(0)  # Initialize the accumulator for each channel
     print(f"Scan list configured: {channels}")
 
 def set_sample_rate(ser, divisor):
     """Set the sample rate based on the given divisor."""
     send_command(ser, f"srate {divisor}")
 
-def log(voltage_buffer, channel_config, device_id, log_func, print_lock):
-    with print_lock:  # Ensure only one thread prints at a time
-        log_func(voltage_buffer, channel_config, device_id)
+def scan_rate(channel_config, divisor=SRATE_DIVISOR):
+    """Scans/s for ``srate divisor`` with ``channel_config`` in the scan list."""
+    return SAMPLE_CLOCK / divisor / len(channel_config)
+
+def make_clock(channel_config, factor=DECIMATION_FACTOR):
+    """``ScanClock`` for the decimated rows ``make_feed`` returns."""
+    return ScanClock(scan_rate(channel_config) / factor)
+
+def log(voltage_block, channel_config, device_id, log_func):
+    # log_func only pushes into this device's ring buffer, so no lock is needed
+    log_func(voltage_block, channel_config, device_id)
+
+class DI1100Stream:
+    """Turn raw DI-1100 bytes into decimated (n_scans x n_channels) voltage blocks.
+
+    Samples are 2-byte little-endian signed values in slist order; partial
+    scans are carried over to the next call to ``feed``.
+    """
+
+    def __init__(
+        self, num_channels, filter_name=DECIMATION_FILTER, factor=DECIMATION_FACTOR
+    ):
+        self.num_channels = num_channels
+        self.scan_bytes = 2 * num_channels
+        self.pending = b""
+        self.dig_in = 0
+        self.decimator = make_decimator(filter_name, factor, num_channels)
+
+    def feed(self, data):
+        data = self.pending + data
+        used = len(data) - len(data) % self.scan_bytes
+        self.pending = data[used:]
+
+        counts = np.frombuffer(data[:used], dtype="<i2").reshape(-1, self.num_channels)
+        if len(counts):
+            self.dig_in = int(counts[-1, 0]) & DIG_IN_MASK
+        counts = counts.astype(np.int64)
+        # Strip dig_in bits from slist position 0, preserving sign
+        counts[:, 0] &= ~DIG_IN_MASK
+        return self.decimator.process(counts) * COUNTS_TO_VOLTS
 
-def read_data(ser, channel_config, device_id, log_func, stop_event, print_lock):
+
+def make_feed(
+    channel_config, filter_name=DECIMATION_FILTER, factor=DECIMATION_FACTOR
+):
+    """Return feed(data) -> decimated voltage block for a scan-aligned byte stream."""
+    return DI1100Stream(len(channel_config), filter_name, factor).feed
+
+
+def open_stream(ser, channel_config):
+    """Return feed(data) -> decimated voltage block for a scanning device."""
+    return instrument_feed(make_feed(channel_config), DEVICE_TYPE)
+
+
+def read_data(ser, channel_config, device_id, log_func, stop_event, capture=None):
     """Read and log voltage readings from the DI-1100 using decimation to reduce noise."""
     num_channels = len(channel_config)
-    slist_pointer = 0
-    dec_count = DECIMATION_FACTOR
-    achan_accumulation_table = [0 for _ in range(num_channels)]
-    achan_number = 0
+    feed = open_stream(ser, channel_config)
+    if capture is not None:
+        capture.start_session()
 
     try:
         while not stop_event.is_set():
-            while (ser.inWaiting() > (2 * num_channels)):
-                for i in range(num_channels):
-                    # Always two bytes per sample...read them
-                    b = ser.read(2)
-                    # Only analog channels for a DI-1100, with dig_in states appearing in the two LSBs of ONLY the first slist position
-                    result = int.from_bytes(b, byteorder='little', signed=True)
-                    if (dec_count == 1) and (slist_pointer == 0):
-                        dig_in = result & 0x3
-                        # Strip two LSBs from value to be added to the analog channel accumulation, preserving sign
-                        result = result >> 2
-                        result = result << 2
-                        # Add the value to the accumulator
-                        achan_accumulation_table[achan_number] += result
-                        achan_number += 1
-                    elif (dec_count == 1) and (slist_pointer != 0):
-                        # Just add value to the accumulator
-                        achan_accumulation_table[achan_number] += result
-                        achan_number += 1
-                    elif (dec_count != 1) and (slist_pointer == 0):
-                        # Just strip two LSBs, preserving sign, and add to accumulator
-                        result = result >> 2
-                        result = result << 2
-                        achan_accumulation_table[achan_number] += result
-                        achan_number += 1
-                    else:
-                        # Nothing to do except add the value to the accumulator
-                        achan_accumulation_table[achan_number] += result
-                        achan_number += 1
-
-                    # Get the next position in slist
-                    slist_pointer += 1
-
-                    if (slist_pointer + 1) > num_channels:
-                        # End of a pass through slist items
-                        if dec_count == 1:
-                            # Decimation complete, convert accumulated values to voltages
-                            voltages = [
-                                (achan_accumulation_table[j] * 10 / 32768 / DECIMATION_FACTOR)
-                                for j in range(num_channels)
-                            ]
-                            # Reset accumulators
-                            achan_accumulation_table = [0] * num_channels
-                            # Log the voltages
-                            log(voltages, channel_config, device_id, log_func, print_lock)
-                            dec_count = DECIMATION_FACTOR
-                        else:
-                            dec_count -= 1
-
-                        slist_pointer = 0
-                        achan_number = 0
-
-            time.sleep(0.1)  # Small delay to reduce CPU usage
+            # Block for at least one scan (bounded by the port timeout), then
+            # drain everything else that is already buffered
+            waiting = ser.in_waiting
+            observe_backlog(DEVICE_TYPE, device_id, waiting)
+            data = ser.read(max(waiting, 2 * num_channels))
+            if not data:
+                continue
+            if capture is not None:
+                capture.write(data)
+
+            voltages = feed(data)
+            if len(voltages):
+                log(voltages, channel_config, device_id, log_func)
     except Exception as e:
         print(f"Error reading data: {e}")
         exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -123,16 +142,23 @@ def read_data(ser, channel_config, device_id, log_func, stop_event, print_lock):
         stop_scanning(ser)
 
 
-def manage_di1100_device(port, device_id, channel_config, log_func, stop_event, print_lock):
-    """Manage a single DI-1100 device."""
+def configure_device(ser, channel_config):
+    """Stop any running scan, load the scan list and rate, and start scanning."""
+    stop_scanning(ser)
+    configure_scan_list(ser, channel_config)
+    set_sample_rate(ser, SRATE_DIVISOR)
+    start_scanning(ser)
+    time.sleep(1)
+
+
+def manage_di1100_device(
+    port, device_id, channel_config, log_func, stop_event, capture=None
+):
+    """Manage a single DI-1100 device, optionally capturing its raw reads."""
     ser = connect_to_device(port)
     if ser:
         try:
-            stop_scanning(ser)
-            configure_scan_list(ser, channel_config)
-            set_sample_rate(ser, 60000)  # 10 Hz sample rate
-            start_scanning(ser)
-            time.sleep(1)
-            read_data(ser, channel_config, device_id, log_func, stop_event, print_lock)
+            configure_device(ser, channel_config)
+            read_data(ser, channel_config, device_id, log_func, stop_event, capture)
         finally:
             ser.close()
@@ -1,6 +1,21 @@
+import numpy as np
 import serial
 from serial.tools import list_ports
 
+from dataq_utils.conversion import (
+    TC_M,
+    TC_B,
+    counts_to_temperature,
+    temperature_tables,
+)
+from dataq_utils.metrics import instrument_feed, observe_backlog
+from dataq_utils.timing import ScanClock
+
+DEVICE_TYPE = "DI-245"
+VID = 0x0683
+PID = 0x2450
+BURST_RATE = 20.0  # Scans/s shared across the enabled channels
+
 
 def send_command(ser, command):
     full_command = b"\x00" + command.encode()
@@ -14,7 +29,7 @@ def find_di245_ports():
     ports = list_ports.comports()
     p245 = []
     for port in ports:
-        if port.vid == 0x0683 and port.pid == 0x2450:
+        if port.vid == VID and port.pid == PID:
             print(f"DI-245 found on {port.device}")
             p245.append(port.device)
     return p245
@@ -31,28 +46,7 @@ def connect_to_device(port, baudrate=115200):
 
 
 def derive_temp(tc_type, adc_counts):
-    tc_m = {
-        "B": 0.095825,
-        "E": 0.073242,
-        "J": 0.08606,
-        "K": 0.095947,
-        "N": 0.091553,
-        "R": 0.110962,
-        "S": 0.110962,
-        "T": 0.036621,
-    }
-    tc_b = {
-        "B": 1035,
-        "E": 400,
-        "J": 495,
-        "K": 586,
-        "N": 550,
-        "R": 859,
-        "S": 859,
-        "T": 100,
-    }
-
-    return tc_m[tc_type] * adc_counts + tc_b[tc_type]
+    return TC_M[tc_type] * adc_counts + TC_B[tc_type]
 
 
 def configure_thermocouple_channel(ser, channel=0, thermocouple_type="K"):
@@ -90,10 +84,8 @@ def set_sample_rate(ser, channels=1):
     arg0 = (AF << 7) | SF
 
     # Set the desired burst rate in arg1 (closest value from table is 3.58 Hz)
-    burst_rate = 20.0
-
     # Adjust burst rate for number of channels
-    effective_rate = burst_rate / channels
+    effective_rate = BURST_RATE / channels
 
     # Build the command and send it to the device
     command = f"xrate {arg0} {int(effective_rate)}\r"
@@ -103,6 +95,16 @@ def set_sample_rate(ser, channels=1):
     )
 
 
+def scan_rate(channel_config):
+    """Scans/s the device is configured for by ``set_sample_rate``."""
+    return int(BURST_RATE / len(channel_config))
+
+
+def make_clock(channel_config):
+    """``ScanClock`` for the temperature rows ``make_feed`` returns."""
+    return ScanClock(scan_rate(channel_config))
+
+
 def start_scanning(ser):
     ser.write(b"\x00S1")
 
@@ -111,83 +113,123 @@ def stop_scanning(ser):
     ser.write(b"\x00S0")
 
 
-def log(temperature_buffer, channel_config, device_id, log_func, print_lock):
-    with print_lock:  # Ensure only one thread prints at a time
-        log_func(temperature_buffer, channel_config, device_id)
+def log(temperature_block, channel_config, device_id, log_func):
+    # log_func only pushes into this device's ring buffer, so no lock is needed
+    log_func(temperature_block, channel_config, device_id)
+
+
+class DI245Decoder:
+    """Incremental decoder for the DI-245 binary stream.
+
+    Every sample is a 2-byte frame carrying 7 data bits per byte; bit 0 of
+    each byte is the sync flag, which is 0 only on the first byte of the
+    first channel in a scan. Partial scans are carried over between calls to
+    ``feed`` and scans with a misplaced sync byte are dropped.
+    """
+
+    def __init__(self, num_channels):
+        self.num_channels = num_channels
+        self.scan_bytes = 2 * num_channels
+        self.pending = np.empty(0, dtype=np.uint8)
+        self.bad_scans = 0
+
+    def feed(self, data):
+        """Decode raw bytes into an (n_scans x n_channels) array of ADC counts."""
+        buf = np.concatenate((self.pending, np.frombuffer(data, dtype=np.uint8)))
+        starts = np.flatnonzero((buf & 1) == 0)
+        if starts.size == 0:
+            self.pending = np.empty(0, dtype=np.uint8)
+            return np.empty((0, self.num_channels), dtype=np.int16)
+
+        # A scan is good when the next sync byte is exactly one scan away, or
+        # when it is the last sync in the buffer and the scan is complete.
+        gaps = np.diff(starts, append=buf.size)
+        last_complete = gaps[-1] >= self.scan_bytes
+        good = gaps == self.scan_bytes
+        good[-1] = last_complete
+        self.bad_scans += int(np.count_nonzero(~good[:-1]))
+
+        if last_complete:
+            self.bad_scans += int(gaps[-1] > self.scan_bytes)
+            self.pending = np.empty(0, dtype=np.uint8)
+        else:
+            self.pending = buf[starts[-1] :].copy()
+
+        idx = starts[good][:, None] + np.arange(self.scan_bytes)
+        frames = (buf[idx] >> 1).astype(np.int16).reshape(-1, self.num_channels, 2)
+        adc = ((frames[..., 1] & 0x7F) << 7) | frames[..., 0]
+        adc ^= 1 << 13
+        adc -= (adc & (1 << 13)) << 1
+        return adc
+
+
+def make_feed(channel_config):
+    """Return feed(data) -> temperature block for a synced byte stream."""
+    decoder = DI245Decoder(len(channel_config))
+    tables = temperature_tables(channel_config)
+    return lambda data: counts_to_temperature(tables, decoder.feed(data))
+
+
+def open_stream(ser, channel_config):
+    """Sync with the data stream; returns feed(data) -> temperature block."""
+    ser.read_until(b"S1")  # Sync with data stream
+    return instrument_feed(make_feed(channel_config), DEVICE_TYPE)
 
 
-def read_data(ser, channel_config, device_id, log_func, stop_event, print_lock):
-    num_channels = len(channel_config)
-    ser.read_until(b"S1")  # Sync with data stream
-    current_channel = 0
-    current_byte = 0
-    temperature_buffer = [0 for _ in range(num_channels)]
-    adc_buffer = [0 for _ in range(num_channels)]
-    lsb = 0
+def read_data(ser, channel_config, device_id, log_func, stop_event, capture=None):
+    feed = open_stream(ser, channel_config)
+    if capture is not None:
+        capture.start_session()
 
     try:
         while not stop_event.is_set():  # Stop if event is set
-            data = ser.read(1)
+            # Drain everything buffered, blocking for at most the port timeout
+            waiting = ser.in_waiting
+            observe_backlog(DEVICE_TYPE, device_id, waiting)
+            data = ser.read(max(waiting, 1))
             if data == b"":
                 continue
+            if capture is not None:
+                capture.write(data)
+
+            temperature_block = feed(data)
+            if len(temperature_block) == 0:
+                continue
 
-            current_byte += 1
-            byte_int = int.from_bytes(data, byteorder="little")
-            if current_byte == 1:
-                lsb = byte_int >> 1
-            elif current_byte == 2:
-                msb = byte_int >> 1
-                adc_value = ((msb & 0x7F) << 7) | lsb
-                # print(f"msb: {format(msb, '07b')}")
-                # print(f"lsb: {format(lsb, '07b')}")
-                # print(f"adc: {format(adc_value, '014b')}")
-                # print(f"inv: {format(1 << 13, '014b')}")
-                # print(f"anv: {format(adc_value ^ (1 << 13), '014b')}")
-                adc_value ^= 1 << 13
-                if adc_value & (1 << 13):
-                    adc_value -= 1 << 14
-                # print(f"adc: {format(adc_value, '014b')}")
-                temperature_buffer[current_channel] = derive_temp(
-                    channel_config[current_channel], adc_counts=adc_value
-                )
-                adc_buffer[current_channel] = adc_value
-                current_channel += 1
-                current_byte = 0
-
-                if current_channel == num_channels:
-                    current_channel = 0
-                    log(
-                        temperature_buffer,
-                        channel_config,
-                        device_id,
-                        log_func,
-                        print_lock,
-                    )
-            # time.sleep(0.1)  # Small delay to reduce CPU usage
+            log(temperature_block, channel_config, device_id, log_func)
     except KeyboardInterrupt:
         print(f"Terminating data read for Device {device_id}...")
     finally:
         stop_scanning(ser)
 
 
+def configure_device(ser, channel_config):
+    """Stop any running scan, configure every channel and start scanning."""
+    stop_scanning(ser)
+    for channel in range(len(channel_config)):
+        configure_thermocouple_channel(
+            ser, channel=channel, thermocouple_type=channel_config[channel]
+        )
+    set_sample_rate(ser, channels=len(channel_config))
+    start_scanning(ser)
+
+
 def manage_di245_device(
-    port, device_id, channel_config, log_func, stop_event, print_lock
+    port, device_id, channel_config, log_func, stop_event, capture=None
 ):
-    """Manages a single device: connect, configure, and read data."""
+    """Manages a single device: connect, configure, and read data.
+
+    ``capture`` optionally records every raw read (see ``capture.CaptureRing``).
+    """
     ser = connect_to_device(port)
     if ser:
-        stop_scanning(ser)
-        for channel in range(len(channel_config)):
-            configure_thermocouple_channel(
-                ser, channel=channel, thermocouple_type=channel_config[channel]
-            )
-        set_sample_rate(ser, channels=len(channel_config))
-        start_scanning(ser)
-
-        print(f"Reading data from Device {device_id}...")
         try:
-            read_data(ser, channel_config, device_id, log_func, stop_event, print_lock)
+            configure_device(ser, channel_config)
+            print(f"Reading data from Device {device_id}...")
+            read_data(ser, channel_config, device_id, log_func, stop_event, capture)
         finally:
-            stop_scanning(ser)
-            ser.close()
-            print(f"Connection closed for Device {device_id}.")
+            try:
+                stop_scanning(ser)  # Raises if the device was unplugged
+            finally:
+                ser.close()
+                print(f"Connection closed for Device {device_id}.")
@@ -0,0 +1,180 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PUBLISH_RATE = 2.0  # Coalesced updates sent to clients per second
+CLIENT_QUEUE = 32  # Updates buffered per client before the oldest are dropped
+KEEPALIVE = 15.0  # Seconds of silence before a comment line keeps proxies happy
+PORT = 8766
+
+
+class LiveBroadcaster:
+    """Coalesce decoded samples per channel and fan them out to many clients.
+
+    ``update`` is called from a pipeline consumer with every block; it only
+    folds the block into per-channel last/min/max/sum counters. ``publish``
+    (run at ``PUBLISH_RATE``) turns the counters into one JSON event,
+    serializes it once and offers it to every client queue. Queues are
+    bounded and drop their oldest event when full, so a stalled browser
+    loses updates instead of holding back acquisition.
+    """
+
+    def __init__(self, client_queue=CLIENT_QUEUE):
+        self.client_queue = client_queue
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.clients = {}  # queue -> dropped event count
+        self.published = 0
+
+    def update(self, device_type, device_id, channels, timestamps, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        total = np.where(present, values, 0).sum(axis=0)
+        low = np.where(present, values, np.inf).min(axis=0)
+        high = np.where(present, values, -np.inf).max(axis=0)
+        t = float(timestamps[-1])
+        with self.lock:
+            for j, channel in enumerate(channels):
+                if not count[j]:
+                    continue
+                key = f"{device_type} - {device_id} - {channel}"
+                last = float(values[present[:, j], j][-1])
+                stats = self.pending.get(key)
+                if stats is None:
+                    self.pending[key] = [t, last, low[j], high[j], total[j], count[j]]
+                    continue
+                stats[0], stats[1] = t, last
+                stats[2] = min(stats[2], low[j])
+                stats[3] = max(stats[3], high[j])
+                stats[4] += total[j]
+                stats[5] += count[j]
+
+    def publish(self):
+        """Send everything coalesced since the last call as one event."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        channels = {
+            key: {
+                "t": t,
+                "v": last,
+                "min": float(low),
+                "max": float(high),
+                "mean": float(total / n),
+                "n": int(n),
+            }
+            for key, (t, last, low, high, total, n) in pending.items()
+        }
+        event = json.dumps({"time": time.time(), "channels": channels})
+        self.broadcast(f"data: {event}\n\n".encode())
+        self.published += 1
+
+    def broadcast(self, message):
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            while True:
+                try:
+                    client.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        client.get_nowait()
+                        with self.lock:
+                            if client in self.clients:
+                                self.clients[client] += 1
+                    except queue.Empty:
+                        pass
+
+    def subscribe(self):
+        client = queue.Queue(maxsize=self.client_queue)
+        with self.lock:
+            self.clients[client] = 0
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.pop(client, None)
+
+    def close(self):
+        """Wake every client so its handler returns."""
+        self.broadcast(None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.clients),
+                "published": self.published,
+                "dropped": sum(self.clients.values()),
+            }
+
+
+class LiveHandler(BaseHTTPRequestHandler):
+    """``GET /live`` streams Server-Sent Events; ``GET /live/stats`` has counters."""
+
+    broadcaster = None
+
+    def do_GET(self):
+        if self.path == "/live/stats":
+            body = json.dumps(self.broadcaster.stats()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.split("?")[0] != "/live":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        client = self.broadcaster.subscribe()
+        try:
+            while True:
+                try:
+                    message = client.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    message = b": keepalive\n\n"
+                if message is None:
+                    break
+                self.wfile.write(message)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.broadcaster.unsubscribe(client)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveServer(threading.Thread):
+    """Serve a ``LiveBroadcaster`` over SSE until ``stop_event`` is set."""
+
+    def __init__(self, broadcaster, stop_event, host="127.0.0.1", port=PORT):
+        super().__init__(name="live-server", daemon=True)
+        handler = type("Handler", (LiveHandler,), {"broadcaster": broadcaster})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.broadcaster = broadcaster
+        self.stop_event = stop_event
+
+    def run(self):
+        with self.httpd:
+            server = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            server.start()
+            self.stop_event.wait()
+            self.broadcaster.close()
+            self.httpd.shutdown()
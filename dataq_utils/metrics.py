@@ -0,0 +1,383 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Bucket upper bounds: 1 µs .. 60 s and 1 B .. 1 MiB
+SECONDS_BUCKETS = tuple(
+    m * 10.0**e for e in range(-6, 2) for m in (1, 2.5, 5)
+) + (60.0,)
+BYTES_BUCKETS = tuple(2.0**e for e in range(21))
+RATIO_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+SERIAL_OS_BUFFER = 4096  # Linux N_TTY_BUF_SIZE; bytes the tty holds before dropping
+BACKLOG_WARN = 0.75  # Fraction of SERIAL_OS_BUFFER that prints an overflow warning
+WARN_INTERVAL = 60.0  # Seconds between repeated overflow warnings per device
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+PORT = 9108
+
+_families = {}  # name -> [type, help, buckets, {label items: metric}]
+_families_lock = threading.Lock()
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``observe`` is a bisect and three adds."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the seconds spent inside it."""
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+def _metric(kind, name, help, labels, buckets=None):
+    key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+    family = _families.get(name)
+    if family is None or key not in family[3]:
+        with _families_lock:
+            family = _families.setdefault(name, [kind, help, buckets, {}])
+            if key not in family[3]:
+                family[3][key] = (
+                    Histogram(buckets) if kind == "histogram"
+                    else Counter() if kind == "counter" else Gauge()
+                )
+    return family[3][key]
+
+
+def histogram(name, help, buckets=SECONDS_BUCKETS, **labels):
+    """The histogram ``name`` for this label set, created on first use."""
+    return _metric("histogram", name, help, labels, buckets)
+
+
+def counter(name, help, **labels):
+    return _metric("counter", name, help, labels)
+
+
+def gauge(name, help, **labels):
+    return _metric("gauge", name, help, labels)
+
+
+def snapshot():
+    """Every metric's state as a picklable dict, for ``merge_snapshot`` in
+    another process."""
+    with _families_lock:
+        families = {n: (f[0], f[1], f[2], dict(f[3])) for n, f in _families.items()}
+    state = {}
+    for name, (kind, help, buckets, metrics) in families.items():
+        for key, metric in metrics.items():
+            if kind == "histogram":
+                with metric.lock:
+                    value = (list(metric.counts), metric.sum, metric.count)
+            else:
+                value = metric.value
+            state[(name, key)] = (kind, help, buckets, value)
+    return state
+
+
+def merge_snapshot(state, previous=None):
+    """Add what changed between two ``snapshot``s of another process (such
+    as a device child) to this process's metrics. Gauges take the new value."""
+    previous = previous or {}
+    for (name, key), (kind, help, buckets, value) in state.items():
+        metric = _metric(kind, name, help, dict(key), buckets)
+        old = previous.get((name, key), (None, None, None, None))[3]
+        if kind == "gauge":
+            metric.set(value)
+        elif kind == "counter":
+            metric.inc(value - (old or 0.0))
+        else:
+            counts, total, count = value
+            old_counts, old_total, old_count = old or ([0] * len(counts), 0.0, 0)
+            with metric.lock:
+                for i, (n, m) in enumerate(zip(counts, old_counts)):
+                    metric.counts[i] += n - m
+                metric.sum += total - old_total
+                metric.count += count - old_count
+
+
+class TimedLock:
+    """A lock recording how long callers wait for it and then hold it."""
+
+    def __init__(self, name, lock=None):
+        self.lock = lock or threading.Lock()
+        self.wait = histogram(
+            "dataq_lock_wait_seconds", "Time spent waiting for a lock", lock=name
+        )
+        self.hold = histogram(
+            "dataq_lock_hold_seconds", "Time a lock was held", lock=name
+        )
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.acquired = time.perf_counter()
+        self.wait.observe(self.acquired - start)
+
+    def __exit__(self, *exc):
+        held = time.perf_counter() - self.acquired
+        self.lock.release()
+        self.hold.observe(held)
+
+
+def instrument_feed(feed, device_type):
+    """Wrap a decoder ``feed(data)`` to record read sizes and decode time."""
+    sizes = histogram(
+        "dataq_serial_read_bytes",
+        "Bytes returned by each serial read",
+        BYTES_BUCKETS,
+        device_type=device_type,
+    )
+    decode = histogram(
+        "dataq_decode_seconds",
+        "Time to decode one serial read into a block",
+        device_type=device_type,
+    )
+
+    def timed_feed(data):
+        start = time.perf_counter()
+        block = feed(data)
+        decode.observe(time.perf_counter() - start)
+        sizes.observe(len(data))
+        return block
+
+    return timed_feed
+
+
+_last_warning = {}
+
+
+def observe_backlog(device_type, device_id, waiting):
+    """Record bytes queued in the OS serial buffer before a read.
+
+    A backlog near ``SERIAL_OS_BUFFER`` means the reader is falling behind
+    and the driver is about to drop data, so it is also printed.
+    """
+    fill = waiting / SERIAL_OS_BUFFER
+    histogram(
+        "dataq_serial_backlog_ratio",
+        "OS serial buffer fill before each read, as a fraction of its size",
+        RATIO_BUCKETS,
+        device_type=device_type,
+    ).observe(fill)
+    gauge(
+        "dataq_serial_backlog_bytes",
+        "Bytes waiting in the OS serial buffer at the last read",
+        device=device_id,
+    ).set(waiting)
+    now = time.monotonic()
+    last = _last_warning.get(device_id, -WARN_INTERVAL)
+    if fill >= BACKLOG_WARN and now - last >= WARN_INTERVAL:
+        _last_warning[device_id] = now
+        print(
+            f"Device {device_id}: {waiting} bytes waiting in the serial buffer "
+            f"({fill:.0%} of {SERIAL_OS_BUFFER}); reads are falling behind"
+        )
+
+
+def _quantile(buckets, counts, q):
+    total = sum(counts)
+    if not total:
+        return float("nan")
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(counts):
+        if seen + n >= rank and n:
+            low = buckets[i - 1] if i else 0.0
+            high = buckets[i] if i < len(buckets) else buckets[-1]
+            return low + (high - low) * (rank - seen) / n
+        seen += n
+    return buckets[-1]
+
+
+def _label_text(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    with _families_lock:
+        families = {n: (f[0], f[1], f[2], dict(f[3])) for n, f in _families.items()}
+    for name, (kind, help, buckets, metrics) in sorted(families.items()):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, metric in sorted(metrics.items()):
+            if kind != "histogram":
+                lines.append(f"{name}{_label_text(key)} {metric.value}")
+                continue
+            with metric.lock:
+                counts, total, count = list(metric.counts), metric.sum, metric.count
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += n
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                labels = _label_text(key, [("le", le)])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(key)} {total}")
+            lines.append(f"{name}_count{_label_text(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+_last_counts = {}
+
+
+def summary():
+    """One line with the p50/p99 of every histogram since the previous call."""
+    parts = []
+    with _families_lock:
+        families = {n: (f[0], f[2], dict(f[3])) for n, f in _families.items()}
+    for name, (kind, buckets, metrics) in sorted(families.items()):
+        if kind != "histogram":
+            continue
+        for key, metric in sorted(metrics.items()):
+            with metric.lock:
+                counts = list(metric.counts)
+            previous = _last_counts.get((name, key), [0] * len(counts))
+            _last_counts[(name, key)] = counts
+            delta = [a - b for a, b in zip(counts, previous)]
+            n = sum(delta)
+            if not n:
+                continue
+            label = ",".join(v for _, v in key)
+            short = name.removeprefix("dataq_")
+            p50, p99 = _quantile(buckets, delta, 0.5), _quantile(buckets, delta, 0.99)
+            if name.endswith("_seconds"):
+                short = short.removesuffix("_seconds")
+                p50, p99, unit = p50 * 1e3, p99 * 1e3, "ms"
+            else:
+                unit = ""
+            parts.append(
+                f"{short}[{label}] p50={p50:.3g}{unit} p99={p99:.3g}{unit} n={n}"
+            )
+    return "metrics: " + ("; ".join(parts) if parts else "no activity")
+
+
+_profile_lock = threading.Lock()
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL):
+    """Sample every thread's stack for ``seconds``; returns folded stacks.
+
+    Each line is ``thread;outer;...;inner count``, the input format of
+    flamegraph.pl and speedscope. Nothing runs unless this is called, so
+    it can be left available in production.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("a profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = StackCounter()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """``GET /metrics`` (Prometheus text) and
+    ``GET /debug/profile?seconds=10&interval=0.005`` (folded stacks)."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == "/metrics":
+                body = render()
+                content_type = "text/plain; version=0.0.4"
+            elif url.path == "/debug/profile":
+                query = parse_qs(url.query)
+                seconds = min(float(query.get("seconds", ["10"])[0]), 300.0)
+                interval = float(query.get("interval", [str(PROFILE_INTERVAL)])[0])
+                body = sample_stacks(seconds, max(interval, 0.001))
+                content_type = "text/plain"
+            else:
+                self.send_error(404)
+                return
+        except (RuntimeError, ValueError) as e:
+            self.send_error(409 if isinstance(e, RuntimeError) else 400, str(e))
+            return
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(threading.Thread):
+    """Serve ``/metrics`` and ``/debug/profile`` until ``stop_event`` is set."""
+
+    def __init__(self, stop_event, host="127.0.0.1", port=PORT):
+        super().__init__(name="metrics-server", daemon=True)
+        self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.stop_event = stop_event
+
+    def run(self):
+        with self.httpd:
+            server = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            server.start()
+            self.stop_event.wait()
+            self.httpd.shutdown()
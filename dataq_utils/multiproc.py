@@ -0,0 +1,248 @@
+import multiprocessing
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from dataq_utils import di245, di1100
+from dataq_utils.metrics import merge_snapshot, snapshot
+from dataq_utils.pipeline import RING_CAPACITY
+
+DEVICE_MODULES = {"di245": di245, "di1100": di1100}
+# Spawn rather than fork: the parent runs many threads (and holds their locks)
+CONTEXT = multiprocessing.get_context("spawn")
+BRIDGE_INTERVAL = 0.005  # Seconds the bridge sleeps when a child has sent nothing
+SHUTDOWN_TIMEOUT = 5.0  # Seconds a child gets to stop before it is terminated
+METRICS_INTERVAL = 1.0  # Seconds between a child's metrics snapshots
+HEADER_SLOTS = 8
+HEAD, TAIL, DROPPED, BYTES, SESSIONS = range(5)
+
+
+class SharedRing:
+    """Single-producer/single-consumer ring of ``[timestamp, ch...]`` rows in
+    a ``multiprocessing.shared_memory`` segment.
+
+    The header holds int64 counters: ``HEAD`` (rows ever written, only
+    advanced by the producer after the rows are in place), ``TAIL`` (rows
+    ever read, only advanced by the consumer), plus dropped rows and the
+    producer's raw byte and session counts. Like ``DeviceRing``, a full
+    ring drops the newest rows rather than overwrite unread ones.
+    """
+
+    def __init__(self, num_channels, capacity=RING_CAPACITY, name=None):
+        self.capacity = capacity
+        self.width = 1 + num_channels
+        header_bytes = HEADER_SLOTS * 8
+        if name is None:
+            size = header_bytes + capacity * self.width * 8
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # Spawned children share the creator's resource tracker, so
+            # attaching here does not hand the segment's lifetime to them
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.header = np.ndarray(
+            (HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf
+        )
+        self.rows = np.ndarray(
+            (capacity, self.width), dtype=np.float64, buffer=self.shm.buf,
+            offset=header_bytes,
+        )
+        if name is None:
+            self.header[:] = 0
+
+    def push(self, block, timestamps):
+        head = int(self.header[HEAD])
+        free = self.capacity - (head - int(self.header[TAIL]))
+        n = min(len(block), free)
+        self.header[DROPPED] += len(block) - n
+        if n <= 0:
+            return 0
+        idx = (head + np.arange(n)) % self.capacity
+        self.rows[idx, 0] = timestamps[:n]
+        self.rows[idx, 1:] = block[:n]
+        self.header[HEAD] = head + n
+        return n
+
+    def read(self):
+        """Return (timestamps, values) for every unread row, or None."""
+        head = int(self.header[HEAD])
+        tail = int(self.header[TAIL])
+        if head == tail:
+            return None
+        rows = self.rows[(tail + np.arange(head - tail)) % self.capacity]
+        self.header[TAIL] = head
+        return rows[:, 0], rows[:, 1:]
+
+    def close(self, unlink=False):
+        del self.header, self.rows  # Release the buffer exports first
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedTap:
+    """Counts raw bytes and sessions into the ring header for the parent's
+    health metrics, forwarding to a capture ring when there is one."""
+
+    def __init__(self, ring, capture=None):
+        self.ring = ring
+        self.capture = capture
+
+    def start_session(self):
+        self.ring.header[SESSIONS] += 1
+        if self.capture is not None:
+            self.capture.start_session()
+
+    def write(self, data):
+        self.ring.header[BYTES] += len(data)
+        if self.capture is not None:
+            self.capture.write(data)
+
+
+def run_device_process(dev_type, port, device_id, channel_config, ring_name,
+                       stop_event, clock=None, capture_spec=None,
+                       metrics_conn=None):
+    """Child process: read and decode one device into a ``SharedRing``.
+
+    Ctrl-C is ignored here; the parent sets ``stop_event`` so every child
+    closes its port cleanly. Rows are stamped with ``clock`` (a
+    ``timing.ScanClock``) as they are decoded. The read, decode and backlog
+    metrics recorded here are sent to ``metrics_conn`` as ``snapshot``s
+    every ``METRICS_INTERVAL`` and once more on exit.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = SharedRing(len(channel_config), name=ring_name)
+    capture = None
+    if capture_spec is not None:
+        from dataq_utils.capture import CaptureRing
+
+        capture = CaptureRing(*capture_spec)
+
+    def log_func(block, channel_config, device_id):
+        block = np.asarray(block, dtype=np.float64)
+        if clock is not None:
+            stamps = clock.stamp(len(block))
+        else:
+            stamps = np.full(len(block), time.time())
+        ring.push(block, stamps)
+
+    done = threading.Event()
+
+    def send_metrics():
+        while not done.wait(METRICS_INTERVAL):
+            metrics_conn.send(snapshot())
+
+    sender = None
+    if metrics_conn is not None:
+        sender = threading.Thread(target=send_metrics, daemon=True)
+        sender.start()
+
+    manage = getattr(DEVICE_MODULES[dev_type], f"manage_{dev_type}_device")
+    try:
+        manage(
+            port, device_id, channel_config, log_func, stop_event,
+            SharedTap(ring, capture),
+        )
+    finally:
+        if sender is not None:
+            done.set()
+            sender.join()
+            metrics_conn.send(snapshot())
+            metrics_conn.close()
+        if capture is not None:
+            capture.close()
+        ring.close()
+
+
+class DeviceProcess(threading.Thread):
+    """Run one device in a child process and bridge its rows into ``ring``.
+
+    The thread starts the process, copies rows from the ``SharedRing`` into
+    the pipeline's ``DeviceRing`` (so consumers are unchanged), mirrors
+    the child's byte counters into ``health`` and merges the child's
+    metrics into this process's, so /metrics and ``summary`` see them. It
+    lives exactly as long as the child, so it can stand in for a device
+    thread. A child that exits with a non-zero code is reported as crashed
+    in ``error``.
+    """
+
+    def __init__(self, dev_type, port, device_id, channel_config, ring,
+                 health=None, poll_interval=BRIDGE_INTERVAL):
+        super().__init__(name=f"device-{device_id}-bridge", daemon=True)
+        self.ring = ring
+        self.health = health
+        self.device_id = device_id
+        self.poll_interval = poll_interval
+        self.stop_event = CONTEXT.Event()
+        self.shared = SharedRing(len(channel_config), ring.capacity)
+        self.dropped = 0
+        self.error = None
+        # Counters carried over from earlier sessions of this device
+        self.base = (health.bytes, health.sessions) if health is not None else (0, 0)
+        capture = getattr(health, "capture", None)
+        capture_spec = None
+        if capture is not None:
+            capture_spec = (capture.path, capture.capacity, capture.metadata)
+        self.metrics_conn, self.child_conn = CONTEXT.Pipe(duplex=False)
+        self.metrics = {}  # The child's last snapshot merged
+        self.process = CONTEXT.Process(
+            target=run_device_process,
+            args=(
+                dev_type, port, device_id, channel_config, self.shared.name,
+                self.stop_event, ring.clock, capture_spec, self.child_conn,
+            ),
+            name=f"device-{device_id}",
+            daemon=True,
+        )
+
+    def drain(self):
+        batch = self.shared.read()
+        header = self.shared.header
+        dropped = int(header[DROPPED])
+        self.ring.dropped_rows += dropped - self.dropped
+        self.dropped = dropped
+        if self.health is not None:
+            self.health.bytes = self.base[0] + int(header[BYTES])
+            self.health.sessions = self.base[1] + int(header[SESSIONS])
+        try:
+            while self.metrics_conn.poll():
+                state = self.metrics_conn.recv()
+                merge_snapshot(state, self.metrics)
+                self.metrics = state
+        except (EOFError, OSError):
+            pass  # The child is gone; its last complete snapshot was merged
+        if batch is None:
+            return False
+        timestamps, values = batch
+        self.ring.push(values, timestamps)
+        return True
+
+    def run(self):
+        self.process.start()
+        self.child_conn.close()  # The child holds the only sending end now
+        try:
+            while self.process.is_alive():
+                if self.stop_event.is_set():
+                    self.process.join(SHUTDOWN_TIMEOUT)
+                    if self.process.is_alive():
+                        print(
+                            f"Device {self.device_id} process did not stop; "
+                            "terminating it"
+                        )
+                        self.process.terminate()
+                        self.process.join()
+                    break
+                if not self.drain():
+                    time.sleep(self.poll_interval)
+            self.process.join()
+            self.drain()  # Whatever the child pushed before exiting
+        finally:
+            self.shared.close(unlink=True)
+            self.metrics_conn.close()
+        code = self.process.exitcode
+        if code not in (0, None) and not self.stop_event.is_set():
+            self.error = f"process exited with code {code}"
+            print(f"Device {self.device_id} process crashed ({self.error})")
@@ -0,0 +1,13 @@
+# Display names of the channels, keyed "<device type> - <device id> - <channel>"
+# (the same keys as ``tcNames`` in index.html); shared by the logger's alarms
+# and the offline report
+nameMapping = {
+    "DI-245 - 1 - 0": "Ion Pump 2 Secondary",
+    "DI-245 - 1 - 1": "Ion Pump 1 Flange",
+    "DI-245 - 1 - 2": "Glass Cell 2",
+    "DI-245 - 1 - 3": "Main Body",
+    "DI-245 - 2 - 0": "Ion Pump 1",
+    "DI-245 - 2 - 1": "Ion Pump 2",
+    "DI-245 - 2 - 2": "Glass Cell 1",
+    "DI-245 - 2 - 3": "Titanium Pump",
+}
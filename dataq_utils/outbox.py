@@ -0,0 +1,187 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dataq_utils.metrics import histogram
+
+BACKOFF_BASE = 2.0  # Seconds before the first retry
+BACKOFF_MAX = 600.0  # Cap on the retry delay
+CONCURRENCY = 4  # Jobs in flight at once
+POLL_INTERVAL = 0.5  # Seconds between checks for due jobs
+
+
+class Outbox:
+    """Persistent SQLite-backed queue of pending uploads and alerts.
+
+    Jobs sharing a ``key`` run strictly in order, one at a time (e.g. every
+    upload for one chunk); jobs without a key are independent. A failed job
+    is kept with an exponential-backoff ``next_attempt``, so nothing is lost
+    across outages or process restarts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.inflight = set()
+        self.completed = 0
+        self.failures = 0
+        self.started = time.monotonic()
+
+    def _db(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    created REAL NOT NULL,
+                    last_error TEXT
+                )"""
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, id)")
+            self.conn.commit()
+        return self.conn
+
+    def enqueue(self, kind, payload, key=None, coalesce=False):
+        """Add a job. With ``coalesce``, replace the payload of the newest
+        queued job for ``key`` if it is the same kind and not yet running."""
+        key = key or f"{kind}:{uuid.uuid4().hex}"
+        now = time.time()
+        with self.lock:
+            db = self._db()
+            if coalesce:
+                row = db.execute(
+                    "SELECT id, kind FROM jobs WHERE key = ? ORDER BY id DESC LIMIT 1",
+                    (key,),
+                ).fetchone()
+                if row and row[1] == kind and row[0] not in self.inflight:
+                    db.execute(
+                        "UPDATE jobs SET payload = ? WHERE id = ?",
+                        (json.dumps(payload), row[0]),
+                    )
+                    db.commit()
+                    return row[0]
+            cur = db.execute(
+                "INSERT INTO jobs (kind, key, payload, next_attempt, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (kind, key, json.dumps(payload), now, now),
+            )
+            db.commit()
+            return cur.lastrowid
+
+    def claim(self, limit):
+        """Mark up to ``limit`` due jobs in flight; only the oldest job per key is eligible."""
+        with self.lock:
+            rows = self._db().execute(
+                "SELECT id, kind, key, payload, attempts FROM jobs"
+                " WHERE id IN (SELECT MIN(id) FROM jobs GROUP BY key)"
+                " AND next_attempt <= ? ORDER BY id",
+                (time.time(),),
+            ).fetchall()
+            jobs = []
+            for job_id, kind, key, payload, attempts in rows:
+                if len(jobs) >= limit:
+                    break
+                if job_id in self.inflight:
+                    continue
+                self.inflight.add(job_id)
+                jobs.append((job_id, kind, json.loads(payload), attempts))
+            return jobs
+
+    def complete(self, job_id):
+        with self.lock:
+            self._db().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._db().commit()
+            self.inflight.discard(job_id)
+            self.completed += 1
+
+    def fail(self, job_id, attempts, error):
+        delay = min(BACKOFF_BASE * 2**attempts, BACKOFF_MAX)
+        delay *= random.uniform(0.5, 1.0)  # Jitter so retries don't arrive in lockstep
+        with self.lock:
+            self._db().execute(
+                "UPDATE jobs SET attempts = ?, next_attempt = ?, last_error = ?"
+                " WHERE id = ?",
+                (attempts + 1, time.time() + delay, str(error), job_id),
+            )
+            self._db().commit()
+            self.inflight.discard(job_id)
+            self.failures += 1
+
+    def stats(self):
+        with self.lock:
+            depth, oldest, retrying = self._db().execute(
+                "SELECT COUNT(*), MIN(created), SUM(attempts > 0) FROM jobs"
+            ).fetchone()
+        elapsed = time.monotonic() - self.started
+        return {
+            "depth": depth,
+            "retrying": retrying or 0,
+            "inflight": len(self.inflight),
+            "oldest_age": time.time() - oldest if oldest else 0.0,
+            "completed": self.completed,
+            "failures": self.failures,
+            "completed_per_s": self.completed / elapsed if elapsed else 0.0,
+        }
+
+
+class OutboxWorker(threading.Thread):
+    """Drain an ``Outbox`` with a bounded pool, dispatching on job kind.
+
+    ``handlers`` maps each kind to ``handler(payload)``; an exception marks
+    the job for retry with backoff.
+    """
+
+    def __init__(
+        self, outbox, handlers, stop_event, concurrency=CONCURRENCY,
+        poll_interval=POLL_INTERVAL,
+    ):
+        super().__init__(name="outbox", daemon=True)
+        self.outbox = outbox
+        self.handlers = handlers
+        self.stop_event = stop_event
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+
+    def _run_job(self, job_id, kind, payload, attempts):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.handlers[kind](payload)
+        except Exception as e:
+            error = e
+        histogram(
+            "dataq_outbox_job_seconds",
+            "Time to run an outbox job (upload, alert publish, ...)",
+            kind=kind,
+            outcome="ok" if error is None else "error",
+        ).observe(time.perf_counter() - start)
+        if error is None:
+            self.outbox.complete(job_id)
+        else:
+            print(
+                f"Outbox {kind} job {job_id} failed (attempt {attempts + 1}): {error}"
+            )
+            self.outbox.fail(job_id, attempts, error)
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self.stop_event.is_set():
+                free = self.concurrency - len(self.outbox.inflight)
+                jobs = self.outbox.claim(free) if free > 0 else []
+                for job in jobs:
+                    pool.submit(self._run_job, *job)
+                if not jobs:
+                    self.stop_event.wait(self.poll_interval)
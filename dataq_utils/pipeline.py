@@ -0,0 +1,203 @@
+import threading
+import time
+
+import numpy as np
+from circular_buffer_numpy.circular_buffer import CircularBuffer
+
+RING_CAPACITY = 65536  # Rows (scans) held per device before backpressure kicks in
+POLL_INTERVAL = 0.05  # Seconds a consumer sleeps when every ring is empty
+
+
+class DeviceRing:
+    """Bounded ring of timestamped scans for one device.
+
+    Rows are ``[timestamp, ch0, ch1, ...]``. There is exactly one producer
+    (the device thread) and one cursor per consumer; each pointer is only
+    ever written by its owner, so no lock is needed. The producer never
+    overwrites rows a consumer has not read yet: when the ring is full the
+    newest rows are dropped and counted instead.
+    """
+
+    def __init__(self, device_id, device_type, channel_config, capacity=RING_CAPACITY):
+        self.device_id = device_id
+        self.device_type = device_type
+        self.channel_config = channel_config
+        self.num_channels = len(channel_config)
+        self.capacity = capacity
+        self.ring = CircularBuffer(shape=(capacity, 1 + self.num_channels))
+        self.cursors = {}
+        self.pushed_rows = 0
+        self.dropped_rows = 0
+        self.high_water = 0
+        self.clock = None
+
+    def add_cursor(self, name):
+        self.cursors[name] = self.ring.g_pointer
+
+    def fill(self):
+        """Rows not yet read by the slowest consumer."""
+        if not self.cursors:
+            return 0
+        return self.ring.g_pointer - min(self.cursors.values())
+
+    def push(self, block, timestamp=None):
+        """Append an (n_scans x n_channels) block; returns the number of rows kept.
+
+        ``timestamp`` is one time for the whole block or one per row
+        (default: now).
+        """
+        block = np.asarray(block, dtype=np.float64)
+        free = self.capacity - self.fill()
+        n = min(len(block), free)
+        self.dropped_rows += len(block) - n
+        if n == 0:
+            return 0
+
+        rows = np.empty((n, 1 + self.num_channels))
+        if timestamp is None:
+            rows[:, 0] = time.time()
+        else:
+            rows[:, 0] = np.broadcast_to(timestamp, len(block))[:n]
+        rows[:, 1:] = block[:n]
+
+        # Write the rows first, then publish them by advancing the pointers
+        start = self.ring.g_pointer + 1
+        idx = np.arange(start, start + n) % self.capacity
+        self.ring.buffer[idx] = rows
+        self.ring.pointer = int(idx[-1])
+        self.ring.g_pointer = start + n - 1
+
+        self.pushed_rows += n
+        self.high_water = max(self.high_water, self.fill())
+        return n
+
+    def read(self, name):
+        """Return (timestamps, values) for rows not yet seen by cursor ``name``."""
+        last = self.ring.g_pointer
+        n = last - self.cursors[name]
+        if n <= 0:
+            return None
+        rows = np.array(self.ring.get_N(N=n, M=last % self.capacity))
+        self.cursors[name] = last
+        return rows[:, 0], rows[:, 1:]
+
+    def producer(self, clock=None):
+        """Adapter matching the ``log_func(block, channel_config, device_id)`` callback.
+
+        With a ``timing.ScanClock`` rows are stamped from the device's sample
+        clock rather than all with the time the block was read.
+        """
+        if clock is None:
+            return lambda block, channel_config, device_id: self.push(block)
+        self.clock = clock
+        return lambda block, channel_config, device_id: self.push(
+            block, clock.stamp(len(block))
+        )
+
+    def stats(self):
+        return {
+            "device_id": self.device_id,
+            "device_type": self.device_type,
+            "pushed_rows": self.pushed_rows,
+            "dropped_rows": self.dropped_rows,
+            "fill": self.fill(),
+            "high_water": self.high_water,
+            "capacity": self.capacity,
+            "clock": self.clock.stats() if self.clock else None,
+        }
+
+
+class ConsumerWorker(threading.Thread):
+    """Drain every registered ring through ``handler(ring, timestamps, values)``."""
+
+    def __init__(self, name, handler, rings, stop_event, poll_interval=POLL_INTERVAL):
+        super().__init__(name=name, daemon=True)
+        self.handler = handler
+        self.rings = rings
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.errors = 0
+
+    def drain(self):
+        busy = False
+        for ring in list(self.rings):
+            batch = ring.read(self.name)
+            if batch is None:
+                continue
+            busy = True
+            try:
+                self.handler(ring, *batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"{self.name} failed on device {ring.device_id}: {e}")
+        return busy
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if not self.drain():
+                time.sleep(self.poll_interval)
+        self.drain()  # Flush whatever was pushed before shutdown
+
+
+class PeriodicWorker(threading.Thread):
+    """Call ``func()`` every ``interval`` seconds until stopped."""
+
+    def __init__(self, name, func, interval, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.interval = interval
+        self.stop_event = stop_event
+        self.errors = 0
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.func()
+            except Exception as e:
+                self.errors += 1
+                print(f"{self.name} failed: {e}")
+
+
+class AcquisitionPipeline:
+    """Device rings plus the consumer workers that drain them."""
+
+    def __init__(self, stop_event=None):
+        self.stop_event = stop_event or threading.Event()
+        self.rings = []
+        self.consumers = []
+        self.workers = []
+
+    def add_consumer(self, name, handler):
+        """Register ``handler(ring, timestamps, values)`` to see every pushed row."""
+        self.consumers.append((name, handler))
+        for ring in self.rings:
+            ring.add_cursor(name)
+
+    def add_periodic(self, name, func, interval):
+        self.workers.append(PeriodicWorker(name, func, interval, self.stop_event))
+
+    def add_worker(self, thread):
+        """Start and join ``thread`` along with the consumers; it must watch ``stop_event``."""
+        self.workers.append(thread)
+
+    def register(self, device_id, device_type, channel_config, capacity=RING_CAPACITY):
+        ring = DeviceRing(device_id, device_type, channel_config, capacity)
+        for name, _ in self.consumers:
+            ring.add_cursor(name)
+        self.rings.append(ring)
+        return ring
+
+    def start(self):
+        for name, handler in self.consumers:
+            self.workers.append(
+                ConsumerWorker(name, handler, self.rings, self.stop_event)
+            )
+        for worker in self.workers:
+            worker.start()
+
+    def join(self, timeout=None):
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def stats(self):
+        return [ring.stats() for ring in self.rings]
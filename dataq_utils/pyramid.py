@@ -0,0 +1,279 @@
+import gzip
+import json
+import os
+import threading
+
+import numpy as np
+
+from dataq_utils.chunk_reader import read_chunk
+
+# Tier name -> (bucket seconds, tile span seconds). Buckets and tiles are
+# aligned to the epoch; a tile holds at most a few hundred buckets per series.
+TIERS = {
+    "1m": (60, 6 * 3600),
+    "10m": (600, 24 * 3600),
+    "1h": (3600, 7 * 24 * 3600),
+    "1d": (86400, 364 * 24 * 3600),
+}
+STAT_FIELDS = ("mean", "min", "max", "count")
+
+
+def downsample(timestamps_ns, series, interval):
+    """Aggregate one series into ``interval``-second buckets.
+
+    Rollup rows contribute their own min/max and are weighted by their
+    ``count``; plain samples count once each. Returns a dict of bucket
+    ``t`` (start, epoch s) and (n_buckets x n_channels) mean/min/max/count.
+    """
+    values = series["values"]
+    present = ~np.isnan(values)
+    count = np.where(present, np.nan_to_num(series.get("count", present * 1.0)), 0)
+    low = series.get("min", values)
+    high = series.get("max", values)
+    return merge_buckets(
+        np.floor(timestamps_ns / 1e9 / interval).astype(np.int64) * interval,
+        {"mean": values, "min": low, "max": high, "count": count},
+    )
+
+
+def merge_buckets(t, stats):
+    """Combine rows that share a bucket start; ``t`` need not be sorted."""
+    order = np.argsort(t, kind="stable")
+    t = np.asarray(t)[order]
+    stats = {
+        name: np.asarray(data, dtype=np.float64)[order] for name, data in stats.items()
+    }
+    starts = np.flatnonzero(np.diff(t, prepend=t[:1] - 1))
+    count = stats["count"]
+    weighted = np.where(count > 0, stats["mean"], 0) * count
+    total = np.add.reduceat(count, starts, axis=0)
+    mean = np.full(total.shape, np.nan)
+    np.divide(
+        np.add.reduceat(weighted, starts, axis=0), total, out=mean, where=total > 0
+    )
+    return {
+        "t": t[starts],
+        "mean": mean,
+        "min": np.fmin.reduceat(stats["min"], starts, axis=0),
+        "max": np.fmax.reduceat(stats["max"], starts, axis=0),
+        "count": total,
+    }
+
+
+def _encode(column, exact=False):
+    """JSON-friendly list: NaN becomes null, floats keep 6 significant digits
+    unless ``exact``."""
+    if exact:
+        return [None if x != x else x for x in column.tolist()]
+    return [None if x != x else float(f"{x:.6g}") for x in column.tolist()]
+
+
+def _decode(column):
+    return np.array([np.nan if x is None else x for x in column], dtype=np.float64)
+
+
+class PyramidBuilder:
+    """Precompute multi-resolution min/max/mean tiers of closed chunks.
+
+    ``add_chunk`` reads a chunk, buckets every series at each tier in
+    ``TIERS`` and keeps the result per chunk under ``state_dir``. The
+    buckets are merged into every tile the chunk touches, which is uploaded
+    as gzip JSON at ``<prefix><tier>/<tile_start>.json``:
+
+        {"tier", "interval", "start", "end",
+         "series": {"<device_type> - <device_id> - <channel>":
+                    {"t": [...], "mean": [...], "min": [...], "max": [...],
+                     "count": [...]}}}
+
+    ``<prefix>manifest.json`` lists the tiers, their tiles and the chunks
+    folded in, so a client can pick the tier that suits its zoom level and
+    fetch only the tiles in view. Each tile's merged state is kept under
+    ``state_dir`` too, so a new chunk costs one merge per tile rather than
+    a rebuild from every partial (a year of them for ``1d``). Re-adding a
+    chunk rebuilds its tiles from the partials, replacing its contribution
+    rather than double counting it.
+    """
+
+    def __init__(
+        self, client, bucket, prefix="pyramid/", state_dir=".pyramid", tiers=TIERS
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.state_dir = state_dir
+        self.tiers = tiers
+        self.lock = threading.Lock()
+        self._manifest = None
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            path = os.path.join(self.state_dir, "manifest.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {
+                    "tiers": {
+                        name: {"interval": interval, "tile_span": span, "tiles": []}
+                        for name, (interval, span) in self.tiers.items()
+                    },
+                    "chunks": {},
+                }
+        return self._manifest
+
+    def has_chunk(self, chunk):
+        return chunk in self.manifest["chunks"]
+
+    def _partial_path(self, tier, chunk):
+        return os.path.join(self.state_dir, tier, chunk + ".json")
+
+    def _tile_path(self, tier, tile_start):
+        return os.path.join(self.state_dir, tier, "tiles", f"{tile_start}.json")
+
+    def _write_json(self, path, document):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(document, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    def _put(self, key, document):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=gzip.compress(json.dumps(document, separators=(",", ":")).encode()),
+            ContentEncoding="gzip",
+            ContentType="application/json",
+        )
+
+    def add_chunk(self, file_name):
+        """Fold a closed chunk into every tier and publish the affected tiles."""
+        chunk = os.path.basename(file_name)
+        data = read_chunk(file_name)
+        if not data:
+            return []
+        start = min(int(s["timestamp_ns"][0]) for s in data.values()) / 1e9
+        end = max(int(s["timestamp_ns"][-1]) for s in data.values()) / 1e9
+
+        with self.lock:
+            partials = {}
+            for tier, (interval, _) in self.tiers.items():
+                partial = {}
+                for (device_type, device_id), series in data.items():
+                    buckets = downsample(series["timestamp_ns"], series, interval)
+                    for j, channel in enumerate(series["channels"]):
+                        key = f"{device_type} - {device_id} - {channel}"
+                        partial[key] = {"t": buckets["t"].tolist()}
+                        for field in STAT_FIELDS:
+                            partial[key][field] = _encode(buckets[field][:, j])
+                self._write_json(self._partial_path(tier, chunk), partial)
+                partials[tier] = partial
+
+            manifest = self.manifest
+            manifest["chunks"][chunk] = {"start": start, "end": end}
+            published = []
+            for tier, (interval, span) in self.tiers.items():
+                first = int(start // span) * span
+                for tile_start in range(first, int(end) + 1, span):
+                    series = self._merge_tile(
+                        tier, tile_start, tile_start + span, chunk, partials[tier]
+                    )
+                    self._put(
+                        f"{tier}/{tile_start}.json",
+                        {
+                            "tier": tier,
+                            "interval": interval,
+                            "start": tile_start,
+                            "end": tile_start + span,
+                            "series": series,
+                        },
+                    )
+                    tiles = manifest["tiers"][tier]["tiles"]
+                    if tile_start not in tiles:
+                        tiles.append(tile_start)
+                        tiles.sort()
+                    published.append(f"{tier}/{tile_start}.json")
+            self._put("manifest.json", manifest)
+            self._write_json(os.path.join(self.state_dir, "manifest.json"), manifest)
+        return published
+
+    def _merge_tile(self, tier, tile_start, tile_end, chunk, partial):
+        """Merge ``chunk``'s ``partial`` into the tile's kept state; returns
+        the tile's series for upload.
+
+        A tile with no state yet, or that already holds ``chunk``, is
+        rebuilt from the partials of every chunk overlapping it instead.
+        """
+        path = self._tile_path(tier, tile_start)
+        state = None
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+        pieces = {}
+        if state is None or chunk in state["chunks"]:
+            chunks = []
+            for name, extent in self.manifest["chunks"].items():
+                part_path = self._partial_path(tier, name)
+                if (
+                    extent["end"] < tile_start
+                    or extent["start"] >= tile_end
+                    or not os.path.exists(part_path)
+                ):
+                    continue
+                chunks.append(name)
+                with open(part_path) as f:
+                    for key, part in json.load(f).items():
+                        pieces.setdefault(key, []).append(part)
+        else:
+            chunks = state["chunks"] + [chunk]
+            for key, part in state["series"].items():
+                pieces[key] = [part]
+            for key, part in partial.items():
+                pieces.setdefault(key, []).append(part)
+
+        series, exact = {}, {}
+        for key, parts in pieces.items():
+            t = np.concatenate([np.asarray(p["t"], dtype=np.int64) for p in parts])
+            inside = (t >= tile_start) & (t < tile_end)
+            if not inside.any():
+                continue
+            stats = {
+                field: np.concatenate([_decode(p[field]) for p in parts])[inside, None]
+                for field in STAT_FIELDS
+            }
+            merged = merge_buckets(t[inside], stats)
+            series[key] = {"t": merged["t"].tolist()}
+            exact[key] = {"t": series[key]["t"]}
+            for field in STAT_FIELDS:
+                series[key][field] = _encode(merged[field][:, 0])
+                exact[key][field] = _encode(merged[field][:, 0], exact=True)
+        # Unrounded, so merging into it matches a rebuild from the partials
+        self._write_json(path, {"chunks": chunks, "series": exact})
+        return series
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dataq_utils.uploader import LocalS3Client
+
+    parser = argparse.ArgumentParser(
+        description="Backfill the rollup pyramid from chunk files."
+    )
+    parser.add_argument("chunks", nargs="+", help="Closed chunk files to fold in")
+    parser.add_argument("--bucket", default="aqp-readout-data")
+    parser.add_argument("--state-dir", default=os.path.join("data", ".pyramid"))
+    parser.add_argument(
+        "--local", metavar="ROOT", help="Write to a local directory instead of S3"
+    )
+    args = parser.parse_args()
+
+    if args.local:
+        client = LocalS3Client(args.local)
+    else:
+        import boto3
+
+        client = boto3.client("s3")
+    builder = PyramidBuilder(client, args.bucket, state_dir=args.state_dir)
+    for path in sorted(args.chunks):
+        print(f"{path}: {len(builder.add_chunk(path))} tiles")
@@ -0,0 +1,457 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+CHUNK_PREFIX = "device_readings_"
+INDEX_STRIDE = 1024  # CSV rows per time-index block
+CACHE_BYTES = 64 * 2**20  # Decoded closed chunks kept in memory
+DEFAULT_MAX_POINTS = 1000
+MAX_POINTS_LIMIT = 20000
+DEFAULT_SPAN = 6 * 3600  # Seconds queried when ``start`` is omitted
+PORT = 8765
+INT64_MIN, INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+
+def lttb(t, v, max_points):
+    """Largest-Triangle-Three-Buckets downsampling to at most ``max_points``.
+
+    Keeps the first and last point and, from each of ``max_points - 2``
+    equal-count buckets in between, the point forming the largest triangle
+    with the previously kept point and the mean of the next bucket. Peaks
+    and troughs survive, unlike plain decimation.
+    """
+    n = len(t)
+    max_points = max(int(max_points), 3)
+    if n <= max_points:
+        return t, v
+    edges = np.floor(np.linspace(1, n - 1, max_points - 1)).astype(np.int64)
+    edges = np.append(edges, n)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_t = t[hi : edges[i + 2]].mean()
+        next_v = v[hi : edges[i + 2]].mean()
+        area = np.abs(
+            (t[a] - next_t) * (v[lo:hi] - v[a]) - (t[a] - t[lo:hi]) * (next_v - v[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return t[keep], v[keep]
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by the total ``nbytes`` of its values."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+    def put(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _csv_time_ns(line):
+    fields = line.split(b",", 6)
+    if len(fields) > 5 and fields[5]:
+        return int(fields[5])
+    stamp = datetime.strptime(fields[0].decode(), "%Y-%m-%d %H:%M:%S")
+    return int(stamp.timestamp() * 1e9)
+
+
+def index_csv(path, offset):
+    """Index whole rows from ``offset`` as (offset, length, t_min, t_max) blocks."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    data = data[: data.rfind(b"\n") + 1]
+    lines = data.split(b"\n")[:-1]
+    blocks = []
+    position = offset
+    for i in range(0, len(lines), INDEX_STRIDE):
+        group = lines[i : i + INDEX_STRIDE]
+        length = sum(len(line) + 1 for line in group)
+        times = []
+        for line in group:
+            try:
+                times.append(_csv_time_ns(line))
+            except ValueError:
+                continue  # Header or torn row
+        if times:
+            blocks.append((position, length, min(times), max(times)))
+        position += length
+    return blocks, offset + len(data)
+
+
+def index_msgpack(path, offset):
+    """Index complete records from ``offset``, one block per record."""
+    import msgpack
+    import msgpack_numpy
+
+    blocks = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        unpacker = msgpack.Unpacker(f, object_hook=msgpack_numpy.decode, raw=False)
+        start = 0
+        for record in unpacker:
+            end = unpacker.tell()
+            t = record["timestamp_ns"]
+            if len(t):
+                blocks.append(
+                    (offset + start, end - start, int(t.min()), int(t.max()))
+                )
+            start = end
+    return blocks, offset + start
+
+
+def read_csv_blocks(path, blocks, lo_ns, hi_ns):
+    series = {}
+    with open(path, "rb") as f:
+        for offset, length, _, _ in blocks:
+            f.seek(offset)
+            for line in f.read(length).split(b"\n"):
+                try:
+                    t_ns = _csv_time_ns(line)
+                    fields = line.decode().split(",", 6)
+                    value = float(fields[4])
+                except (ValueError, IndexError):
+                    continue
+                if lo_ns <= t_ns < hi_ns:
+                    key = f"{fields[1]} - {fields[2]} - {fields[3]}"
+                    series.setdefault(key, []).append((t_ns, value))
+    return series
+
+
+def read_msgpack_blocks(path, blocks, lo_ns, hi_ns):
+    import msgpack
+    import msgpack_numpy
+
+    series = {}
+    with open(path, "rb") as f:
+        for offset, length, _, _ in blocks:
+            f.seek(offset)
+            record = msgpack.unpackb(
+                f.read(length), object_hook=msgpack_numpy.decode, raw=False
+            )
+            t = np.asarray(record["timestamp_ns"])
+            inside = (t >= lo_ns) & (t < hi_ns)
+            values = np.asarray(record["values"], dtype=np.float64)[inside]
+            for j, channel in enumerate(record["channels"]):
+                key = f"{record['device_type']} - {record['device_id']} - {channel}"
+                series.setdefault(key, []).extend(
+                    zip(t[inside].tolist(), values[:, j])
+                )
+    return series
+
+
+def read_hdf5_range(path, lo_ns, hi_ns):
+    """HDF5 chunks are columnar, so the timestamp dataset is the index."""
+    import h5py
+
+    series = {}
+    with h5py.File(path, "r") as f:
+        for device_type, devices in f.items():
+            for device_id, group in devices.items():
+                t = group["timestamp_ns"]
+                lo, hi = np.searchsorted(t[:], [lo_ns, hi_ns])
+                values = group["values"][lo:hi]
+                for j, channel in enumerate(group.attrs["channels"]):
+                    key = f"{device_type} - {device_id} - {channel}"
+                    series[key] = list(zip(t[lo:hi].tolist(), values[:, j]))
+    return series
+
+
+INDEXERS = {".csv": index_csv, ".msgpack": index_msgpack}
+BLOCK_READERS = {".csv": read_csv_blocks, ".msgpack": read_msgpack_blocks}
+
+
+class ChunkStore:
+    """Range reads over the chunk files in ``log_dir``.
+
+    Append-only formats get a time index of (offset, length, t_min, t_max)
+    blocks so a query only reads the blocks overlapping its range. The
+    index of the open chunk is extended as it grows; closed chunks have
+    theirs saved under ``<log_dir>/.index``. Closed chunks are decoded
+    whole and kept in a size-bounded ``LRUCache``. With an ``archive.Archiver``,
+    spans whose chunks were deleted by retention are read from the archive.
+    """
+
+    def __init__(
+        self, log_dir, chunk_duration=timedelta(hours=6), cache_bytes=CACHE_BYTES,
+        archive=None,
+    ):
+        self.log_dir = log_dir
+        self.archive = archive
+        self.chunk_duration = chunk_duration.total_seconds()
+        self.cache = LRUCache(cache_bytes)
+        self.indexes = {}  # path -> (blocks, indexed_bytes)
+        self.lock = threading.Lock()
+
+    def chunks(self, start, end):
+        """Chunk files overlapping [start, end) as (path, chunk_start, chunk_end)."""
+        found = []
+        for name in sorted(os.listdir(self.log_dir)):
+            if not name.startswith(CHUNK_PREFIX):
+                continue
+            stamp = os.path.splitext(name[len(CHUNK_PREFIX) :])[0]
+            try:
+                chunk_start = datetime.strptime(stamp, "%Y%m%d_%H%M").timestamp()
+            except ValueError:
+                continue
+            chunk_end = chunk_start + self.chunk_duration
+            if chunk_start < end and chunk_end > start:
+                path = os.path.join(self.log_dir, name)
+                found.append((path, chunk_start, chunk_end))
+        return found
+
+    def _index_path(self, path):
+        return os.path.join(self.log_dir, ".index", os.path.basename(path) + ".npz")
+
+    def index(self, path, closed):
+        """Time index of ``path``, built or extended to cover its complete records."""
+        ext = os.path.splitext(path)[1]
+        size = os.path.getsize(path)
+        with self.lock:
+            blocks, indexed = self.indexes.get(path, ([], 0))
+            if not blocks and closed and os.path.exists(self._index_path(path)):
+                saved = np.load(self._index_path(path))
+                if int(saved["size"]) == size:
+                    blocks = [tuple(b) for b in saved["blocks"].tolist()]
+                    indexed = size
+            if indexed < size:
+                new_blocks, indexed = INDEXERS[ext](path, indexed)
+                blocks = blocks + new_blocks
+                if closed:
+                    os.makedirs(os.path.join(self.log_dir, ".index"), exist_ok=True)
+                    np.savez(
+                        self._index_path(path),
+                        blocks=np.array(blocks, dtype=np.int64).reshape(-1, 4),
+                        size=indexed,
+                    )
+            self.indexes[path] = (blocks, indexed)
+        return blocks
+
+    def read(self, path, lo_ns, hi_ns, closed):
+        """{key: (t_ns, values)} for every series in ``path`` within [lo_ns, hi_ns).
+
+        A closed chunk is decoded whole once and cached, so any window over
+        it (a dashboard sliding along, say) is a slice of the cached arrays.
+        """
+        if not closed:
+            return self._decode(path, lo_ns, hi_ns)
+        cache_key = (path, os.path.getmtime(path))
+        whole = self.cache.get(cache_key)
+        if whole is None:
+            whole = self._decode(path, INT64_MIN, INT64_MAX, closed=True)
+            size = sum(t.nbytes + v.nbytes for t, v in whole.values())
+            self.cache.put(cache_key, whole, size)
+        series = {}
+        for key, (t, v) in whole.items():
+            i, j = np.searchsorted(t, [lo_ns, hi_ns])
+            series[key] = (t[i:j], v[i:j])
+        return series
+
+    def _decode(self, path, lo_ns, hi_ns, closed=False):
+        ext = os.path.splitext(path)[1]
+        if ext in INDEXERS:
+            blocks = [
+                b for b in self.index(path, closed) if b[3] >= lo_ns and b[2] < hi_ns
+            ]
+            rows = BLOCK_READERS[ext](path, blocks, lo_ns, hi_ns)
+        else:
+            rows = read_hdf5_range(path, lo_ns, hi_ns)
+
+        series = {}
+        for key, points in rows.items():
+            data = np.array(points, dtype=np.float64).reshape(-1, 2)
+            data = data[np.argsort(data[:, 0], kind="stable")]
+            series[key] = (data[:, 0].astype(np.int64), data[:, 1])
+        return series
+
+    def _read_archive(self, keys, start, end, chunks, parts):
+        """Add archived rows for the parts of [start, end) with no local chunk."""
+        covered = start
+        for _, chunk_start, chunk_end in chunks:
+            if chunk_start > covered:
+                break
+            covered = max(covered, chunk_end)
+        if covered >= end:
+            return
+        devices = {tuple(key.split(" - ")[:2]) for key in keys}
+        data = self.archive.read_range(int(start * 1e9), int(end * 1e9), devices)
+        for (device_type, device_id), series in data.items():
+            t = series["timestamp_ns"]
+            local = np.zeros(len(t), dtype=bool)
+            for _, chunk_start, chunk_end in chunks:
+                local |= (t >= chunk_start * 1e9) & (t < chunk_end * 1e9)
+            for j, channel in enumerate(series["channels"]):
+                key = f"{device_type} - {device_id} - {channel}"
+                if key in parts:
+                    parts[key].append((t[~local], series["values"][~local, j]))
+
+    def query(self, keys, start, end, max_points=DEFAULT_MAX_POINTS):
+        """Series for ``keys`` between epoch seconds ``start`` and ``end``, via LTTB."""
+        now = time.time()
+        parts = {key: [] for key in keys}
+        chunks = self.chunks(start, end)
+        for path, chunk_start, chunk_end in chunks:
+            closed = chunk_end <= now
+            lo = int(max(start, chunk_start) * 1e9)
+            hi = int(min(end, chunk_end) * 1e9)
+            series = self.read(path, lo, hi, closed)
+            for key in keys:
+                if key in series:
+                    parts[key].append(series[key])
+        if self.archive is not None:
+            self._read_archive(keys, start, end, chunks, parts)
+
+        result = {}
+        for key, pieces in parts.items():
+            if not pieces:
+                result[key] = {"t": [], "v": []}
+                continue
+            t = np.concatenate([p[0] for p in pieces]) / 1e9
+            v = np.concatenate([p[1] for p in pieces])
+            if len(pieces) > 1:
+                order = np.argsort(t, kind="stable")
+                t, v = t[order], v[order]
+            ok = ~np.isnan(v)
+            t, v = lttb(t[ok], v[ok], max_points)
+            result[key] = {"t": t.tolist(), "v": v.tolist()}
+        return result
+
+
+def _parse_time(value, default):
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """``GET /series?channel=<key>&start=..&end=..&max_points=N``.
+
+    ``channel`` may repeat and uses the ``"<device_type> - <device_id> -
+    <channel>"`` keys; ``start``/``end`` are epoch seconds or ISO 8601.
+    ``GET /stats`` reports the cache counters.
+    """
+
+    store = None
+
+    def _send(self, status, document):
+        body = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/stats":
+            return self._send(200, self.store.cache.stats())
+        if url.path != "/series":
+            return self._send(404, {"error": f"unknown path {url.path}"})
+        try:
+            keys = params["channel"]
+            end = _parse_time(params.get("end", [None])[0], time.time())
+            start = _parse_time(params.get("start", [None])[0], end - DEFAULT_SPAN)
+            max_points = min(
+                int(params.get("max_points", [DEFAULT_MAX_POINTS])[0]),
+                MAX_POINTS_LIMIT,
+            )
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"error": f"bad query: {e}"})
+        try:
+            series = self.store.query(keys, start, end, max_points)
+        except Exception as e:  # A corrupt or partly written chunk
+            return self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        self._send(200, {"start": start, "end": end, "series": series})
+
+    def log_message(self, format, *args):
+        pass  # Keep the logger's console output readable
+
+
+class QueryServer(threading.Thread):
+    """Serve a ``ChunkStore`` over HTTP until ``stop_event`` is set."""
+
+    def __init__(self, store, stop_event, host="127.0.0.1", port=PORT):
+        super().__init__(name="query-server", daemon=True)
+        handler = type("Handler", (QueryHandler,), {"store": store})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.stop_event = stop_event
+
+    def run(self):
+        with self.httpd:
+            server = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            server.start()
+            self.stop_event.wait()
+            self.httpd.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve range queries over chunk files."
+    )
+    parser.add_argument("--log-dir", default="data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--chunk-hours", type=float, default=6)
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    store = ChunkStore(args.log_dir, timedelta(hours=args.chunk_hours))
+    server = QueryServer(store, stop_event, args.host, args.port)
+    server.start()
+    print(f"Serving {args.log_dir} on http://{args.host}:{args.port}/series")
+    try:
+        while server.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+    server.join()
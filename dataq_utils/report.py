@@ -0,0 +1,461 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dataq_utils.archive import chunk_start
+from dataq_utils.names import nameMapping
+
+CHUNK_DURATION = timedelta(hours=6)
+GAP = 300.0  # Seconds without a sample that count as a gap in coverage
+RAMP_WINDOW = 600.0  # Seconds a ramp rate is measured over
+# Readings the dashboard hides too: open or unplugged thermocouples
+DISCARD_AT_OR_BELOW = {"DI-245": 10.0}
+CACHE_DIR = ".report"  # Under the log directory, one subdirectory per parameter set
+
+
+def parse_csv_chunk(path):
+    """``{key: (t_ns, value, low, high)}`` from a CSV chunk, parsed by NumPy.
+
+    ``low``/``high`` are the rollup min/max columns (the value itself for
+    rows without them). Chunks ``loadtxt`` cannot take in one pass, such
+    as ones written before the epoch_ns column, go through
+    ``chunk_reader`` instead.
+    """
+    dtype = [
+        ("device_type", "U16"), ("device_id", "U16"), ("channel", "U16"),
+        ("value", "f8"), ("t_ns", "i8"), ("low", "f8"), ("high", "f8"),
+    ]
+    if os.path.getsize(path) == 0:
+        return {}
+    rows = None
+    for usecols in ((1, 2, 3, 4, 5, 6, 7), (1, 2, 3, 4, 5)):
+        try:
+            rows = np.loadtxt(
+                path, delimiter=",", usecols=usecols, comments=None, ndmin=1,
+                dtype=dtype[: len(usecols)],
+            )
+            break
+        except (ValueError, IndexError):
+            continue
+    if rows is None:
+        from dataq_utils.chunk_reader import read_csv_chunk
+
+        return _split_series(read_csv_chunk(path))
+
+    low = rows["low"] if "low" in rows.dtype.names else rows["value"]
+    high = rows["high"] if "high" in rows.dtype.names else rows["value"]
+    keys = np.char.add(
+        np.char.add(np.char.add(rows["device_type"], " - "), rows["device_id"]),
+        np.char.add(" - ", rows["channel"]),
+    )
+    names, inverse = np.unique(keys, return_inverse=True)
+    order = np.lexsort((rows["t_ns"], inverse))
+    bounds = np.searchsorted(inverse[order], np.arange(len(names) + 1))
+    channels = {}
+    for i, key in enumerate(names.tolist()):
+        pick = order[bounds[i] : bounds[i + 1]]
+        channels[key] = (rows["t_ns"][pick], rows["value"][pick], low[pick], high[pick])
+    return channels
+
+
+def _split_series(chunk):
+    """``read_chunk``-style ``{(type, id): series}`` to per-channel tuples."""
+    channels = {}
+    for (device_type, device_id), s in chunk.items():
+        low = s.get("min", s["values"])
+        high = s.get("max", s["values"])
+        for j, channel in enumerate(s["channels"]):
+            key = f"{device_type} - {device_id} - {channel}"
+            channels[key] = (
+                s["timestamp_ns"], s["values"][:, j], low[:, j], high[:, j]
+            )
+    return channels
+
+
+def _read_other(path):
+    from dataq_utils.chunk_reader import read_chunk
+
+    return _split_series(read_chunk(path))
+
+
+def _read_archive(path):
+    from dataq_utils.archive import read_archive
+
+    return _split_series(read_archive(path))
+
+
+READERS = {
+    ".csv": parse_csv_chunk,
+    ".h5": _read_other,
+    ".msgpack": _read_other,
+    ".dqa": _read_archive,
+}
+
+
+def _local_days(t_ns):
+    """(date, lo, hi) index ranges of ``t_ns`` (sorted) per local calendar day."""
+    first = datetime.fromtimestamp(t_ns[0] / 1e9).date()
+    last = datetime.fromtimestamp(t_ns[-1] / 1e9).date()
+    days = []
+    day = first
+    while day <= last:
+        begin = datetime(day.year, day.month, day.day)
+        lo, hi = np.searchsorted(
+            t_ns,
+            [begin.timestamp() * 1e9, (begin + timedelta(days=1)).timestamp() * 1e9],
+        )
+        if hi > lo:
+            days.append((day.isoformat(), int(lo), int(hi)))
+        day += timedelta(days=1)
+    return days
+
+
+def channel_stats(t_ns, value, low, high, params):
+    """Partial statistics of one channel's samples within one chunk.
+
+    Time above/below a threshold counts each sample for the time until the
+    next one (its typical spacing across a gap). Ramp rates are per hour,
+    over ``ramp_window`` seconds. Everything here merges with
+    ``merge_stats``.
+    """
+    t = t_ns / 1e9
+    dt = np.diff(t)
+    nominal = float(np.median(dt)) if len(dt) else 0.0
+    dwell = np.append(dt, nominal)
+    dwell[dwell > params["gap"]] = nominal
+    stats = {
+        "samples": len(t),
+        "first": int(t_ns[0]),
+        "last": int(t_ns[-1]),
+        "sum": float(value.sum()),
+        "above": {
+            str(x): float(dwell[value > x].sum()) for x in params["above"]
+        },
+        "below": {
+            str(x): float(dwell[value < x].sum()) for x in params["below"]
+        },
+        "ramp_up": None,
+        "ramp_down": None,
+        "daily": {},
+        "gaps": [
+            [int(t_ns[i]), int(t_ns[i + 1])] for i in np.flatnonzero(dt > params["gap"])
+        ],
+    }
+
+    window = params["ramp_window"]
+    j = np.searchsorted(t, t + window)
+    ok = j < len(t)
+    i, j = np.flatnonzero(ok), j[ok]
+    span = t[j] - t[i]
+    keep = span <= 2 * window
+    i, j, span = i[keep], j[keep], span[keep]
+    if len(i):
+        rate = (value[j] - value[i]) / span * 3600
+        up, down = int(np.argmax(rate)), int(np.argmin(rate))
+        stats["ramp_up"] = [float(rate[up]), int(t_ns[i[up]])]
+        stats["ramp_down"] = [float(rate[down]), int(t_ns[i[down]])]
+
+    for day, lo, hi in _local_days(t_ns):
+        k_low = lo + int(np.argmin(low[lo:hi]))
+        k_high = lo + int(np.argmax(high[lo:hi]))
+        stats["daily"][day] = [
+            float(low[k_low]), int(t_ns[k_low]), float(high[k_high]), int(t_ns[k_high])
+        ]
+    return stats
+
+
+def merge_stats(parts, gap=GAP):
+    """Combine one channel's partials, adding the gaps between them."""
+    parts = sorted(parts, key=lambda p: p["first"])
+    merged = {
+        "samples": 0, "first": parts[0]["first"], "last": parts[0]["last"],
+        "sum": 0.0, "above": {}, "below": {}, "ramp_up": None, "ramp_down": None,
+        "daily": {}, "gaps": [],
+    }
+    for part in parts:
+        if part["first"] - merged["last"] > gap * 1e9:
+            merged["gaps"].append([merged["last"], part["first"]])
+        merged["last"] = max(merged["last"], part["last"])
+        merged["samples"] += part["samples"]
+        merged["sum"] += part["sum"]
+        merged["gaps"] += part["gaps"]
+        for side in ("above", "below"):
+            for x, seconds in part[side].items():
+                merged[side][x] = merged[side].get(x, 0.0) + seconds
+        if part["ramp_up"] and (
+            merged["ramp_up"] is None or part["ramp_up"][0] > merged["ramp_up"][0]
+        ):
+            merged["ramp_up"] = part["ramp_up"]
+        if part["ramp_down"] and (
+            merged["ramp_down"] is None
+            or part["ramp_down"][0] < merged["ramp_down"][0]
+        ):
+            merged["ramp_down"] = part["ramp_down"]
+        for day, (lo, t_lo, hi, t_hi) in part["daily"].items():
+            old = merged["daily"].get(day)
+            if old is None:
+                merged["daily"][day] = [lo, t_lo, hi, t_hi]
+                continue
+            if lo < old[0]:
+                old[0:2] = lo, t_lo
+            if hi > old[2]:
+                old[2:4] = hi, t_hi
+    merged["gaps"].sort()
+    merged["daily"] = dict(sorted(merged["daily"].items()))
+    merged["mean"] = merged["sum"] / merged["samples"] if merged["samples"] else None
+    return merged
+
+
+def process_unit(unit):
+    """Worker: read one chunk or archive and return its per-channel partials.
+
+    Rows outside the unit's [lo, hi) or inside its ``exclude`` spans (parts
+    of an archive whose chunk is still on disk) are dropped first.
+    """
+    params = unit["params"]
+    series = READERS[os.path.splitext(unit["path"])[1]](unit["path"])
+    partials = {}
+    for key, (t_ns, value, low, high) in series.items():
+        t_ns = np.asarray(t_ns, dtype=np.int64)
+        keep = (t_ns >= unit["lo"]) & (t_ns < unit["hi"]) & ~np.isnan(value)
+        for lo, hi in unit["exclude"]:
+            keep &= (t_ns < lo) | (t_ns >= hi)
+        floor = params["discard"].get(key.split(" - ")[0])
+        if floor is not None:
+            keep &= value > floor
+        if keep.any():
+            low = np.where(np.isnan(low), value, low)
+            high = np.where(np.isnan(high), value, high)
+            partials[key] = channel_stats(
+                t_ns[keep], value[keep], low[keep], high[keep], params
+            )
+    return partials
+
+
+def find_units(log_dir, start=None, end=None, chunk_duration=CHUNK_DURATION,
+               archive_dir=None):
+    """Chunk files and archives overlapping [start, end) (datetimes, None for
+    unbounded), as work units; archives only contribute spans with no local
+    chunk."""
+    units, chunk_spans = [], []
+    for name in sorted(os.listdir(log_dir)):
+        begin = chunk_start(name)
+        if begin is None or os.path.splitext(name)[1] not in READERS:
+            continue
+        span = (begin.timestamp() * 1e9, (begin + chunk_duration).timestamp() * 1e9)
+        chunk_spans.append([int(span[0]), int(span[1])])
+        units.append((os.path.join(log_dir, name), span, []))
+
+    from dataq_utils.archive import read_archive_index
+
+    archive_dir = archive_dir or os.path.join(log_dir, "archive")
+    if os.path.isdir(archive_dir):
+        for period in sorted(os.listdir(archive_dir)):
+            folder = os.path.join(archive_dir, period)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if os.path.splitext(name)[1] not in READERS:
+                    continue
+                path = os.path.join(folder, name)
+                index = read_archive_index(path)
+                if not index:
+                    continue
+                span = (
+                    min(b["t_min"] for b in index), max(b["t_max"] for b in index) + 1
+                )
+                exclude = [s for s in chunk_spans if s[0] < span[1] and s[1] > span[0]]
+                units.append((path, span, exclude))
+
+    lo = start.timestamp() * 1e9 if start else -np.inf
+    hi = end.timestamp() * 1e9 if end else np.inf
+    return [
+        {
+            "path": path,
+            "lo": int(max(lo, span[0])),
+            "hi": int(min(hi, span[1])),
+            "exclude": exclude,
+        }
+        for path, span, exclude in units
+        if span[0] < hi and span[1] > lo
+    ]
+
+
+def _unit_key(unit):
+    stat = os.stat(unit["path"])
+    return [
+        os.path.basename(unit["path"]), stat.st_size, stat.st_mtime_ns,
+        unit["lo"], unit["hi"], unit["exclude"],
+    ]
+
+
+def build_report(log_dir, start=None, end=None, above=(), below=(), gap=GAP,
+                 ramp_window=RAMP_WINDOW, discard=DISCARD_AT_OR_BELOW, jobs=None,
+                 chunk_duration=CHUNK_DURATION, cache=True):
+    """Per-channel statistics of every chunk (and archive) in [start, end)
+    (datetimes; None for unbounded).
+
+    Units are processed one per worker in a process pool of ``jobs``
+    (default: one per CPU). Each unit's partial result is cached under
+    ``<log_dir>/.report/<parameter hash>/`` with the file's size and
+    mtime, so a re-run only reads chunks that are new or still growing.
+    Returns ``{"channels": {key: stats}, "units", "parsed", "seconds"}``.
+    """
+    started = time.perf_counter()
+    params = {
+        "above": sorted(above),
+        "below": sorted(below),
+        "gap": gap,
+        "ramp_window": ramp_window,
+        "discard": discard or {},
+    }
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    cache_dir = os.path.join(log_dir, CACHE_DIR, digest[:12])
+
+    units = find_units(log_dir, start, end, chunk_duration)
+    results, todo = [], []
+    for unit in units:
+        unit["params"] = params
+        key = _unit_key(unit)
+        path = os.path.join(cache_dir, os.path.basename(unit["path"]) + ".json")
+        if cache and os.path.exists(path):
+            with open(path) as f:
+                cached = json.load(f)
+            if cached["key"] == key:
+                results.append(cached["partials"])
+                continue
+        todo.append((unit, key, path))
+
+    if len(todo) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parsed = list(pool.map(process_unit, [u for u, _, _ in todo]))
+    else:
+        parsed = [process_unit(unit) for unit, _, _ in todo]
+    for (unit, key, path), partials in zip(todo, parsed):
+        results.append(partials)
+        if cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump({"key": key, "partials": partials}, f)
+            os.replace(path + ".tmp", path)
+
+    by_channel = {}
+    for partials in results:
+        for key, stats in partials.items():
+            by_channel.setdefault(key, []).append(stats)
+    return {
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "channels": {
+            key: merge_stats(parts, gap) for key, parts in sorted(by_channel.items())
+        },
+        "units": len(units),
+        "parsed": len(todo),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _when(t_ns):
+    return datetime.fromtimestamp(t_ns / 1e9).strftime("%Y-%m-%d %H:%M")
+
+
+def format_report(report, names=nameMapping):
+    lines = [
+        f"{report['start'] or 'Start'} to {report['end'] or 'now'}: "
+        f"{report['units']} chunks "
+        f"({report['parsed']} read, the rest cached) in {report['seconds']:.1f} s"
+    ]
+    for key, s in report["channels"].items():
+        lines.append("")
+        lines.append(f"{names.get(key, key)} ({key})" if key in names else key)
+        lines.append(
+            f"  {s['samples']} samples {_when(s['first'])} to {_when(s['last'])}, "
+            f"mean {s['mean']:.2f}"
+        )
+        for side in ("above", "below"):
+            for x, seconds in s[side].items():
+                lines.append(f"  {side} {x}: {seconds / 3600:.2f} h")
+        if s["ramp_up"]:
+            lines.append(
+                f"  fastest rise {s['ramp_up'][0]:+.2f}/h at {_when(s['ramp_up'][1])}, "
+                f"fall {s['ramp_down'][0]:+.2f}/h at {_when(s['ramp_down'][1])}"
+            )
+        if s["gaps"]:
+            total = sum(b - a for a, b in s["gaps"]) / 3.6e12
+            a, b = max(s["gaps"], key=lambda g: g[1] - g[0])
+            lines.append(
+                f"  {len(s['gaps'])} gaps, {total:.2f} h in all; longest "
+                f"{(b - a) / 3.6e12:.2f} h from {_when(a)}"
+            )
+        for day, (lo, t_lo, hi, t_hi) in s["daily"].items():
+            lines.append(
+                f"  {day}  min {lo:8.2f} at {_when(t_lo)[11:]}  "
+                f"max {hi:8.2f} at {_when(t_hi)[11:]}"
+            )
+    return "\n".join(lines)
+
+
+def _select(report, selectors, names=nameMapping):
+    """Keep channels whose key or display name matches one of ``selectors``."""
+    wanted = {s.lower() for s in selectors}
+    report["channels"] = {
+        key: s
+        for key, s in report["channels"].items()
+        if key.lower() in wanted or names.get(key, "").lower() in wanted
+    }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Bakeout report over the chunk history: time above/below "
+        "thresholds, ramp rates, daily extrema and coverage gaps per channel."
+    )
+    parser.add_argument("--log-dir", default="data")
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, help="e.g. 2024-05-01 (default: all)"
+    )
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, help="Exclusive (default: all)"
+    )
+    parser.add_argument(
+        "--channel", action="append", default=[],
+        help="Key or name, e.g. 'Glass Cell 1' (repeatable; default: all)",
+    )
+    parser.add_argument("--above", type=float, action="append", default=[])
+    parser.add_argument("--below", type=float, action="append", default=[])
+    parser.add_argument("--gap", type=float, default=GAP, help="Seconds")
+    parser.add_argument(
+        "--ramp-window", type=float, default=RAMP_WINDOW, help="Seconds"
+    )
+    parser.add_argument(
+        "--keep-all", action="store_true",
+        help="Keep the DI-245 readings <= 10 the dashboard hides",
+    )
+    parser.add_argument("--jobs", type=int, help="Worker processes")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead")
+    args = parser.parse_args()
+
+    report = build_report(
+        args.log_dir,
+        args.start,
+        args.end,
+        above=args.above,
+        below=args.below,
+        gap=args.gap,
+        ramp_window=args.ramp_window,
+        discard={} if args.keep_all else DISCARD_AT_OR_BELOW,
+        jobs=args.jobs,
+        cache=not args.no_cache,
+    )
+    if args.channel:
+        report = _select(report, args.channel)
+    print(json.dumps(report, indent=1) if args.json else format_report(report))
@@ -0,0 +1,90 @@
+import numpy as np
+
+ROLLUP_FIELDS = ("min", "max", "std", "count")
+
+
+class IntervalAggregator:
+    """Fold every sample into per-channel statistics for fixed time intervals.
+
+    Intervals are aligned to multiples of ``interval`` seconds since the
+    epoch. Only the running count, mean, M2 (sum of squared deviations),
+    min and max of the open interval are kept, so memory does not depend on
+    the interval length or sample rate. NaN samples are skipped.
+    """
+
+    def __init__(self, num_channels, interval):
+        self.num_channels = num_channels
+        self.interval = interval
+        self.bucket = None
+        self._reset()
+
+    def _reset(self):
+        self.count = np.zeros(self.num_channels, dtype=np.int64)
+        self.mean = np.zeros(self.num_channels)
+        self.m2 = np.zeros(self.num_channels)
+        self.min = np.full(self.num_channels, np.inf)
+        self.max = np.full(self.num_channels, -np.inf)
+
+    def _fold(self, values):
+        """Merge a block's statistics into the running ones (Chan et al.)."""
+        mask = ~np.isnan(values)
+        count = mask.sum(axis=0)
+        safe = np.maximum(count, 1)
+        mean = np.where(mask, values, 0).sum(axis=0) / safe
+        m2 = (np.where(mask, values - mean, 0) ** 2).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        weight = np.divide(count, total, out=np.zeros(self.num_channels), where=total > 0)
+        self.m2 += m2 + delta**2 * self.count * weight
+        self.mean += delta * weight
+        self.count = total
+        self.min = np.minimum(self.min, np.where(mask, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(mask, values, -np.inf).max(axis=0))
+
+    def _emit(self):
+        """Close the open interval and return its rollup."""
+        empty = self.count == 0
+        std = np.sqrt(self.m2 / np.maximum(self.count, 1))
+        rollup = {
+            "start": self.bucket * self.interval,
+            "mean": np.where(empty, np.nan, self.mean),
+            "min": np.where(empty, np.nan, self.min),
+            "max": np.where(empty, np.nan, self.max),
+            "std": np.where(empty, np.nan, std),
+            "count": self.count.copy(),
+        }
+        self._reset()
+        return rollup
+
+    def add(self, timestamps, values):
+        """Fold a block in; returns rollups for every interval that closed."""
+        values = np.asarray(values, dtype=np.float64)
+        buckets = np.floor(np.asarray(timestamps) / self.interval).astype(np.int64)
+        closed = []
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[:1] - 1))
+        for lo, hi in zip(starts, np.append(starts[1:], len(buckets))):
+            bucket = int(buckets[lo])
+            if self.bucket is not None and bucket != self.bucket:
+                closed.append(self._emit())
+            self.bucket = bucket
+            self._fold(values[lo:hi])
+        return closed
+
+    def flush(self):
+        """Close the open interval early, e.g. at shutdown."""
+        if self.bucket is None or not self.count.any():
+            return []
+        rollup = self._emit()
+        self.bucket = None
+        return [rollup]
+
+
+def stack_rollups(rollups):
+    """Turn a list of rollups into (start_times, means, extra) for a chunk writer."""
+    starts = np.array([r["start"] for r in rollups], dtype=np.float64)
+    means = np.array([r["mean"] for r in rollups])
+    extra = {
+        field: np.array([r[field] for r in rollups]) for field in ROLLUP_FIELDS
+    }
+    return starts, means, extra
@@ -0,0 +1,268 @@
+import os
+import select
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from serial.tools import list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+from dataq_utils.conversion import TC_B, TC_M
+from dataq_utils.di245 import PID as DI245_PID
+from dataq_utils.di1100 import COUNTS_TO_VOLTS, DIG_IN_MASK, PID as DI1100_PID
+from dataq_utils.di1100 import SAMPLE_CLOCK as DI1100_CLOCK
+from dataq_utils.di1100 import VID as DATAQ_VID
+
+TICK = 0.01  # Seconds between batches of generated scans
+MAX_BACKLOG = 1 << 20  # Bytes queued for a slow reader before scans are dropped
+
+
+class DeviceSimulator(threading.Thread):
+    """Speak a DATAQ protocol on the master side of a pseudo-terminal.
+
+    The host opens ``path`` like a real port. Once started, scans are
+    generated in batches every ``TICK`` at ``rate`` scans/s (or the rate the
+    host configured, if ``rate`` is None), so far more than the hardware
+    can do is possible. Scan ``i`` is due at ``scan_time(i)``; if the host
+    stops reading and ``MAX_BACKLOG`` bytes pile up, new scans are dropped
+    and counted in ``overflow_scans`` like a device FIFO overrun.
+    """
+
+    pid = None
+    serial_prefix = "SIM"
+
+    def __init__(self, num_channels=4, rate=None, seed=0, serial_number=None):
+        super().__init__(daemon=True)
+        self.num_channels = num_channels
+        self.rate = rate
+        self.configured_rate = None
+        self.rng = np.random.default_rng(seed)
+        self.master, self.slave = os.openpty()
+        os.set_blocking(self.master, False)
+        self.path = os.ttyname(self.slave)
+        self.serial_number = serial_number or f"{self.serial_prefix}{seed:05d}"
+        self.name = f"sim-{self.path}"
+        self.stop_event = threading.Event()
+        self.commands = []
+        self.scanning = False
+        self.t0 = None
+        self.sent_scans = 0
+        self.overflow_scans = 0
+        self.inbuf = b""
+        self.outbuf = bytearray()
+
+    def port_info(self):
+        """A ``ListPortInfo`` matching what the real device enumerates as."""
+        info = ListPortInfo(self.path, skip_link_detection=True)
+        info.vid = DATAQ_VID
+        info.pid = self.pid
+        info.serial_number = self.serial_number
+        info.description = f"Simulated {type(self).__name__}"
+        return info
+
+    def scan_rate(self):
+        return self.rate or self.configured_rate or 10.0
+
+    def scan_time(self, index):
+        """Monotonic time at which scan ``index`` existed at the device."""
+        return self.t0 + (index + 1) / self.scan_rate()
+
+    def start_scanning(self):
+        self.scanning = True
+        self.t0 = time.monotonic()
+        self.sent_scans = 0
+        self.overflow_scans = 0
+
+    def stop_scanning(self):
+        self.scanning = False
+
+    def handle(self, command):
+        """Act on one complete command; returns bytes to write back (or None)."""
+        raise NotImplementedError
+
+    def encode(self, t):
+        """Raw bytes for the scans at times ``t``."""
+        raise NotImplementedError
+
+    def _parse(self):
+        while self.inbuf:
+            if self.inbuf.startswith(b"\x00"):
+                if len(self.inbuf) < 3:
+                    return
+                command, self.inbuf = self.inbuf[1:3], self.inbuf[3:]
+            else:
+                end = self.inbuf.find(b"\r")
+                if end < 0:
+                    return
+                command, self.inbuf = self.inbuf[:end], self.inbuf[end + 1 :]
+            command = command.decode(errors="replace").strip()
+            self.commands.append(command)
+            reply = self.handle(command)
+            if reply:
+                self.outbuf += reply
+
+    def _generate(self):
+        due = int((time.monotonic() - self.t0) * self.scan_rate())
+        n = due - self.sent_scans - self.overflow_scans
+        if n <= 0:
+            return
+        index = self.sent_scans + self.overflow_scans + np.arange(n)
+        if len(self.outbuf) > MAX_BACKLOG:
+            self.overflow_scans += n
+            return
+        self.outbuf += self.encode(index / self.scan_rate())
+        self.sent_scans += n
+
+    def _flush(self):
+        if not self.outbuf:
+            return
+        try:
+            written = os.write(self.master, self.outbuf)
+        except (BlockingIOError, OSError):
+            return
+        del self.outbuf[:written]
+
+    def run(self):
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([self.master], [], [], TICK)
+            if ready:
+                try:
+                    self.inbuf += os.read(self.master, 4096)
+                except (BlockingIOError, OSError):
+                    pass
+                self._parse()
+            if self.scanning:
+                self._generate()
+            self._flush()
+
+    def close(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class DI245Simulator(DeviceSimulator):
+    """DI-245: ``chn``/``xrate`` setup, ``\\x00S1`` echoes ``S1`` and streams
+    14-bit thermocouple counts, 7 bits per byte with the sync flag in bit 0."""
+
+    pid = DI245_PID
+    serial_prefix = "SIM245"
+
+    def __init__(self, *args, tc_type="K", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tc_type = tc_type
+        self.phase = self.rng.uniform(0, 2 * np.pi, self.num_channels)
+
+    def handle(self, command):
+        if command == "S1":
+            self.start_scanning()
+            return b"S1"
+        if command == "S0":
+            self.stop_scanning()
+        elif command.startswith("xrate"):
+            self.configured_rate = float(command.split()[2])
+        return None
+
+    def temperatures(self, t):
+        """A slow bakeout-like ramp with ripple and noise per channel, in °C."""
+        ramp = 25 + 60 * (1 - np.exp(-t / 3600))[:, None]
+        ripple = 2 * np.sin(2 * np.pi * t[:, None] / 30 + self.phase)
+        noise = self.rng.normal(scale=0.1, size=(len(t), self.num_channels))
+        return ramp + ripple + noise + 5 * np.arange(self.num_channels)
+
+    def encode(self, t):
+        counts = np.round(
+            (self.temperatures(t) - TC_B[self.tc_type]) / TC_M[self.tc_type]
+        )
+        counts = np.clip(counts, -8192, 8191).astype(np.int64)
+        raw = (counts & 0x3FFF) ^ (1 << 13)
+        frames = np.empty((len(t), self.num_channels, 2), dtype=np.uint8)
+        frames[..., 0] = ((raw & 0x7F) << 1) | 1
+        frames[..., 1] = ((raw >> 7) << 1) | 1
+        frames[:, 0, 0] &= 0xFE  # Sync flag: first byte of each scan
+        return frames.tobytes()
+
+
+class DI1100Simulator(DeviceSimulator):
+    """DI-1100: ``slist``/``srate``/``start 0``, then little-endian int16
+    samples in slist order with the dig_in states in the two LSBs of
+    position 0."""
+
+    pid = DI1100_PID
+    serial_prefix = "SIM1100"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slist = {}
+        self.phase = self.rng.uniform(0, 2 * np.pi, self.num_channels)
+
+    def handle(self, command):
+        parts = command.split()
+        if not parts:
+            return None
+        if parts[0] == "slist":
+            self.slist[int(parts[1])] = int(parts[2])
+            self.num_channels = max(len(self.slist), 1)
+            self.phase = self.rng.uniform(0, 2 * np.pi, self.num_channels)
+        elif parts[0] == "srate":
+            self.configured_rate = DI1100_CLOCK / int(parts[1]) / self.num_channels
+        elif parts[0] == "start":
+            self.start_scanning()
+        elif parts[0] == "stop":
+            self.stop_scanning()
+        return None
+
+    def voltages(self, t):
+        wave = 2.5 + 2 * np.sin(2 * np.pi * t[:, None] / 10 + self.phase)
+        return wave + self.rng.normal(scale=0.01, size=(len(t), self.num_channels))
+
+    def encode(self, t):
+        counts = np.clip(np.round(self.voltages(t) / COUNTS_TO_VOLTS), -32768, 32767)
+        counts = counts.astype(np.int64)
+        dig_in = (t * 2).astype(np.int64) & DIG_IN_MASK  # Toggle twice a second
+        counts[:, 0] = (counts[:, 0] & ~DIG_IN_MASK) | dig_in
+        return counts.astype("<i2").tobytes()
+
+
+SIMULATORS = {"di245": DI245Simulator, "di1100": DI1100Simulator}
+
+
+@contextmanager
+def injected_ports(simulators):
+    """Make ``list_ports.comports`` also report ``simulators`` while active,
+    so ``find_di245_ports``/``find_di1100_ports`` discover them unchanged."""
+    real = list_ports.comports
+
+    def comports(*args, **kwargs):
+        return list(real(*args, **kwargs)) + [s.port_info() for s in simulators]
+
+    list_ports.comports = comports
+    try:
+        yield
+    finally:
+        list_ports.comports = real
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run simulated DATAQ devices.")
+    parser.add_argument("--di245", type=int, default=1)
+    parser.add_argument("--di1100", type=int, default=1)
+    parser.add_argument("--rate", type=float, help="Scans/s, overriding the host's")
+    args = parser.parse_args()
+
+    sims = [DI245Simulator(rate=args.rate, seed=i) for i in range(args.di245)]
+    sims += [DI1100Simulator(rate=args.rate, seed=i) for i in range(args.di1100)]
+    for sim in sims:
+        sim.start()
+        print(f"{type(sim).__name__} {sim.serial_number} on {sim.path}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for sim in sims:
+            sim.close()
@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import threading
+import time
+
+from dataq_utils.uploader import LocalS3Client
+
+BACKENDS = ("aws", "local", "memory")
+
+
+class LazyClient:
+    """A boto3 client created on first use instead of at import.
+
+    Importing boto3 and resolving credentials takes most of a second (and
+    an AWS config), so a process that never uploads never pays for it.
+    Attribute access is forwarded to the real client.
+    """
+
+    def __init__(self, service, **kwargs):
+        self.service = service
+        self.kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+
+                    self._client = boto3.client(self.service, **self.kwargs)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class MemoryS3Client:
+    """In-memory stand-in for the S3 client subset used here (tests, dry runs)."""
+
+    def __init__(self):
+        self.objects = {}  # (bucket, key) -> (body, metadata)
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **metadata):
+        body = Body if isinstance(Body, bytes) else Body.read()
+        with self.lock:
+            self.objects[(Bucket, Key)] = (body, metadata)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self.put_object(Bucket, Key, f.read(), **(ExtraArgs or {}))
+
+    def get_object(self, Bucket, Key, Range=None):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(f"NoSuchKey: {Bucket}/{Key}")
+        body, metadata = self.objects[(Bucket, Key)]
+        if Range is not None:
+            first, last = Range.removeprefix("bytes=").split("-")
+            body = body[int(first) : int(last) + 1]
+        return {"Body": io.BytesIO(body), **metadata}
+
+    def delete_object(self, Bucket, Key):
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix=""):
+        with self.lock:
+            keys = sorted(
+                (key, len(body))
+                for (bucket, key), (body, _) in self.objects.items()
+                if bucket == Bucket and key.startswith(Prefix)
+            )
+        contents = [{"Key": key, "Size": size} for key, size in keys]
+        return {"Contents": contents, "KeyCount": len(contents)}
+
+
+class SNSAlerts:
+    """Publish alerts to an SNS topic through a ``LazyClient``."""
+
+    def __init__(self, topic_arn, **client_kwargs):
+        self.topic_arn = topic_arn
+        self.client = LazyClient("sns", **client_kwargs)
+
+    def publish(self, subject, message):
+        self.client.publish(TopicArn=self.topic_arn, Subject=subject, Message=message)
+
+
+class FileAlerts:
+    """Append alerts as JSON lines to ``path``, for air-gapped hosts."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def publish(self, subject, message):
+        line = json.dumps({"time": time.time(), "subject": subject, "message": message})
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class MemoryAlerts:
+    def __init__(self):
+        self.sent = []  # (subject, message)
+
+    def publish(self, subject, message):
+        self.sent.append((subject, message))
+
+
+def make_sinks(backend, root=None, region_name=None, topic_arn=None):
+    """Return ``(object_client, alerts)`` for one of ``BACKENDS``.
+
+    ``object_client`` has the boto3 S3 methods the uploader, pyramid and
+    archiver call; ``alerts`` has ``publish(subject, message)``. "aws"
+    creates nothing until the first upload or alert; "local" keeps objects
+    under ``<root>/<bucket>/`` and alerts in ``<root>/alerts.jsonl``;
+    "memory" keeps both in the process.
+    """
+    if backend == "aws":
+        return (
+            LazyClient("s3", region_name=region_name),
+            SNSAlerts(topic_arn, region_name=region_name),
+        )
+    if backend == "local":
+        return LocalS3Client(root), FileAlerts(os.path.join(root, "alerts.jsonl"))
+    if backend == "memory":
+        return MemoryS3Client(), MemoryAlerts()
+    raise ValueError(f"unknown sink backend {backend!r}; expected one of {BACKENDS}")
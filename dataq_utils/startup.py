@@ -0,0 +1,194 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_SAMPLE_TIMEOUT = 30.0  # Seconds before a run counts as never sampling
+TOP_IMPORTS = 8  # Slowest imports reported per run
+
+# Metrics compared against a saved baseline; lower is better for all of them
+COMPARED = ("interpreter_s", "import_s", "first_sample_s", "total_s")
+
+
+def _child(launched, num_di245, num_di1100, sink_backend):
+    """Runs in a fresh interpreter: import ``log`` and time ``log.main``
+    until the first decoded row reaches a ring. Prints the result as JSON
+    on the last line of stdout."""
+    started = time.time()
+    import log
+    imported = time.time()
+
+    from dataq_utils.simulator import DI245Simulator, DI1100Simulator, injected_ports
+    from dataq_utils.sinks import make_sinks
+
+    # Nothing leaves the host and no ports are bound, so a logger already
+    # running here is undisturbed; the servers start in the background anyway
+    client, log.alerts = make_sinks(sink_backend, root=log.SINK_DIR)
+    log.uploader.client = log.pyramid.client = log.archiver.client = client
+    log.METRICS_PORT = log.LIVE_PORT = log.QUERY_PORT = None
+
+    sims = [DI245Simulator(seed=i) for i in range(num_di245)]
+    sims += [DI1100Simulator(seed=i) for i in range(num_di1100)]
+    for sim in sims:
+        sim.start()
+    with injected_ports(sims):
+        main_started = time.time()
+        thread = threading.Thread(target=log.main, name="log-main")
+        thread.start()
+        first = None
+        while time.time() - main_started < FIRST_SAMPLE_TIMEOUT:
+            if any(ring.pushed_rows for ring in log.pipeline.rings):
+                first = time.time()
+                break
+            time.sleep(0.001)
+        log.stop_event.set()
+        thread.join()
+        stopped = time.time()
+    for sim in sims:
+        sim.close()
+    print(
+        json.dumps(
+            {
+                "interpreter_s": started - launched,
+                "import_s": imported - started,
+                "main_to_sample_s": None if first is None else first - main_started,
+                "first_sample_s": None if first is None else first - launched,
+                "shutdown_s": stopped - (first or stopped),
+            }
+        )
+    )
+
+
+def _parse_importtime(stderr):
+    """(module, cumulative seconds) of the slowest top-level imports."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Two spaces of indentation per nesting level; keep direct imports
+        if len(name) - len(name.lstrip()) <= 3:
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: -item[1])[:TOP_IMPORTS]
+
+
+def measure_startup(num_di245=1, num_di1100=1, sink_backend="memory"):
+    """Start ``log.py`` in a fresh interpreter and time how long it takes to
+    get to the first decoded sample from simulated devices.
+
+    The run happens in a temporary directory, so ``LOG_DIR`` and the
+    outbox start empty as on a new host. Returns the interpreter startup,
+    ``import log`` and launch-to-first-sample times in seconds, plus the
+    slowest imports from ``python -X importtime``.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (ROOT, env.get("PYTHONPATH")) if p
+    )
+    with tempfile.TemporaryDirectory() as cwd:
+        launched = time.time()
+        proc = subprocess.run(
+            [
+                sys.executable, "-X", "importtime", "-m", "dataq_utils.startup",
+                "--child", str(launched), str(num_di245), str(num_di1100),
+                sink_backend,
+            ],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        total = time.time() - launched
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["total_s"] = total
+    # The child's own imports (before log) are charged to the interpreter
+    result["imports"] = _parse_importtime(proc.stderr)
+    return result
+
+
+def run_benchmark(repeats=5, **kwargs):
+    """Median of ``repeats`` startup runs; imports are from the last one."""
+    runs = [measure_startup(**kwargs) for _ in range(repeats)]
+    result = {}
+    for key in ("interpreter_s", "import_s", "main_to_sample_s", "first_sample_s",
+                "shutdown_s", "total_s"):
+        values = sorted(r[key] for r in runs if r[key] is not None)
+        result[key] = values[len(values) // 2] if values else None
+    result["repeats"] = repeats
+    result["failed"] = sum(r["first_sample_s"] is None for r in runs)
+    result["imports"] = runs[-1]["imports"]
+    return result
+
+
+def compare(result, baseline):
+    """Lines describing each ``COMPARED`` metric relative to ``baseline``."""
+    lines = []
+    for metric in COMPARED:
+        new, old = result[metric], baseline.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else float("nan")
+        verdict = "better" if new <= old else "worse"
+        lines.append(f"{metric:<24}{old:>10.3f}{new:>10.3f}{change:>+9.1f}%  {verdict}")
+    return lines
+
+
+def print_result(result):
+    def seconds(key):
+        return "never" if result[key] is None else f"{result[key] * 1e3:.0f} ms"
+
+    print(f"interpreter     {seconds('interpreter_s')}")
+    print(f"import log      {seconds('import_s')}")
+    print(f"main -> sample  {seconds('main_to_sample_s')}")
+    print(f"first sample    {seconds('first_sample_s')} after launch")
+    print(f"shutdown        {seconds('shutdown_s')}")
+    if result["failed"]:
+        print(f"{result['failed']}/{result['repeats']} runs never sampled")
+    print("\nslowest imports (cumulative):")
+    for name, duration in result["imports"]:
+        print(f"  {name:<32}{duration * 1e3:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        launched, num_di245, num_di1100, sink_backend = sys.argv[2:6]
+        _child(float(launched), int(num_di245), int(num_di1100), sink_backend)
+        sys.exit()
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Import and first-sample latency of log.py on simulated "
+        "devices, each run in a fresh interpreter."
+    )
+    parser.add_argument("--di245", type=int, default=1)
+    parser.add_argument("--di1100", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--sink", choices=("memory", "local"), default="memory",
+        help="Sink backend for the run; log.py's own is only imported",
+    )
+    parser.add_argument("--save", metavar="FILE", help="Write the result as JSON")
+    parser.add_argument(
+        "--baseline", metavar="FILE", help="Compare with a saved result"
+    )
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        args.repeats, num_di245=args.di245, num_di1100=args.di1100,
+        sink_backend=args.sink,
+    )
+    print_result(result)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print()
+            print("\n".join(compare(result, json.load(f))))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=1)
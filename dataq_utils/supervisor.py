@@ -0,0 +1,293 @@
+import json
+import os
+import threading
+import time
+
+from serial.tools import list_ports
+
+RESCAN_INTERVAL = 2.0  # Seconds between port rescans (udev events wake it sooner)
+BACKOFF_MIN = 1.0  # First restart delay after a handler exits
+BACKOFF_MAX = 60.0  # Restart delays double up to this
+STABLE_AFTER = 30.0  # A session this long resets the backoff
+RATE_WINDOW = 10.0  # Seconds the bytes/s figure is averaged over
+
+
+def discover(device_types):
+    """Return {registry key: (dev_type, port)} for the loggers present now.
+
+    ``device_types`` maps a type name to a tuple starting ``(vid, pid)``.
+    Loggers come out in the order their types are listed, each type sorted
+    by key, and new ones get their registry ids in that order: with the
+    DI-1100 listed first it is Device 0 and the DI-245s follow, as the ids
+    in ``nameMapping`` expect, whatever order the OS lists ports in.
+    """
+    found = {dev_type: [] for dev_type in device_types}
+    for port in list_ports.comports():
+        for dev_type, (vid, pid, *_) in device_types.items():
+            if port.vid == vid and port.pid == pid:
+                found[dev_type].append((port.serial_number or port.device, port.device))
+    present = {}
+    for dev_type, ports in found.items():
+        for key, device in sorted(ports):
+            present[key] = (dev_type, device)
+    return present
+
+
+class DeviceRegistry:
+    """Persistent ``serial number -> device_id`` map.
+
+    A logger keeps its id (and so its ``nameMapping`` key) across unplugs,
+    port renames and restarts of the process. Ports without a serial
+    number fall back to their device path. ``seed`` pins ids for known
+    serial numbers, overriding whatever the file saved for them.
+    """
+
+    def __init__(self, path, seed=None):
+        self.path = path
+        self.ids = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.ids = json.load(f)
+        if seed:
+            pinned = set(seed.values())
+            self.ids = {k: i for k, i in self.ids.items() if i not in pinned}
+            self.ids.update(seed)
+
+    def device_id(self, key):
+        if key not in self.ids:
+            taken = set(self.ids.values())
+            self.ids[key] = next(i for i in range(len(taken) + 1) if i not in taken)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self.ids, f, indent=1)
+                os.replace(tmp, self.path)
+        return self.ids[key]
+
+
+class DeviceHealth:
+    """Byte and session counters for one device.
+
+    It has the ``start_session``/``write`` interface of a capture ring, so
+    the read loops feed it through their existing ``capture`` argument; a
+    real ``CaptureRing`` can sit behind it.
+    """
+
+    def __init__(self, capture=None):
+        self.capture = capture
+        self.bytes = 0
+        self.sessions = 0
+        self.last_data = None
+        self.samples = [(time.monotonic(), 0)]
+
+    def start_session(self):
+        self.sessions += 1
+        if self.capture is not None:
+            self.capture.start_session()
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.last_data = time.monotonic()
+        if self.capture is not None:
+            self.capture.write(data)
+
+    def bytes_per_s(self):
+        """Average over the last ``RATE_WINDOW`` seconds of calls to this."""
+        now = time.monotonic()
+        self.samples.append((now, self.bytes))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+            self.samples.pop(0)
+        (t0, b0), (t1, b1) = self.samples[0], self.samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+
+class SupervisedDevice:
+    """One physical logger: its ring, handler thread and health counters."""
+
+    def __init__(self, key, dev_type, device_id, ring, health):
+        self.key = key
+        self.dev_type = dev_type
+        self.device_id = device_id
+        self.ring = ring
+        self.health = health
+        self.port = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.starts = 0
+        self.backoff = BACKOFF_MIN
+        self.next_start = 0.0
+        self.started_at = None
+        self.uptime = 0.0
+        self.last_error = None
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats(self):
+        session = time.monotonic() - self.started_at if self.running() else 0.0
+        return {
+            "device_id": self.device_id,
+            "type": self.dev_type,
+            "serial": self.key,
+            "port": self.port,
+            "connected": self.running(),
+            "reconnects": max(self.starts - 1, 0),
+            "uptime_s": session,
+            "total_uptime_s": self.uptime + session,
+            "bytes_per_s": self.health.bytes_per_s(),
+            "last_error": self.last_error,
+        }
+
+
+class DeviceSupervisor(threading.Thread):
+    """Keep a handler thread running for every DATAQ logger that is plugged in.
+
+    ``device_types`` maps a type name to ``(vid, pid, manage_func,
+    channel_config)``. Ports are rescanned every ``RESCAN_INTERVAL`` (or on
+    a udev event when pyudev is available). A new logger gets an id from
+    the registry and a ring from ``setup(dev_type, device_id, port,
+    channel_config)``, which returns ``(ring, capture)``; its
+    ``manage_func`` then runs in its own thread. When a handler exits
+    (unplugged, read error) it is restarted with exponential backoff once
+    its port shows up again. Rings are kept across reconnects, so consumers
+    see one continuous device. With ``processes`` each handler instead runs
+    in a child process (``multiproc.DeviceProcess``) that sends its rows
+    back through shared memory.
+    """
+
+    def __init__(self, device_types, setup, stop_event, registry=None,
+                 rescan_interval=RESCAN_INTERVAL, processes=False):
+        super().__init__(name="device-supervisor", daemon=True)
+        self.device_types = device_types
+        self.setup = setup
+        self.stop_event = stop_event
+        self.registry = registry or DeviceRegistry(None)
+        self.rescan_interval = rescan_interval
+        self.processes = processes
+        self.devices = {}  # registry key -> SupervisedDevice
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    def scan(self):
+        """Return {registry key: (dev_type, port)} for the loggers present now."""
+        return discover(self.device_types)
+
+    def _run_handler(self, device, manage_func, channel_config):
+        try:
+            manage_func(
+                device.port,
+                device.device_id,
+                channel_config,
+                device.ring.producer(device.ring.clock),
+                device.stop_event,
+                device.health,
+            )
+        except Exception as e:
+            device.last_error = f"{type(e).__name__}: {e}"
+            print(f"Device {device.device_id} on {device.port} failed: {e}")
+
+    def _start(self, device, port):
+        _, _, manage_func, channel_config = self.device_types[device.dev_type]
+        device.port = port
+        if device.ring.clock is not None:
+            device.ring.clock.reset()
+        if self.processes:
+            from dataq_utils.multiproc import DeviceProcess
+
+            device.thread = DeviceProcess(
+                device.dev_type, port, device.device_id, channel_config,
+                device.ring, device.health,
+            )
+            device.stop_event = device.thread.stop_event
+        else:
+            device.stop_event = threading.Event()
+            device.thread = threading.Thread(
+                target=self._run_handler,
+                args=(device, manage_func, channel_config),
+                name=f"device-{device.device_id}",
+                daemon=True,
+            )
+        device.starts += 1
+        device.started_at = time.monotonic()
+        if device.starts > 1:
+            print(
+                f"Reconnecting {device.ring.device_type} {device.key} as Device "
+                f"{device.device_id} on {port} (attempt {device.starts - 1})"
+            )
+        device.thread.start()
+
+    def _reap(self, device):
+        """Account for a handler that exited and schedule its restart."""
+        now = time.monotonic()
+        session = now - device.started_at
+        device.uptime += session
+        if session >= STABLE_AFTER:
+            device.backoff = BACKOFF_MIN
+        device.next_start = now + device.backoff
+        device.backoff = min(device.backoff * 2, BACKOFF_MAX)
+        if getattr(device.thread, "error", None):
+            device.last_error = device.thread.error  # A crashed device process
+        device.thread = None
+
+    def poll(self):
+        """One supervision pass: reap dead handlers and (re)start present ones."""
+        present = self.scan()
+        now = time.monotonic()
+        with self.lock:
+            for key, device in self.devices.items():
+                if device.thread is not None and not device.thread.is_alive():
+                    self._reap(device)
+                elif device.running() and key not in present:
+                    device.stop_event.set()  # Gone from the bus; let it wind down
+            for key, (dev_type, port) in present.items():
+                device = self.devices.get(key)
+                if device is None:
+                    device_id = self.registry.device_id(key)
+                    channel_config = self.device_types[dev_type][3]
+                    ring, capture = self.setup(
+                        dev_type, device_id, port, channel_config
+                    )
+                    device = SupervisedDevice(
+                        key, dev_type, device_id, ring, DeviceHealth(capture)
+                    )
+                    self.devices[key] = device
+                    print(f"{ring.device_type} {key} on {port} is Device {device_id}")
+                if device.thread is None and now >= device.next_start:
+                    self._start(device, port)
+
+    def _watch_udev(self):
+        """Wake the supervisor on tty add/remove events, if pyudev is present."""
+        try:
+            import pyudev
+        except ImportError:
+            return
+        context = pyudev.Context()
+        monitor = pyudev.Monitor.from_netlink(context)
+        monitor.filter_by(subsystem="tty")
+        observer = pyudev.MonitorObserver(
+            monitor, callback=lambda device: self.wakeup.set(), name="udev-monitor"
+        )
+        observer.daemon = True
+        observer.start()
+
+    def run(self):
+        self._watch_udev()
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Device supervisor failed: {e}")
+            self.wakeup.wait(self.rescan_interval)
+            self.wakeup.clear()
+        with self.lock:
+            devices = list(self.devices.values())
+        for device in devices:
+            device.stop_event.set()
+        for device in devices:
+            if device.thread is not None:
+                device.thread.join()
+
+    def stats(self):
+        with self.lock:
+            return [device.stats() for device in self.devices.values()]
@@ -0,0 +1,195 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# One offset from the monotonic clock to wall time for the whole process, so
+# every device is stamped on the same timeline even if NTP steps the wall clock
+WALL_OFFSET = (time.time_ns() - time.monotonic_ns()) / 1e9
+WINDOW = 64  # Blocks of arrival history the offset and rate checks use
+MIN_FIT = 8  # Blocks needed before the rate is checked against the configured one
+DRIFT_SPAN = 30.0  # Seconds per point of the long-baseline drift fit
+DRIFT_POINTS = 120  # Points the drift fit keeps (an hour at DRIFT_SPAN)
+MIN_BASELINE = 300.0  # Seconds of history before the drift is fitted at all
+MAX_DRIFT = 500e-6  # Largest believable error of a device crystal, as a fraction
+RATE_TOLERANCE = 0.05  # A configured rate further off than this is replaced
+RESYNC = 1.0  # Seconds of unexplained lateness (lost data) before re-anchoring
+
+
+def now():
+    """Wall-clock seconds derived from the monotonic clock."""
+    return time.monotonic_ns() / 1e9 + WALL_OFFSET
+
+
+class ScanClock:
+    """Timestamp decoded rows from the device's sample clock.
+
+    Row ``k`` of a stream is stamped ``offset + k * period`` instead of with
+    the time its block happened to be read, so USB batching, GIL stalls and
+    lock contention no longer show up as jitter. ``offset`` is the lower
+    envelope of ``arrival - k * period`` over the last ``WINDOW`` blocks: a
+    row can arrive late but never before it was sampled.
+
+    ``period`` starts from the configured rate and follows the crystal's
+    drift. Over a few blocks arrival jitter swamps a drift of some ppm, so
+    the drift is fitted to the least-late block of every ``DRIFT_SPAN``
+    seconds, over up to ``DRIFT_POINTS`` of them, once they cover
+    ``MIN_BASELINE``; only a fit beyond ``MAX_DRIFT`` is clamped. If the
+    configured rate turns out to be wrong by more than ``RATE_TOLERANCE``,
+    the fit over a full window replaces it. A gap longer than ``RESYNC``
+    (a restart or dropped data) starts a new anchor, keeping the fitted
+    period. Stamps never go backwards.
+    """
+
+    def __init__(self, rate, window=WINDOW):
+        self.nominal = 1.0 / rate
+        self.period = self.nominal
+        self.fitted = self.nominal  # Period from the drift fit
+        self.history = deque(maxlen=window)  # (index of a block's last row, arrival)
+        self.envelope = deque(maxlen=DRIFT_POINTS)  # Least-late (index, arrival)
+        self.span_start = None
+        self.count = 0
+        self.offset = None
+        self.last = -np.inf
+        self.resyncs = 0
+        self.recalibrated = False
+
+    def reset(self):
+        """Start a new anchor, keeping the learned period."""
+        self.history.clear()
+        self.envelope.clear()
+        self.span_start = None
+        self.count = 0
+        self.offset = None
+
+    def _track_envelope(self, end, arrival):
+        """Keep the least-late block of each span; True when a span starts."""
+        if self.span_start is None or arrival - self.span_start >= DRIFT_SPAN:
+            self.envelope.append((end, arrival))
+            self.span_start = arrival
+            return True
+        k, t = self.envelope[-1]
+        if arrival - end * self.nominal < t - k * self.nominal:
+            self.envelope[-1] = (end, arrival)
+        return False
+
+    def _fit_drift(self):
+        if len(self.envelope) < 3:
+            return
+        (k0, t0), (k1, t1) = self.envelope[0], self.envelope[-1]
+        if t1 - t0 < MIN_BASELINE or k1 <= k0:
+            return
+        k = np.array([e[0] for e in self.envelope], dtype=np.float64)
+        t = np.array([e[1] for e in self.envelope])
+        slope = np.polyfit(k - k0, t - t0, 1)[0]
+        low, high = self.nominal * (1 - MAX_DRIFT), self.nominal * (1 + MAX_DRIFT)
+        self.fitted = float(np.clip(slope, low, high))
+
+    def _fit(self):
+        k = np.array([h[0] for h in self.history], dtype=np.float64)
+        t = np.array([h[1] for h in self.history])
+        self.period = self.fitted
+        if len(k) >= MIN_FIT and k[-1] > k[0] and not self.recalibrated:
+            slope = np.polyfit(k - k[0], t - t[0], 1)[0]
+            if abs(slope / self.nominal - 1) > RATE_TOLERANCE:
+                if len(k) < self.history.maxlen:
+                    self.period = float(slope)  # Follow the fit until it settles
+                else:
+                    print(
+                        f"Device rate is {1 / slope:.3f}/s, not the configured "
+                        f"{1 / self.nominal:.3f}/s; using the measured rate"
+                    )
+                    self.nominal = self.period = self.fitted = float(slope)
+                    self.recalibrated = True
+                    self.envelope.clear()
+                    self.span_start = None
+        self.offset = float(np.min(t - k * self.period))
+
+    def stamp(self, n, arrival=None):
+        """Timestamps for the next ``n`` rows, the newest of which arrived at
+        ``arrival`` (default: now)."""
+        if n == 0:
+            return np.empty(0)
+        arrival = now() if arrival is None else arrival
+        end = self.count + n - 1
+        if (
+            self.offset is not None
+            and arrival - (self.offset + end * self.period) > RESYNC
+        ):
+            self.resyncs += 1
+            self.reset()
+            end = n - 1
+        self.history.append((end, arrival))
+        if self._track_envelope(end, arrival):
+            self._fit_drift()  # The span just closed is complete
+        self._fit()
+        t = self.offset + (self.count + np.arange(n)) * self.period
+        t = np.maximum(t, self.last)
+        self.last = t[-1]
+        self.count += n
+        return t
+
+    def stats(self):
+        return {
+            "rate": 1.0 / self.period,
+            "drift_ppm": (self.nominal / self.fitted - 1) * 1e6,
+            "rows": self.count,
+            "resyncs": self.resyncs,
+        }
+
+
+def align(series, interval=None, method="linear", tolerance=None, start=None,
+          end=None):
+    """Resample per-device series onto one shared time grid.
+
+    ``series`` maps a key to ``{"channels", "timestamp_ns", "values"}`` like
+    ``chunk_reader.read_chunk`` returns. The grid runs every ``interval``
+    seconds (default: the coarsest device's median spacing) over the span
+    all devices cover, or ``start``/``end`` (epoch ns) when given.
+    ``method`` is ``"linear"`` interpolation or ``"nearest"`` sample; grid
+    points further than ``tolerance`` seconds (default: 1.5 sample periods
+    of that device) from any sample are NaN rather than extrapolated.
+    Returns ``{"timestamp_ns", "columns", "values"}`` with one column per
+    ``(key, channel)``.
+    """
+    if method not in ("linear", "nearest"):
+        raise ValueError(f"unknown alignment method {method!r}")
+    series = {key: s for key, s in series.items() if len(s["timestamp_ns"]) > 1}
+    if not series:
+        return {"timestamp_ns": np.empty(0, np.int64), "columns": [], "values": None}
+
+    spacing = {
+        key: float(np.median(np.diff(s["timestamp_ns"]))) for key, s in series.items()
+    }
+    step = interval * 1e9 if interval else max(spacing.values())
+    if start is None:
+        start = max(s["timestamp_ns"][0] for s in series.values())
+    if end is None:
+        end = min(s["timestamp_ns"][-1] for s in series.values())
+    grid = np.arange(start, end + 1, step).astype(np.int64)
+
+    columns, blocks = [], []
+    for key, s in series.items():
+        t = np.asarray(s["timestamp_ns"], dtype=np.int64)
+        values = np.asarray(s["values"], dtype=np.float64).reshape(len(t), -1)
+        limit = tolerance * 1e9 if tolerance is not None else 1.5 * spacing[key]
+
+        right = np.clip(np.searchsorted(t, grid), 1, len(t) - 1)
+        left = right - 1
+        dt_left = (grid - t[left]).astype(np.float64)
+        dt_right = (t[right] - grid).astype(np.float64)
+        if method == "nearest":
+            pick = np.where(dt_right < dt_left, right, left)
+            out = values[pick]
+            far = np.abs(grid - t[pick]) > limit
+        else:
+            span = np.maximum((t[right] - t[left]).astype(np.float64), 1.0)
+            w = np.clip(dt_left / span, 0.0, 1.0)[:, None]
+            out = values[left] * (1 - w) + values[right] * w
+            gap = np.minimum(np.abs(dt_left), np.abs(dt_right))
+            far = (grid < t[0]) | (grid > t[-1]) | (gap > limit)
+        out[far] = np.nan
+        blocks.append(out)
+        columns += [(key, channel) for channel in s["channels"]]
+
+    return {"timestamp_ns": grid, "columns": columns, "values": np.hstack(blocks)}
@@ -0,0 +1,231 @@
+import gzip
+import io
+import json
+import os
+import shutil
+
+SEGMENT_PREFIX = "segments/"
+CONTENT_TYPES = {".csv": "text/csv", ".h5": "application/x-hdf5"}
+
+
+class ChunkUploader:
+    """Ship chunk files to S3 incrementally as gzip-compressed append segments.
+
+    Each call to ``upload_new_data`` uploads only the bytes appended since the
+    last successful upload, as ``<prefix>segments/<chunk>/<seq>.gz``, and
+    rewrites the chunk's ``manifest.json`` next to them. ``close_chunk``
+    compacts the chunk into one gzip object at ``<prefix><chunk>`` and
+    deletes its segments. Objects are stored with ``Content-Encoding: gzip``
+    so browsers read them back as plain CSV.
+
+    Formats that rewrite earlier bytes (``append_only=False``, e.g. HDF5)
+    skip segmenting: ``snapshot`` copies the open chunk while its writer is
+    held, and each upload ships that copy whole to ``<prefix><chunk>``. It
+    is only marked ``compacted`` by ``close_chunk``, once the file is final.
+    The manifest is mirrored under ``state_dir`` so offsets survive a restart.
+    """
+
+    def __init__(
+        self, client, bucket, prefix="data/", state_dir=None, append_only=True
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.state_dir = state_dir
+        self.append_only = append_only
+        self.manifests = {}
+
+    def _state_path(self, chunk):
+        if self.state_dir is None:
+            return None
+        return os.path.join(self.state_dir, chunk + ".json")
+
+    def manifest(self, chunk):
+        """Return the manifest for ``chunk``, loading it from local state if needed."""
+        if chunk not in self.manifests:
+            manifest = {
+                "chunk": chunk,
+                "uploaded_bytes": 0,
+                "segments": [],
+                "compacted": None,
+            }
+            path = self._state_path(chunk)
+            if path and os.path.exists(path):
+                with open(path) as f:
+                    manifest = json.load(f)
+            self.manifests[chunk] = manifest
+        return self.manifests[chunk]
+
+    def _snapshot_path(self, file_name):
+        base = self.state_dir or os.path.dirname(file_name)
+        return os.path.join(base, "." + os.path.basename(file_name) + ".snapshot")
+
+    def snapshot(self, file_name):
+        """Copy a chunk that is rewritten in place for the next upload.
+
+        Call it with the writer flushed and held, so the copy is consistent;
+        the upload then reads the copy rather than the live file.
+        """
+        path = self._snapshot_path(file_name)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        shutil.copyfile(file_name, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _save_manifest(self, chunk):
+        manifest = self.manifests[chunk]
+        body = json.dumps(manifest, indent=1).encode()
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{SEGMENT_PREFIX}{chunk}/manifest.json",
+            Body=body,
+            ContentType="application/json",
+        )
+        path = self._state_path(chunk)
+        if path:
+            os.makedirs(self.state_dir, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(body)
+            os.replace(path + ".tmp", path)
+
+    def _put_gzip(self, key, data, chunk):
+        content_type = CONTENT_TYPES.get(
+            os.path.splitext(chunk)[1], "application/octet-stream"
+        )
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=gzip.compress(data),
+            ContentEncoding="gzip",
+            ContentType=content_type,
+        )
+
+    def upload_new_data(self, file_name, end=None):
+        """Upload whatever was appended to ``file_name`` since the last upload.
+
+        ``end`` caps the read at a byte offset known to hold only complete
+        records, e.g. the file size right after the writer flushed. Returns
+        the number of uncompressed bytes shipped. Raises on failure, leaving
+        the manifest untouched so the same bytes are retried.
+        """
+        chunk = os.path.basename(file_name)
+        manifest = self.manifest(chunk)
+        if not self.append_only:
+            return self._upload_snapshot(file_name)
+
+        offset = manifest["uploaded_bytes"]
+        with open(file_name, "rb") as f:
+            f.seek(offset)
+            data = f.read(-1 if end is None else max(end - offset, 0))
+        if not data:
+            return 0
+
+        seq = len(manifest["segments"])
+        key = f"{self.prefix}{SEGMENT_PREFIX}{chunk}/{seq:05d}.gz"
+        self._put_gzip(key, data, chunk)
+        manifest["segments"].append(
+            {"key": key, "offset": offset, "length": len(data)}
+        )
+        manifest["uploaded_bytes"] = offset + len(data)
+        self._save_manifest(chunk)
+        return len(data)
+
+    def _upload_snapshot(self, file_name):
+        chunk = os.path.basename(file_name)
+        manifest = self.manifest(chunk)
+        try:
+            with open(self._snapshot_path(file_name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0  # Already compacted, or no snapshot taken yet
+        self._put_gzip(f"{self.prefix}{chunk}", data, chunk)
+        manifest["uploaded_bytes"] = len(data)
+        self._save_manifest(chunk)
+        return len(data)
+
+    def compact(self, file_name):
+        """Upload ``file_name`` as one gzip object and retire its segments."""
+        chunk = os.path.basename(file_name)
+        manifest = self.manifest(chunk)
+        with open(file_name, "rb") as f:
+            data = f.read()
+
+        key = f"{self.prefix}{chunk}"
+        self._put_gzip(key, data, chunk)
+        manifest["compacted"] = {"key": key, "length": len(data)}
+        manifest["uploaded_bytes"] = len(data)
+        for segment in manifest["segments"]:
+            self.client.delete_object(Bucket=self.bucket, Key=segment["key"])
+        manifest["segments"] = []
+        self._save_manifest(chunk)
+        return len(data)
+
+    def close_chunk(self, file_name):
+        """Final upload for a chunk that has rotated out."""
+        sent = self.compact(file_name)
+        snapshot = self._snapshot_path(file_name)
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+        return sent
+
+
+class LocalS3Client:
+    """Filesystem-backed stand-in for the subset of the boto3 S3 client used here.
+
+    Objects live at ``<root>/<bucket>/<key>``; metadata such as
+    ``ContentEncoding`` is kept in a ``.meta.json`` sidecar.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def put_object(self, Bucket, Key, Body, **metadata):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body if isinstance(Body, bytes) else Body.read())
+        with open(path + ".meta.json", "w") as f:
+            json.dump(metadata, f)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(Filename, path)
+        with open(path + ".meta.json", "w") as f:
+            json.dump(ExtraArgs or {}, f)
+
+    def get_object(self, Bucket, Key, Range=None):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise KeyError(f"NoSuchKey: {Bucket}/{Key}")
+        with open(path + ".meta.json") as f:
+            metadata = json.load(f)
+        with open(path, "rb") as f:
+            if Range is None:
+                return {"Body": io.BytesIO(f.read()), **metadata}
+            first, last = Range.removeprefix("bytes=").split("-")
+            f.seek(int(first))
+            body = f.read(int(last) - int(first) + 1)
+            return {"Body": io.BytesIO(body), **metadata}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        for p in (path, path + ".meta.json"):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def list_objects_v2(self, Bucket, Prefix=""):
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                if name.endswith(".meta.json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    keys.append({"Key": key, "Size": os.path.getsize(path)})
+        keys.sort(key=lambda k: k["Key"])
+        return {"Contents": keys, "KeyCount": len(keys)}
@@ -1,45 +1,163 @@
-from dataq_utils.di245 import manage_di245_device, find_di245_ports
-from dataq_utils.di1100 import manage_di1100_device, find_di1100_ports
+from dataq_utils.di245 import manage_di245_device
+from dataq_utils.di245 import make_clock as make_di245_clock
+from dataq_utils.di245 import DEVICE_TYPE as DI245_TYPE
+from dataq_utils.di245 import PID as DI245_PID, VID as DI245_VID
+from dataq_utils.di1100 import manage_di1100_device
+from dataq_utils.di1100 import make_clock as make_di1100_clock
+from dataq_utils.di1100 import DEVICE_TYPE as DI1100_TYPE
+from dataq_utils.di1100 import PID as DI1100_PID, VID as DI1100_VID
+from dataq_utils.conversion import ChannelConversion, compile_transform
+from dataq_utils.pipeline import AcquisitionPipeline
+from dataq_utils.chunk_writer import WRITERS, make_chunk_writer, to_epoch_ns
+from dataq_utils.rollup import IntervalAggregator, stack_rollups
+from dataq_utils.uploader import ChunkUploader
+from dataq_utils.pyramid import PyramidBuilder
+from dataq_utils.outbox import Outbox, OutboxWorker
+from dataq_utils.alarms import AlarmEngine, AlarmRule
+from dataq_utils.aio_engine import AsyncEngine
+from dataq_utils.query_server import ChunkStore, QueryServer
+from dataq_utils.live import LiveBroadcaster, LiveServer
+from dataq_utils.capture import CAPTURE_BYTES, open_capture
+from dataq_utils.supervisor import DeviceRegistry, DeviceSupervisor, discover
+from dataq_utils.metrics import MetricsServer, TimedLock, counter, summary
+from dataq_utils.archive import Archiver
+from dataq_utils.compression import BlockCompressor
+from dataq_utils.names import nameMapping
+from dataq_utils.sinks import make_sinks
 from datetime import datetime, timedelta
-import csv
+import asyncio
 import os
 import threading
 import time
 
-import boto3
-
 TC_TYPE = "K"  # Thermocouple type for DI-245
 LOG_DIR = "data"
 TIME_PER_LOG = timedelta(minutes=1)
 TIME_PER_UPLOAD = timedelta(minutes=5)
 CHUNK_DURATION = timedelta(hours=6)
+CHUNK_FORMAT = "csv"  # One of chunk_writer.WRITERS: csv, hdf5, msgpack
+ARCHIVE_PERIOD = "daily"  # Closed chunks are archived "daily" or "weekly"
+ARCHIVE_INTERVAL = timedelta(hours=1)  # How often to look for periods to archive
+FLUSH_INTERVAL = 5.0  # Seconds between chunk writer flushes
+FSYNC = False  # fsync the chunk file on every flush
+RAW_STREAM = False  # Also keep every decoded scan in raw_<chunk> files
+# Error bound of the raw stream per channel, in logged units; keys like
+# nameMapping ("DI-245 - 1 - 0") override the per-type default. Only the
+# points needed to rebuild each channel within it are written (see
+# compression.reconstruct). None writes every scan.
+RAW_TOLERANCES = {"DI-245": 0.1, "DI-1100": 0.01}
+SAMPLE_CLOCK_TIMESTAMPS = True  # Stamp rows from the scan rate, not the read time
+CAPTURE_DIR = None  # e.g. os.path.join(LOG_DIR, "capture") to keep every raw read
 VERBOSE = False
+ENGINE = "threads"  # "threads": one OS thread per device, "asyncio": one event loop
+# or "processes": one child process per device, rows returned through shared memory
+# Serial number -> device_id, so nameMapping keys survive replugs and restarts
+DEVICE_REGISTRY = os.path.join(LOG_DIR, ".devices.json")
+# Serial number -> device_id pinned regardless of the registry, e.g. {"5F1A2B3C": 1};
+# other new loggers are numbered DI-1100s first, then DI-245s, by serial number
+DEVICE_IDS = {}
 BUCKET_NAME = "aqp-readout-data"
 REGION_NAME = "us-west-1"
+SNS_TOPIC_ARN = "arn:aws:sns:us-west-1:730335412791:BakeoutAlarm"
+# Where uploads and alerts go: "aws" (S3 and SNS, clients created on first
+# use), "local" (files under SINK_DIR, for air-gapped hosts) or "memory"
+SINK_BACKEND = "aws"
+SINK_DIR = os.path.join(LOG_DIR, ".sinks")
+OUTBOX_PATH = os.path.join(LOG_DIR, ".outbox.sqlite3")
+OUTBOX_CONCURRENCY = 4  # Uploads/alerts in flight at once
+QUERY_PORT = 8765  # Local /series range-query service; None disables it
+LIVE_PORT = 8766  # Server-Sent Events /live stream; None disables it
+LIVE_RATE = 2.0  # Coalesced live updates per second
+METRICS_PORT = 9108  # Prometheus /metrics and /debug/profile; None disables it
+METRICS_SUMMARY = True  # Print p50/p99 of the hot-path histograms every TIME_PER_LOG
+
+# Per-channel calibration for DI-1100 analog inputs; only channels listed
+# here are logged.
+DI1100_CONVERSIONS = {
+    0: ChannelConversion(unit="pressure_mbar"),
+}
+# Per-channel calibration of DI-245 temperatures, e.g. a thermocouple that
+# reads 1.5 °C high: {2: ChannelConversion(unit="celsius", offset=-1.5)}.
+# Every channel is logged; unlisted channels pass through unchanged.
+DI245_CONVERSIONS = {}
 
 #####################
 # ALARM QUANTITIES
 MAX_THRESHOLD = 100
 MIN_THRESHOLD = 65
+ALARM_HYSTERESIS = 2  # °C back inside a limit before an alarm clears
+ALARM_MIN_DURATION = 30  # Seconds a limit must be exceeded before it alarms
+ALARM_WINDOW = 60  # Seconds of alarm changes merged into one SNS message
 #####################
 
 stop_event = threading.Event()
-print_lock = threading.Lock()
-
-last_log_time = []
-last_upload_time = datetime.now()
-current_device_index = 0
+# Guards chunk rotation between consumer workers; wait/hold times are recorded
+file_lock = TimedLock("file_lock")
+pipeline = AcquisitionPipeline(stop_event)
+chunk_writer = make_chunk_writer(
+    CHUNK_FORMAT, flush_interval=FLUSH_INTERVAL, fsync=FSYNC
+)
+raw_writer = (
+    make_chunk_writer(CHUNK_FORMAT, flush_interval=FLUSH_INTERVAL, fsync=FSYNC)
+    if RAW_STREAM
+    else None
+)
+aggregators = {}  # device_id -> (IntervalAggregator, device_type, channels)
+compressors = {}  # device_id -> (BlockCompressor, device_type, channels)
+
+last_dropped_rows = {}
+last_reconnects = {}
 current_log_file = None
 current_chunk_start_time = None
 
+DEVICE_TYPES = {"di245": DI245_TYPE, "di1100": DI1100_TYPE}  # Type key -> display name
 verboseprint = print if VERBOSE else lambda *a, **k: None
+di245_transforms = {}  # Channel count -> compiled DI245_CONVERSIONS
+di1100_transforms = {}
+
+s3_client, alerts = make_sinks(
+    SINK_BACKEND, root=SINK_DIR, region_name=REGION_NAME, topic_arn=SNS_TOPIC_ARN
+)
+uploader = ChunkUploader(
+    s3_client,
+    BUCKET_NAME,
+    prefix="data/",
+    state_dir=os.path.join(LOG_DIR, ".uploads"),
+    append_only=WRITERS[CHUNK_FORMAT].append_only,
+)
+# Downsampled tiers of every closed chunk for the dashboard
+pyramid = PyramidBuilder(
+    s3_client,
+    BUCKET_NAME,
+    prefix="pyramid/",
+    state_dir=os.path.join(LOG_DIR, ".pyramid"),
+)
+# Compressed columnar archives of closed chunks; also bounds local disk use
+archiver = Archiver(
+    LOG_DIR,
+    client=s3_client,
+    bucket=BUCKET_NAME,
+    prefix="archive/",
+    period=ARCHIVE_PERIOD,
+    can_delete=lambda name: uploader.manifest(name)["compacted"] is not None
+    and pyramid.has_chunk(name),
+)
+live = LiveBroadcaster()
+device_registry = DeviceRegistry(DEVICE_REGISTRY, seed=DEVICE_IDS)
+supervisor = None
+
+# Every network call goes through the outbox so an outage only delays it
+outbox = Outbox(OUTBOX_PATH)
 
-s3_client = boto3.client("s3", region_name=REGION_NAME)
-sns_client = boto3.client("sns")
-SNS_TOPIC_ARN = "arn:aws:sns:us-west-1:730335412791:BakeoutAlarm"
 
 def send_sns_alert(subject, message):
-    sns_client.publish(TopicArn=SNS_TOPIC_ARN, Subject=subject, Message=message)
+    """Queue an SNS alert; the outbox worker publishes it with retries."""
+    outbox.enqueue("alert", {"subject": subject, "message": message})
+
+
+def publish_alert(payload):
+    alerts.publish(payload["subject"], payload["message"])
+
 
 def get_current_chunk_start_time():
     """Calculate the start time of the current chunk based on the current time."""
@@ -50,21 +168,82 @@ def get_current_chunk_start_time():
 
 def get_chunk_file_name(start_time):
     """Generate a timestamped filename for a 6-hour chunk."""
-    return f"device_readings_{start_time.strftime('%Y%m%d_%H%M')}.csv"
+    extension = WRITERS[CHUNK_FORMAT].extension
+    return f"device_readings_{start_time.strftime('%Y%m%d_%H%M')}{extension}"
 
 
-def upload_file_to_s3(file_name, bucket_name):
-    global last_upload_time
-    if datetime.now() - last_upload_time > TIME_PER_UPLOAD:
-        last_upload_time = datetime.now()
-        initialize_log_file()
-        tsfn = get_chunk_file_name(current_chunk_start_time)
+def upload_file_to_s3(file_name, end=None):
+    """Queue an upload of the bytes appended to ``file_name`` up to ``end``.
 
-        try:
-            s3_client.upload_file(file_name, bucket_name, "data/" + tsfn)
-            verboseprint(f"File {tsfn} uploaded successfully to {bucket_name}")
-        except Exception as e:
-            print(f"Failed to upload {tsfn} to S3: {e}")
+    Uploads of one chunk share an outbox key, so they run in order and a
+    still-queued upload is simply extended to the new ``end``.
+    """
+    outbox.enqueue(
+        "upload",
+        {"file": file_name, "end": end},
+        key=os.path.basename(file_name),
+        coalesce=True,
+    )
+
+
+def run_upload(payload):
+    sent = uploader.upload_new_data(payload["file"], end=payload["end"])
+    counter("dataq_upload_bytes_total", "Chunk bytes uploaded to S3").inc(sent)
+    verboseprint(f"Uploaded {sent} new bytes of {payload['file']} to {BUCKET_NAME}")
+
+
+def run_compact(payload):
+    uploader.close_chunk(payload["file"])
+    verboseprint(f"File {payload['file']} compacted to {BUCKET_NAME}")
+
+
+def run_pyramid(payload):
+    tiles = pyramid.add_chunk(payload["file"])
+    verboseprint(f"Published {len(tiles)} pyramid tiles for {payload['file']}")
+
+
+def run_archive(payload):
+    archived = archiver.run()
+    verboseprint(f"Archived {archived or 'nothing'} to {BUCKET_NAME}")
+
+
+def enqueue_archive():
+    """Queue a pass of the archiver; queued passes coalesce into one."""
+    outbox.enqueue("archive", {}, key="archive", coalesce=True)
+
+
+def enqueue_closed_chunk(file_name):
+    """Queue the final upload and pyramid build of a chunk that has rotated out.
+
+    Both share the chunk's outbox key, so they run after any pending upload.
+    """
+    key = os.path.basename(file_name)
+    outbox.enqueue("compact", {"file": file_name}, key=key, coalesce=True)
+    outbox.enqueue("pyramid", {"file": file_name}, key=key, coalesce=True)
+
+
+def enqueue_stale_chunks():
+    """Queue compaction for chunks left open by a previous run or an outage."""
+    for name in sorted(os.listdir(LOG_DIR)):
+        path = os.path.join(LOG_DIR, name)
+        if not name.startswith("device_readings_") or path == current_log_file:
+            continue
+        if uploader.manifest(name)["compacted"] is None:
+            enqueue_closed_chunk(path)
+        elif not pyramid.has_chunk(name):
+            outbox.enqueue("pyramid", {"file": path}, key=name, coalesce=True)
+
+
+def upload_current_chunk():
+    """Periodic upload worker: rotate the chunk if due, then upload new data."""
+    with file_lock:
+        initialize_log_file()
+        chunk_writer.flush()
+        file_name = current_log_file
+        end = os.path.getsize(file_name)
+        if not uploader.append_only:
+            uploader.snapshot(file_name)  # Rewritten in place: ship a stable copy
+    upload_file_to_s3(file_name, end=end)
 
 
 def initialize_log_file():
@@ -83,18 +262,13 @@ def initialize_log_file():
 
     # 2. chunk times are misaligned, upload previous chunk file and start new one in 3.
     if new_chunk_start_time != current_chunk_start_time:
+        flush_rollups()  # Open intervals belong to the chunk being closed
+        chunk_writer.close()
+        if raw_writer is not None:
+            flush_compressors()  # Each raw chunk rebuilds on its own
+            raw_writer.close()
         if current_log_file and os.path.exists(current_log_file):
-            try:
-                s3_client.upload_file(
-                    current_log_file,
-                    BUCKET_NAME,
-                    os.path.basename(current_log_file),
-                )
-                verboseprint(
-                    f"File {current_log_file} uploaded successfully to {BUCKET_NAME}"
-                )
-            except Exception as e:
-                print(f"Failed to upload {current_log_file} to S3: {e}")
+            enqueue_closed_chunk(current_log_file)
 
         current_chunk_start_time = new_chunk_start_time
         current_log_file = os.path.join(
@@ -102,145 +276,355 @@ def initialize_log_file():
         )
 
     # 3. set up new chunk file.
-    if not os.path.exists(current_log_file):
-        with open(current_log_file, mode="w", newline="") as _:
-            pass
-
-
-def log_to_file(device_id, device_type, channel, value):
-    """Log readings to a CSV file."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(current_log_file, mode="a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([timestamp, device_type, device_id, channel, value])
-
-
-nameMapping = {
-    "DI-245 - 1 - 0": "Ion Pump 2 Secondary",
-    "DI-245 - 1 - 1": "Ion Pump 1 Flange",
-    "DI-245 - 1 - 2": "Glass Cell 2",
-    "DI-245 - 1 - 3": "Main Body",
-    "DI-245 - 2 - 0": "Ion Pump 1",
-    "DI-245 - 2 - 1": "Ion Pump 2",
-    "DI-245 - 2 - 2": "Glass Cell 1",
-    "DI-245 - 2 - 3": "Titanium Pump",
+    chunk_writer.open(current_log_file)
+    if raw_writer is not None:
+        raw_writer.open(
+            os.path.join(LOG_DIR, "raw_" + os.path.basename(current_log_file))
+        )
+
+
+def log_to_file(
+    device_id, device_type, channels, timestamps, values, extra=None, raw=False
+):
+    """Queue a block of readings for the current chunk file (or the raw stream)."""
+    writer = raw_writer if raw else chunk_writer
+    writer.append(
+        device_type, device_id, channels, to_epoch_ns(timestamps), values, extra
+    )
+
+
+# Per-channel alarm limits, keyed like nameMapping
+ALARM_RULES = {
+    key: AlarmRule(
+        low=MIN_THRESHOLD,
+        high=MAX_THRESHOLD,
+        hysteresis=ALARM_HYSTERESIS,
+        min_duration=ALARM_MIN_DURATION,
+    )
+    for key in nameMapping
 }
+alarm_engine = AlarmEngine(
+    ALARM_RULES, send_sns_alert, names=nameMapping, window=ALARM_WINDOW
+)
+
+
+def log_temperature(timestamps, temperature_block, channel_config, device_id):
+    """Log temperature readings from DI-245.
+
+    ``temperature_block`` is an (n_scans x n_channels) array; every scan is
+    folded into the per-interval rollups after ``DI245_CONVERSIONS``.
+    """
+    num_channels = len(channel_config)
+    if num_channels not in di245_transforms:
+        di245_transforms[num_channels] = compile_transform(
+            DI245_CONVERSIONS, num_channels
+        )
+    temperature_block = di245_transforms[num_channels](temperature_block)
+    if VERBOSE:
+        print(f"\nDevice {device_id} - Temperature Readings:")
+        print(f"{'Channel':<10}{'Type':<10}{'Temperature (°C)':<15}")
+        for i, temp in enumerate(temperature_block[-1]):
+            print(f"{i:<10}{channel_config[i]:<10}{temp:<15.2f}")
+
+    log_block(
+        device_id,
+        "DI-245",
+        list(range(num_channels)),
+        timestamps,
+        temperature_block,
+    )
+
+
+def log_pressure(timestamps, voltage_block, channel_config, device_id):
+    """Log voltage readings from DI-1100.
+
+    ``voltage_block`` is an (n_scans x n_channels) array of decimated voltages;
+    every scan is converted and folded into the per-interval rollups.
+    """
+    channels, values = convert_pressure(voltage_block, channel_config)
+    if VERBOSE:
+        print(f"\nDevice {device_id} - Pressure Readings:")
+        print(f"{'Channel':<10}{'Unit':<15}{'Value':<15}")
+        units = [conv.unit for conv in DI1100_CONVERSIONS.values()]
+        for channel, unit, value in zip(channels, units, values[-1]):
+            print(f"{channel:<10}{unit:<15}{value:<15.4g}")
+
+    log_block(device_id, "DI-1100", channels, timestamps, values)
+
+
+def convert_pressure(voltage_block, channel_config):
+    """Apply DI1100_CONVERSIONS; returns (channels, values) for the logged channels."""
+    num_channels = len(channel_config)
+    if num_channels not in di1100_transforms:
+        di1100_transforms[num_channels] = compile_transform(
+            DI1100_CONVERSIONS, num_channels
+        )
+    values = di1100_transforms[num_channels](voltage_block)
+    logged = list(DI1100_CONVERSIONS)
+    return [channel_config[i] for i in logged], values[:, logged]
+
 
+def log_block(device_id, device_type, channels, timestamps, values):
+    """Fold a block into the device's interval rollups and write any that closed."""
+    if raw_writer is not None:
+        log_raw(device_id, device_type, channels, timestamps, values)
 
-def log_temperature(temperature_buffer, channel_config, device_id):
-    """Log temperature readings from DI-245."""
-    global last_log_time
-    verboseprint(f"\nDevice {device_id} - Temperature Readings:")
-    verboseprint(f"{'Channel':<10}{'Type':<10}{'Temperature (°C)':<15}")
-
-    current_time = datetime.now()
-    if current_time - TIME_PER_LOG > last_log_time[device_id]:
-        last_log_time[device_id] = current_time
-        for i, temp in enumerate(temperature_buffer):
-            channel_type = channel_config[i]
-            verboseprint(f"{i:<10}{channel_type:<10}{temp:<15.2f}")
-            log_to_file(device_id, "DI-245", i, temp)
-
-            if temp > MAX_THRESHOLD or temp < MIN_THRESHOLD:
-                alert_subject = "Data Logger Alert: Threshold Exceeded"
-                alert_message = (
-                    f"Threshold violation detected:\n"
-                    f"File: {nameMapping['DI-245 - ' + str(device_id) + ' - ' + str(i)]}\n"
-                    f"Max Value: {temp} (Threshold: {MAX_THRESHOLD})\n"
-                    f"Min Value: {temp} (Threshold: {MIN_THRESHOLD})\n"
-                    f"Time: {datetime.now().isoformat()}"
+    if device_id not in aggregators:
+        aggregators[device_id] = (
+            IntervalAggregator(len(channels), TIME_PER_LOG.total_seconds()),
+            device_type,
+            channels,
+        )
+    aggregator = aggregators[device_id][0]
+    write_rollups(device_id, device_type, channels, aggregator.add(timestamps, values))
+
+
+def log_raw(device_id, device_type, channels, timestamps, values):
+    """Write a block to the raw stream, compressed to ``RAW_TOLERANCES``."""
+    if RAW_TOLERANCES is not None:
+        if device_id not in compressors:
+            tolerances = [
+                RAW_TOLERANCES.get(
+                    f"{device_type} - {device_id} - {channel}",
+                    RAW_TOLERANCES.get(device_type, 0.0),
                 )
-                send_sns_alert(alert_subject, alert_message)
-
-    verboseprint(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-    upload_file_to_s3(current_log_file, BUCKET_NAME)
-
-
-def log_pressure(voltage_buffer, channel_config, device_id):
-    """Log voltage readings from DI-1100."""
-    global last_log_time
-    verboseprint(f"\nDevice {device_id} - Pressure Readings:")
-    verboseprint(f"{'Channel':<10}{'Type':<10}{'Pressure (mbar)':<15}")
-
-    current_time = datetime.now()
-    if current_time - TIME_PER_LOG > last_log_time[device_id]:
-        last_log_time[device_id] = current_time
-        # for i, voltage in enumerate(voltage_buffer):
-        mbar = 10 ** ((voltage_buffer[0] - 7.75) / 0.75)
-        verboseprint(f"{0:<10}{channel_config[0]:<10}{mbar:<15.2f}")
-        log_to_file(device_id, "DI-1100", channel_config[0], mbar)
-
-    verboseprint(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-    upload_file_to_s3(current_log_file, BUCKET_NAME)
-
-
-def start_device_threads(devices, manage_device_func, channel_config, dev_type):
-    """Start threads for managing devices."""
-    log_type = {"di245": log_temperature, "di1100": log_pressure}
-    threads = []
-    global current_device_index, last_log_time
-    for _, device in enumerate(devices):
-        thread = threading.Thread(
-            target=manage_device_func,
-            args=(
-                device,
-                current_device_index,
-                channel_config,
-                log_type[dev_type],
-                stop_event,
-                print_lock,
-            ),
+                for channel in channels
+            ]
+            compressors[device_id] = (
+                BlockCompressor(tolerances),
+                device_type,
+                channels,
+            )
+        timestamps, values = compressors[device_id][0].add(timestamps, values)
+    if len(timestamps):
+        log_to_file(device_id, device_type, channels, timestamps, values, raw=True)
+
+
+def flush_compressors():
+    """Write the points every raw-stream compressor is still holding back."""
+    for device_id, (compressor, device_type, channels) in compressors.items():
+        timestamps, values = compressor.flush()
+        if len(timestamps):
+            log_to_file(
+                device_id, device_type, channels, timestamps, values, raw=True
+            )
+
+
+def write_rollups(device_id, device_type, channels, rollups):
+    if not rollups:
+        return
+    starts, means, extra = stack_rollups(rollups)
+    log_to_file(device_id, device_type, channels, starts, means, extra=extra)
+
+
+def flush_rollups():
+    """Write out the partially filled interval of every device, e.g. at shutdown."""
+    for device_id, (aggregator, device_type, channels) in aggregators.items():
+        write_rollups(device_id, device_type, channels, aggregator.flush())
+
+
+def write_samples(ring, timestamps, values):
+    """File-writer consumer: dispatch a drained block to the per-type logger."""
+    log_type = {"DI-245": log_temperature, "DI-1100": log_pressure}
+    with file_lock:
+        initialize_log_file()
+        log_type[ring.device_type](
+            timestamps, values, ring.channel_config, ring.device_id
         )
-        current_device_index += 1
-        last_log_time.append(datetime.now())
-        threads.append(thread)
-        thread.start()
 
-    return threads  # Return the threads to manage them later
 
+def evaluate_alarms(ring, timestamps, values):
+    """Alarm consumer: run every scan through the alarm engine in engineering units."""
+    if ring.device_type == "DI-1100":
+        channels, values = convert_pressure(values, ring.channel_config)
+    else:
+        channels = list(range(ring.num_channels))
+    alarm_engine.evaluate(ring.device_type, ring.device_id, channels, timestamps, values)
 
-def main():
-    # Initialize the log file
-    initialize_log_file()
 
-    # Start DI-1100 threads in parallel
-    di1100_ports = find_di1100_ports()
-    if di1100_ports:
-        print("Starting DI-1100 devices...")
-        di1100_threads = start_device_threads(
-            di1100_ports, manage_di1100_device, [0, 1, 2, 3], "di1100"
-        )
+def stream_live(ring, timestamps, values):
+    """Live consumer: fold every decoded scan into the coalesced SSE updates."""
+    if ring.device_type == "DI-1100":
+        channels, values = convert_pressure(values, ring.channel_config)
     else:
-        di1100_threads = []
-        print("No DI-1100 devices found.")
-
-    # Start DI-245 threads in parallel
-    di245_ports = find_di245_ports()
-    if di245_ports:
-        print("Starting DI-245 devices...")
-        di245_threads = start_device_threads(
-            di245_ports,
-            manage_di245_device,
-            [TC_TYPE, TC_TYPE, TC_TYPE, TC_TYPE],
-            "di245",
+        channels = list(range(ring.num_channels))
+    live.update(ring.device_type, ring.device_id, channels, timestamps, values)
+
+
+def report_pipeline_stats():
+    """Warn whenever a device ring dropped samples or a device reconnected
+    since the last report."""
+    for stats in pipeline.stats():
+        device_id = stats["device_id"]
+        dropped = stats["dropped_rows"] - last_dropped_rows.get(device_id, 0)
+        last_dropped_rows[device_id] = stats["dropped_rows"]
+        if dropped:
+            print(
+                f"Device {device_id} dropped {dropped} scans "
+                f"(fill {stats['fill']}/{stats['capacity']})"
+            )
+        verboseprint(stats)
+
+    for stats in supervisor.stats() if supervisor else []:
+        device_id = stats["device_id"]
+        if stats["reconnects"] != last_reconnects.get(device_id, 0):
+            print(
+                f"Device {device_id} ({stats['serial']}) has reconnected "
+                f"{stats['reconnects']} times; last error: {stats['last_error']}"
+            )
+        last_reconnects[device_id] = stats["reconnects"]
+        verboseprint(stats)
+
+    stats = outbox.stats()
+    if stats["retrying"]:
+        print(
+            f"Outbox: {stats['depth']} queued, {stats['retrying']} retrying, "
+            f"oldest {stats['oldest_age']:.0f} s"
+        )
+    verboseprint(stats)
+
+
+def register_device(dev_type, device_id, port, channel_config):
+    """Ring, sample clock and (with CAPTURE_DIR) raw capture for one device."""
+    device_type = DEVICE_TYPES[dev_type]
+    make_clock = {"di245": make_di245_clock, "di1100": make_di1100_clock}
+    ring = pipeline.register(device_id, device_type, channel_config)
+    capture = None
+    if CAPTURE_DIR is not None:
+        capture = open_capture(
+            CAPTURE_DIR, device_type, device_id, port, channel_config, CAPTURE_BYTES
+        )
+    if SAMPLE_CLOCK_TIMESTAMPS:
+        ring.clock = make_clock[dev_type](channel_config)
+    return ring, capture
+
+
+def register_devices(device_types):
+    """Register every logger present with its id from the device registry,
+    numbering new ones in the same order as the supervisor does.
+
+    Returns [(dev_type, port, device_id, ring, capture)].
+    """
+    registered = []
+    for key, (dev_type, port) in discover(device_types).items():
+        device_id = device_registry.device_id(key)
+        channel_config = device_types[dev_type][3]
+        ring, capture = register_device(dev_type, device_id, port, channel_config)
+        registered.append((dev_type, port, device_id, ring, capture))
+    return registered
+
+
+def run_device_engine(device_types):
+    """Run every device on one asyncio loop until Ctrl-C or all devices stop."""
+    engine = AsyncEngine()
+    registered = register_devices(device_types)
+    for dev_type in device_types:
+        if any(r[0] == dev_type for r in registered):
+            print(f"Starting {DEVICE_TYPES[dev_type]} devices...")
+        else:
+            print(f"No {DEVICE_TYPES[dev_type]} devices found.")
+    for dev_type, port, device_id, ring, capture in registered:
+        engine.add_device(
+            dev_type,
+            port,
+            device_id,
+            device_types[dev_type][3],
+            ring.producer(ring.clock),
+            capture,
         )
-    else:
-        di245_threads = []
-        print("No DI-245 devices found.")
 
-    # Monitor all threads until they finish or stop event is triggered
-    all_threads = di1100_threads + di245_threads
+    pipeline.start()
     try:
-        while any(thread.is_alive() for thread in all_threads):
-            time.sleep(1)  # Keep main thread alive
+        # asyncio.run cancels the device tasks on Ctrl-C, closing every port
+        asyncio.run(engine.run())
     except KeyboardInterrupt:
         print("Stopping all devices...")
-        stop_event.set()  # Signal all threads to stop
 
-    for thread in all_threads:
-        thread.join()  # Ensure all threads finish before exiting
+
+def main(engine=ENGINE):
+    global supervisor
+    # Initialize the log file
+    initialize_log_file()
+
+    # Consumers own file writing, alarms and uploads so device threads only
+    # ever push into their rings
+    pipeline.add_consumer("writer", write_samples)
+    pipeline.add_consumer("alarms", evaluate_alarms)
+    pipeline.add_periodic(
+        "uploader", upload_current_chunk, TIME_PER_UPLOAD.total_seconds()
+    )
+    pipeline.add_periodic(
+        "stats", report_pipeline_stats, TIME_PER_LOG.total_seconds()
+    )
+    pipeline.add_periodic("archive", enqueue_archive, ARCHIVE_INTERVAL.total_seconds())
+    if METRICS_SUMMARY:
+        pipeline.add_periodic(
+            "metrics-summary", lambda: print(summary()), TIME_PER_LOG.total_seconds()
+        )
+    if METRICS_PORT is not None:
+        pipeline.add_worker(MetricsServer(stop_event, port=METRICS_PORT))
+    pipeline.add_worker(
+        OutboxWorker(
+            outbox,
+            {
+                "upload": run_upload,
+                "compact": run_compact,
+                "pyramid": run_pyramid,
+                "archive": run_archive,
+                "alert": publish_alert,
+            },
+            stop_event,
+            concurrency=OUTBOX_CONCURRENCY,
+        )
+    )
+    if LIVE_PORT is not None:
+        pipeline.add_consumer("live", stream_live)
+        pipeline.add_periodic("live-publish", live.publish, 1 / LIVE_RATE)
+        pipeline.add_worker(LiveServer(live, stop_event, port=LIVE_PORT))
+    if QUERY_PORT is not None:
+        store = ChunkStore(LOG_DIR, CHUNK_DURATION, archive=archiver)
+        pipeline.add_worker(QueryServer(store, stop_event, port=QUERY_PORT))
+    enqueue_stale_chunks()
+
+    # DI-1100s first: new loggers are numbered in this order
+    device_types = {
+        "di1100": (DI1100_VID, DI1100_PID, manage_di1100_device, [0, 1, 2, 3]),
+        "di245": (
+            DI245_VID,
+            DI245_PID,
+            manage_di245_device,
+            [TC_TYPE, TC_TYPE, TC_TYPE, TC_TYPE],
+        ),
+    }
+    if engine == "asyncio":
+        run_device_engine(device_types)
+    else:
+        # The supervisor starts a thread (or process) per logger as it
+        # appears and restarts it with backoff whenever it drops off the bus
+        supervisor = DeviceSupervisor(
+            device_types,
+            register_device,
+            stop_event,
+            device_registry,
+            processes=engine == "processes",
+        )
+        pipeline.add_worker(supervisor)
+        pipeline.start()
+
+        try:
+            while not stop_event.is_set():
+                time.sleep(1)  # Keep main thread alive
+        except KeyboardInterrupt:
+            print("Stopping all devices...")
+
+    stop_event.set()
+    pipeline.join()
+    with file_lock:
+        flush_rollups()
+        chunk_writer.close()
+        if raw_writer is not None:
+            flush_compressors()
+            raw_writer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+import numpy as np
+
+from dataq_utils.alarms import AlarmRule, DeviceAlarms, replay, synthetic_series
+
+KEY = "DI-245 - 1 - 0"
+
+
+def transitions(rule, t, v, block_size=7):
+    """Feed one channel through ``DeviceAlarms`` in blocks; returns
+    [(side, raised, time)] for every transition."""
+    alarms = DeviceAlarms([KEY], {KEY: rule})
+    v = np.asarray(v, dtype=np.float64).reshape(-1, 1)
+    out = []
+    for i in range(0, len(t), block_size):
+        for tr in alarms.evaluate(t[i : i + block_size], v[i : i + block_size]):
+            out.append((tr["side"], tr["raised"], tr["time"]))
+    return out
+
+
+def test_hysteresis_holds_until_back_inside_by_the_margin():
+    t = np.arange(8.0)
+    v = [99, 101, 99, 99.5, 98.5, 97.5, 99, 100.5]
+    rule = AlarmRule(high=100, hysteresis=2)
+    assert transitions(rule, t, v, block_size=3) == [
+        ("high", True, 1.0),
+        ("high", False, 5.0),
+        ("high", True, 7.0),
+    ]
+
+
+def test_low_side_clears_above_the_margin():
+    t = np.arange(5.0)
+    rule = AlarmRule(low=65, hysteresis=2)
+    assert transitions(rule, t, [70, 64, 66, 67, 70]) == [
+        ("low", True, 1.0),
+        ("low", False, 3.0),
+    ]
+
+
+def test_min_duration_ignores_short_excursions():
+    t = np.arange(200.0)
+    v = np.full(len(t), 20.0)
+    v[10:30] = 120  # 20 s over: filtered out
+    v[100:150] = 120  # 50 s over: trips once it has held for 30 s
+    rule = AlarmRule(high=100, min_duration=30)
+    assert transitions(rule, t, v) == [("high", True, 130.0), ("high", False, 150.0)]
+
+
+def test_min_duration_spans_block_boundaries():
+    t = np.arange(100.0)
+    v = np.where((t >= 10) & (t < 60), 120.0, 20.0)
+    rule = AlarmRule(high=100, min_duration=30)
+    for block_size in (1, 4, 100):
+        assert transitions(rule, t, v, block_size) == [
+            ("high", True, 40.0),
+            ("high", False, 60.0),
+        ]
+
+
+def test_rate_of_change_raises_and_clears():
+    t = np.arange(120.0)
+    # Flat, a 1 unit/s ramp for 30 s, then flat again
+    v = 20 + np.clip(t - 30, 0, 30)
+    rule = AlarmRule(max_rate=0.5, rate_hysteresis=0.1, rate_window=10)
+    changes = transitions(rule, t, v)
+    assert [(side, raised) for side, raised, _ in changes] == [
+        ("rate", True),
+        ("rate", False),
+    ]
+    raised_at, cleared_at = changes[0][2], changes[1][2]
+    assert 30 < raised_at <= 40  # Average over the window passes 0.5/s
+    assert 60 < cleared_at <= 70  # and falls back below 0.4/s after the ramp
+
+
+def test_channels_without_rules_never_trip():
+    t, v = synthetic_series(60, 1.0, 2, base=500)
+    alarms = DeviceAlarms(["a", "b"], {"a": AlarmRule(high=1000)})
+    assert alarms.evaluate(t, v) == []
+
+
+def test_one_window_produces_one_batched_message():
+    t, v = synthetic_series(600, 1.0, 3)
+    v[100:, 0] += 100  # Channels 0 and 2 trip within seconds of each other
+    v[110:, 2] += 100
+    rules = {f"DI-245 - 0 - {c}": AlarmRule(high=100) for c in range(3)}
+    published = replay(rules, t, v, window=60)
+    assert len(published) == 1
+    subject, message = published[0]
+    assert subject == "Data Logger Alert: 2 raised, 0 cleared"
+    assert "RAISED high on DI-245 - 0 - 0" in message
+    assert "RAISED high on DI-245 - 0 - 2" in message
+    assert "Active: DI-245 - 0 - 0 (high), DI-245 - 0 - 2 (high)" in message
+
+
+def test_transitions_in_separate_windows_are_separate_messages():
+    t, v = synthetic_series(600, 1.0, 1)
+    v[100:300, 0] += 100
+    rules = {"DI-245 - 0 - 0": AlarmRule(high=100, hysteresis=2)}
+    published = replay(rules, t, v, window=60, names={"DI-245 - 0 - 0": "Oven"})
+    assert [subject for subject, _ in published] == [
+        "Data Logger Alert: 1 raised, 0 cleared",
+        "Data Logger Alert: 0 raised, 1 cleared",
+    ]
+    assert "RAISED high on Oven" in published[0][1]
+    assert published[1][1].endswith("Active: none")
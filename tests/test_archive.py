@@ -0,0 +1,129 @@
+import gzip
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dataq_utils.archive import Archiver
+from dataq_utils.chunk_writer import make_chunk_writer, to_epoch_ns
+from dataq_utils.sinks import MemoryS3Client
+
+BUCKET = "bucket"
+DAY = datetime(2024, 1, 1)
+CHUNK = timedelta(hours=6)
+
+
+def chunk_name(start):
+    return f"device_readings_{start.strftime('%Y%m%d_%H%M')}.csv"
+
+
+def write_chunk(log_dir, start, prefix=""):
+    """A chunk with one row a minute whose value is its own epoch time."""
+    writer = make_chunk_writer("csv")
+    writer.open(os.path.join(log_dir, prefix + chunk_name(start)))
+    t = start.timestamp() + np.arange(0, CHUNK.total_seconds(), 60.0)
+    writer.append("DI-245", 1, [0], to_epoch_ns(t), t[:, None])
+    writer.close()
+    return t
+
+
+def make_log(tmp_path, days=2):
+    """Chunks (and raw streams) for ``days`` days; returns every row time."""
+    times = []
+    for i in range(days * 4):
+        start = DAY + i * CHUNK
+        times.append(write_chunk(str(tmp_path), start))
+        write_chunk(str(tmp_path), start, prefix="raw_")
+    return np.concatenate(times)
+
+
+def chunks_left(tmp_path):
+    return sorted(n for n in os.listdir(tmp_path) if n.startswith("device_"))
+
+
+def stored_times(archiver, begin=DAY, end=DAY + timedelta(days=3)):
+    data = archiver.read_range(int(begin.timestamp() * 1e9), int(end.timestamp() * 1e9))
+    return data[("DI-245", "1")]["timestamp_ns"] / 1e9
+
+
+def test_retention_deletes_chunks_past_the_cutoff(tmp_path):
+    times = make_log(tmp_path)
+    client = MemoryS3Client()
+    archiver = Archiver(str(tmp_path), client=client, bucket=BUCKET)
+    # Chunks ending by 13:00 on day 2 are 14 days old
+    now = DAY + timedelta(days=15, hours=13)
+    assert archiver.run(now) == ["2024-01-01", "2024-01-02"]
+
+    assert chunks_left(tmp_path) == [
+        chunk_name(DAY + timedelta(days=1, hours=12)),
+        chunk_name(DAY + timedelta(days=1, hours=18)),
+    ]
+    # The raw streams went to the bucket before their local copies
+    gone = [DAY + i * CHUNK for i in range(6)]
+    for start in gone:
+        assert not os.path.exists(tmp_path / ("raw_" + chunk_name(start)))
+        body = client.get_object(
+            Bucket=BUCKET, Key=f"archive/raw/raw_{chunk_name(start)}"
+        )["Body"].read()
+        first_row = start.strftime("%Y-%m-%d %H:%M").encode()
+        assert gzip.decompress(body).startswith(first_row)
+    assert os.path.exists(tmp_path / ("raw_" + chunk_name(DAY + 7 * CHUNK)))
+    np.testing.assert_array_equal(stored_times(archiver), times)
+
+
+def test_retention_keeps_raw_streams_without_a_client(tmp_path):
+    make_log(tmp_path, days=1)
+    archiver = Archiver(str(tmp_path))
+    archiver.run(DAY + timedelta(days=30))
+    assert chunks_left(tmp_path) == []
+    assert len([n for n in os.listdir(tmp_path) if n.startswith("raw_")]) == 4
+
+
+def test_local_bytes_counts_raw_streams(tmp_path):
+    make_log(tmp_path, days=1)
+    archiver = Archiver(str(tmp_path))
+    sizes = [os.path.getsize(tmp_path / n) for n in os.listdir(tmp_path)]
+    assert archiver.local_bytes() == sum(sizes)
+
+
+def test_max_local_bytes_deletes_oldest_chunks_before_archives(tmp_path):
+    make_log(tmp_path)
+    archiver = Archiver(
+        str(tmp_path), client=MemoryS3Client(), bucket=BUCKET, retention_days=365
+    )
+    now = DAY + timedelta(days=3)
+    archiver.run(now)
+    assert len(chunks_left(tmp_path)) == 8
+
+    # Room for everything but about two chunks and their raw streams
+    chunk_bytes = 2 * os.path.getsize(tmp_path / chunk_name(DAY))
+    archiver.max_local_bytes = archiver.local_bytes() - 2 * chunk_bytes + 1
+    removed = archiver.apply_retention(now)
+    assert removed == [chunk_name(DAY), chunk_name(DAY + CHUNK)]
+    assert archiver.local_bytes() <= archiver.max_local_bytes
+
+    # Squeezed further, day 1's archive goes only after all of its chunks
+    archiver.max_local_bytes = archiver.local_bytes() - 2 * chunk_bytes - 1
+    removed = archiver.apply_retention(now)
+    assert removed == [
+        chunk_name(DAY + 2 * CHUNK),
+        chunk_name(DAY + 3 * CHUNK),
+        "2024-01-01",
+    ]
+    assert not archiver.manifest["archives"]["2024-01-01"]["local"]
+
+
+def test_period_is_rebuilt_after_its_chunks_are_gone(tmp_path):
+    times = make_log(tmp_path, days=1)
+    archiver = Archiver(str(tmp_path), client=MemoryS3Client(), bucket=BUCKET)
+    late = DAY + 3 * CHUNK
+    os.rename(tmp_path / chunk_name(late), tmp_path / "late.csv")
+    archiver.run(DAY + timedelta(days=15))  # Archives three chunks, deletes them
+    assert chunks_left(tmp_path) == []
+
+    # The missing chunk turns up (e.g. copied off another host)
+    os.rename(tmp_path / "late.csv", tmp_path / chunk_name(late))
+    assert archiver.run(DAY + timedelta(days=15)) == ["2024-01-01"]
+    archive = archiver.manifest["archives"]["2024-01-01"]
+    assert archive["chunks"] == [chunk_name(DAY + i * CHUNK) for i in range(4)]
+    np.testing.assert_array_equal(stored_times(archiver), times)
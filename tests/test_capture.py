@@ -0,0 +1,31 @@
+from dataq_utils.capture import CaptureRing, open_capture, read_capture
+
+CAPACITY = 64 * 1024
+
+
+def test_reopening_without_metadata_keeps_it(tmp_path):
+    ring = open_capture(str(tmp_path), "DI-245", 1, "/dev/ttyACM0", ["K"] * 4, CAPACITY)
+    ring.start_session()
+    ring.write(b"abc")
+    ring.close()
+
+    ring = CaptureRing(str(tmp_path / "DI-245_1.cap"), CAPACITY)
+    assert ring.metadata["channel_config"] == ["K"] * 4
+    ring.write(b"def")
+    ring.close()
+
+    metadata, records = read_capture(str(tmp_path / "DI-245_1.cap"))
+    assert metadata == {
+        "device_type": "DI-245",
+        "device_id": 1,
+        "port": "/dev/ttyACM0",
+        "channel_config": ["K"] * 4,
+    }
+    assert [data for _, data in records] == [None, b"abc", b"def"]
+
+
+def test_new_metadata_replaces_the_stored(tmp_path):
+    path = str(tmp_path / "x.cap")
+    CaptureRing(path, CAPACITY, {"port": "a"}).close()
+    CaptureRing(path, CAPACITY, {"port": "b"}).close()
+    assert read_capture(path)[0] == {"port": "b"}
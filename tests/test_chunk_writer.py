@@ -0,0 +1,26 @@
+import csv
+
+import numpy as np
+
+from dataq_utils.chunk_reader import read_chunk
+from dataq_utils.chunk_writer import make_chunk_writer, to_epoch_ns
+from dataq_utils.rollup import IntervalAggregator, stack_rollups
+
+
+def test_csv_rollups_write_count_as_an_integer(tmp_path):
+    aggregator = IntervalAggregator(2, 60.0)
+    t = 1_700_000_040.0 + np.arange(120.0)
+    rollups = aggregator.add(t, np.stack([t, -t], axis=1))
+    starts, means, extra = stack_rollups(rollups)
+
+    path = str(tmp_path / "device_readings_20231114_1800.csv")
+    writer = make_chunk_writer("csv")
+    writer.open(path)
+    writer.append("DI-245", 1, [0, 1], to_epoch_ns(starts), means, extra)
+    writer.close()
+
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert [row[-1] for row in rows] == ["60", "60"]
+    series = read_chunk(path)[("DI-245", "1")]
+    np.testing.assert_array_equal(series["count"], [[60, 60]])
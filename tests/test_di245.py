@@ -0,0 +1,30 @@
+import pytest
+import serial
+
+from dataq_utils import di245
+
+
+class UnpluggedPort:
+    """A serial port whose device is gone: every read and write raises."""
+
+    closed = False
+    in_waiting = 0
+
+    def write(self, data):
+        raise serial.SerialException("write failed")
+
+    def read(self, *args):
+        raise serial.SerialException("read failed")
+
+    read_until = read
+
+    def close(self):
+        self.closed = True
+
+
+def test_unplugged_device_still_closes_its_port(monkeypatch):
+    port = UnpluggedPort()
+    monkeypatch.setattr(di245, "connect_to_device", lambda name: port)
+    with pytest.raises(serial.SerialException):
+        di245.manage_di245_device("/dev/null", 0, ["K"], lambda *a: None, None)
+    assert port.closed
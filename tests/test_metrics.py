@@ -0,0 +1,25 @@
+from dataq_utils import metrics
+
+NAME = "dataq_test_child_seconds"
+KEY = (NAME, (("device_type", "X"),))
+
+
+def child_snapshot(counts, total):
+    """A child's ``snapshot`` holding one histogram with ``counts``."""
+    counts = counts + [0] * (len(metrics.SECONDS_BUCKETS) + 1 - len(counts))
+    value = (counts, total, sum(counts))
+    return {KEY: ("histogram", "From a child", metrics.SECONDS_BUCKETS, value)}
+
+
+def test_child_snapshots_are_merged_once():
+    first = child_snapshot([1], 1e-6)
+    second = child_snapshot([1, 2], 1e-5)
+    metrics.merge_snapshot(first)
+    metrics.merge_snapshot(second, first)
+
+    merged = metrics.histogram(NAME, "From a child", device_type="X")
+    assert merged.counts[:3] == [1, 2, 0]
+    assert merged.count == 3
+    assert merged.sum == 1e-5
+    assert f'{NAME}_count{{device_type="X"}} 3' in metrics.render()
+    assert metrics.snapshot()[KEY] == second[KEY]
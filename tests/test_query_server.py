@@ -0,0 +1,70 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dataq_utils.chunk_writer import make_chunk_writer, to_epoch_ns
+from dataq_utils.query_server import ChunkStore, QueryServer
+
+CHUNK = timedelta(hours=1)
+START = datetime(2024, 1, 1).timestamp()
+KEY = "DI-245 - 1 - 0"
+
+
+def write_chunk(log_dir, chunk_start, seconds=3600, fmt="csv"):
+    name = datetime.fromtimestamp(chunk_start).strftime("%Y%m%d_%H%M")
+    path = str(log_dir / f"device_readings_{name}.{fmt}")
+    writer = make_chunk_writer(fmt)
+    writer.open(path)
+    t = chunk_start + np.arange(seconds, dtype=np.float64)
+    writer.append("DI-245", 1, [0, 1], to_epoch_ns(t), np.column_stack((t, -t)))
+    writer.close()
+    return path
+
+
+def test_sliding_window_over_a_closed_chunk_hits_the_cache(tmp_path):
+    write_chunk(tmp_path, START)
+    store = ChunkStore(str(tmp_path), CHUNK)
+    for shift in range(5):
+        lo, hi = START + 100 + shift, START + 200 + shift
+        t = store.query([KEY], lo, hi, max_points=1000)[KEY]["t"]
+        assert t == list(np.arange(lo, hi))
+    stats = store.cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 4)
+
+
+def test_slices_match_a_direct_range_read(tmp_path):
+    path = write_chunk(tmp_path, START)
+    store = ChunkStore(str(tmp_path), CHUNK)
+    lo, hi = int((START + 1234.5) * 1e9), int((START + 2000) * 1e9)
+    direct = store._decode(path, lo, hi)
+    cached = store.read(path, lo, hi, closed=True)
+    for key in direct:
+        np.testing.assert_array_equal(cached[key][0], direct[key][0])
+        np.testing.assert_array_equal(cached[key][1], direct[key][1])
+
+
+def test_a_corrupt_chunk_is_a_500_error(tmp_path):
+    path = tmp_path / "device_readings_20240101_0000.msgpack"
+    path.write_bytes(b"\xc1" * 64)  # Never valid msgpack
+    stop_event = threading.Event()
+    server = QueryServer(ChunkStore(str(tmp_path), CHUNK), stop_event, port=0)
+    server.start()
+    try:
+        port = server.httpd.server_address[1]
+        url = (
+            f"http://127.0.0.1:{port}/series?channel={KEY.replace(' ', '%20')}"
+            f"&start={START}&end={START + 3600}"
+        )
+        try:
+            urllib.request.urlopen(url)
+            raise AssertionError("expected an HTTP error")
+        except urllib.error.HTTPError as e:
+            assert e.code == 500
+            assert "error" in json.load(e)
+    finally:
+        stop_event.set()
+        server.join()
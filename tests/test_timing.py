@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from dataq_utils.timing import ScanClock
+
+
+def run(rate, true_rate, seconds=1800, block=4, jitter=0.02, seed=0):
+    """Stamp ``seconds`` of rows sampled at ``true_rate`` that arrive in blocks
+    up to ``jitter`` late; returns the clock and the worst stamp error over
+    the second half."""
+    rng = np.random.default_rng(seed)
+    clock = ScanClock(rate)
+    period = 1 / true_rate
+    k, errors, stamps = 0, [], []
+    while k * period < seconds:
+        k += block
+        arrival = 1000.0 + (k - 1) * period + rng.uniform(0, jitter)
+        t = clock.stamp(block, arrival)
+        errors.append(np.abs(t - (1000.0 + (k - block + np.arange(block)) * period)))
+        stamps.append(t)
+    assert np.all(np.diff(np.concatenate(stamps)) >= 0)
+    return clock, np.max(errors[len(errors) // 2 :])
+
+
+@pytest.mark.parametrize("ppm", [100, -100, 0])
+@pytest.mark.parametrize("rate, block", [(5, 1), (1000, 100)])
+def test_drift_estimate_tracks_the_crystal(rate, block, ppm):
+    clock, error = run(rate, rate * (1 + ppm * 1e-6), block=block)
+    assert clock.stats()["drift_ppm"] == pytest.approx(ppm, abs=5)
+    assert error < 0.01
+
+
+def test_only_implausible_drift_is_clamped():
+    clock, _ = run(5, 5 * (1 + 2000e-6))
+    assert clock.stats()["drift_ppm"] == pytest.approx(500, abs=1)
+
+
+def test_a_wrong_configured_rate_is_replaced():
+    clock, error = run(10, 9.0, seconds=600)
+    assert clock.recalibrated
+    assert clock.stats()["rate"] == pytest.approx(9.0, rel=1e-3)
+    assert error < 0.01
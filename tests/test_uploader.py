@@ -0,0 +1,163 @@
+import gzip
+import json
+
+import pytest
+
+from dataq_utils.uploader import SEGMENT_PREFIX, ChunkUploader, LocalS3Client
+
+BUCKET = "bucket"
+CHUNK = "device_readings_20240101_0000.csv"
+
+
+class FlakyS3Client(LocalS3Client):
+    """``LocalS3Client`` whose next ``fail`` puts raise, like a dropped link."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.fail = 0
+
+    def put_object(self, **kwargs):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("simulated outage")
+        super().put_object(**kwargs)
+
+
+def get_body(client, key):
+    obj = client.get_object(Bucket=BUCKET, Key=key)
+    body = obj["Body"].read()
+    return gzip.decompress(body) if obj.get("ContentEncoding") == "gzip" else body
+
+
+def keys(client):
+    return [o["Key"] for o in client.list_objects_v2(Bucket=BUCKET)["Contents"]]
+
+
+@pytest.fixture
+def setup(tmp_path):
+    client = FlakyS3Client(str(tmp_path / "s3"))
+    chunk = tmp_path / CHUNK
+    chunk.write_bytes(b"")
+    state_dir = str(tmp_path / "state")
+    uploader = ChunkUploader(client, BUCKET, state_dir=state_dir)
+    return client, chunk, uploader, state_dir
+
+
+def test_only_appended_bytes_are_uploaded(setup):
+    client, chunk, uploader, _ = setup
+    chunk.write_bytes(b"a,1\nb,2\n")
+    assert uploader.upload_new_data(str(chunk)) == 8
+    assert uploader.upload_new_data(str(chunk)) == 0
+    with open(chunk, "ab") as f:
+        f.write(b"c,3\n")
+    assert uploader.upload_new_data(str(chunk)) == 4
+
+    manifest = uploader.manifest(CHUNK)
+    assert manifest["uploaded_bytes"] == 12
+    assert [(s["offset"], s["length"]) for s in manifest["segments"]] == [
+        (0, 8),
+        (8, 4),
+    ]
+    segments = [get_body(client, s["key"]) for s in manifest["segments"]]
+    assert b"".join(segments) == chunk.read_bytes()
+    remote = json.loads(
+        get_body(client, f"data/{SEGMENT_PREFIX}{CHUNK}/manifest.json")
+    )
+    assert remote == manifest
+
+
+def test_end_caps_the_upload_at_complete_records(setup):
+    client, chunk, uploader, _ = setup
+    chunk.write_bytes(b"a,1\nb,")
+    assert uploader.upload_new_data(str(chunk), end=4) == 4
+    with open(chunk, "ab") as f:
+        f.write(b"2\n")
+    assert uploader.upload_new_data(str(chunk)) == 4
+    segments = uploader.manifest(CHUNK)["segments"]
+    assert [get_body(client, s["key"]) for s in segments] == [b"a,1\n", b"b,2\n"]
+
+
+def test_close_compacts_and_deletes_segments(setup):
+    client, chunk, uploader, _ = setup
+    chunk.write_bytes(b"a,1\n")
+    uploader.upload_new_data(str(chunk))
+    with open(chunk, "ab") as f:
+        f.write(b"b,2\n")
+    uploader.upload_new_data(str(chunk))
+
+    assert uploader.close_chunk(str(chunk)) == 8
+    manifest = uploader.manifest(CHUNK)
+    assert manifest["compacted"] == {"key": f"data/{CHUNK}", "length": 8}
+    assert manifest["segments"] == []
+    assert get_body(client, f"data/{CHUNK}") == b"a,1\nb,2\n"
+    assert keys(client) == [
+        f"data/{CHUNK}",
+        f"data/{SEGMENT_PREFIX}{CHUNK}/manifest.json",
+    ]
+
+
+def test_failed_segment_is_retried_from_the_same_offset(setup):
+    client, chunk, uploader, state_dir = setup
+    chunk.write_bytes(b"a,1\n")
+    uploader.upload_new_data(str(chunk))
+    with open(chunk, "ab") as f:
+        f.write(b"b,2\n")
+
+    client.fail = 1
+    with pytest.raises(ConnectionError):
+        uploader.upload_new_data(str(chunk))
+    manifest = uploader.manifest(CHUNK)
+    assert manifest["uploaded_bytes"] == 4
+    assert len(manifest["segments"]) == 1
+
+    # A restarted process picks the offset up from the local state
+    resumed = ChunkUploader(client, BUCKET, state_dir=state_dir)
+    assert resumed.upload_new_data(str(chunk)) == 4
+    segments = resumed.manifest(CHUNK)["segments"]
+    assert [s["offset"] for s in segments] == [0, 4]
+    assert b"".join(get_body(client, s["key"]) for s in segments) == b"a,1\nb,2\n"
+
+    resumed.close_chunk(str(chunk))
+    assert get_body(client, f"data/{CHUNK}") == b"a,1\nb,2\n"
+
+
+def test_failed_compaction_keeps_the_segments(setup):
+    client, chunk, uploader, _ = setup
+    chunk.write_bytes(b"a,1\n")
+    uploader.upload_new_data(str(chunk))
+
+    client.fail = 1
+    with pytest.raises(ConnectionError):
+        uploader.close_chunk(str(chunk))
+    assert uploader.manifest(CHUNK)["compacted"] is None
+    assert len(keys(client)) == 2  # The segment and the manifest
+
+    uploader.close_chunk(str(chunk))
+    assert keys(client) == [
+        f"data/{CHUNK}",
+        f"data/{SEGMENT_PREFIX}{CHUNK}/manifest.json",
+    ]
+
+
+def test_rewritten_formats_upload_snapshots_until_closed(tmp_path):
+    client = LocalS3Client(str(tmp_path / "s3"))
+    chunk = tmp_path / "device_readings_20240101_0000.h5"
+    uploader = ChunkUploader(
+        client, BUCKET, state_dir=str(tmp_path / "state"), append_only=False
+    )
+    chunk.write_bytes(b"v1")
+    assert uploader.upload_new_data(str(chunk)) == 0  # No snapshot taken yet
+
+    uploader.snapshot(str(chunk))
+    chunk.write_bytes(b"v2, being rewritten")  # The writer carries on
+    assert uploader.upload_new_data(str(chunk)) == 2
+    assert get_body(client, f"data/{chunk.name}") == b"v1"
+    manifest = uploader.manifest(chunk.name)
+    assert manifest["compacted"] is None
+    assert manifest["segments"] == []
+
+    uploader.close_chunk(str(chunk))
+    assert get_body(client, f"data/{chunk.name}") == b"v2, being rewritten"
+    assert uploader.manifest(chunk.name)["compacted"] is not None
+    assert not (tmp_path / "state" / f".{chunk.name}.snapshot").exists()
+    assert uploader.upload_new_data(str(chunk)) == 0